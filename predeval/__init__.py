@@ -8,8 +8,29 @@ __version__ = '0.0.10'
 
 from .continuous import ContinuousEvaluator
 from .categorical import CategoricalEvaluator
+from .probability import ProbabilityEvaluator
+from .bank import EvaluatorBank
+from .histogram import Histogram
+from .history import HistoryStore
+from .manager import EvaluatorManager
+from .sequential import CusumDetector, PageHinkleyDetector
+from .profiles import ContinuousProfile, CategoricalProfile, merge_profiles
+from .metrics import MetricsExporter
+from .store import ReferenceStore
 from .utilities import evaluate_tests
 
 __all__ = ['ContinuousEvaluator',
            'CategoricalEvaluator',
+           'ProbabilityEvaluator',
+           'EvaluatorBank',
+           'Histogram',
+           'HistoryStore',
+           'EvaluatorManager',
+           'CusumDetector',
+           'PageHinkleyDetector',
+           'ContinuousProfile',
+           'CategoricalProfile',
+           'merge_profiles',
+           'MetricsExporter',
+           'ReferenceStore',
            'evaluate_tests']
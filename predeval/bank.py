@@ -0,0 +1,320 @@
+"""Reference statistics of many continuous models stored as arrays and checked together."""
+import numpy as np
+from .profiles import ContinuousProfile
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+_BANK_ASSERTIONS = ('min', 'max', 'mean', 'std', 'ks_test')
+
+
+def _as_numbers(data):
+    """Data as a numeric array, keeping float32 and narrow integer types (no float64 copy)."""
+    data = np.asarray(data)
+    return data if data.dtype.kind in 'biuf' else data.astype(float)
+
+
+def _segment_sizes(offsets, n_values):
+    """Size of each segment of a concatenated buffer given the segment starts."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    assert len(offsets.shape) == 1 and len(offsets) > 0, 'Need one offset for each model'
+    sizes = np.diff(np.append(offsets, n_values))
+    assert offsets[0] == 0 and np.all(sizes > 0), 'Offsets must start at 0 and increase'
+    return offsets, sizes
+
+
+def _segment_ks(ref_values, ref_weights, ref_ids, test_data, test_ids, n_models):
+    """ks-test-statistic of every test segment against the reference segment with the same id.
+
+    Both samples are sorted together by (id, value). The cumulative weight of each sample
+    within its segment gives the two cdfs, which are compared at the last of each run of
+    tied values.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Concatenated reference values.
+    ref_weights : np.array
+        Weight of each reference value.
+    ref_ids : np.array of int
+        Model of each reference value.
+    test_data : np.array
+        Concatenated test values.
+    test_ids : np.array of int
+        Model of each test value.
+    n_models : int
+        Number of models.
+
+    Returns
+    -------
+    np.array
+        ks-test-statistic of each model (0 for models without values).
+
+    """
+    values = np.concatenate([ref_values, test_data])
+    ids = np.concatenate([ref_ids, test_ids])
+    order = np.lexsort((values, ids))
+    values, ids = values[order], ids[order]
+    ref_cumulative = np.cumsum(np.concatenate([ref_weights, np.zeros(len(test_data))])[order])
+    test_cumulative = np.cumsum(np.concatenate([np.zeros(len(ref_values)), np.ones(len(test_data))])[order])
+
+    ref_total = np.bincount(ref_ids, weights=ref_weights, minlength=n_models)
+    test_total = np.bincount(test_ids, minlength=n_models).astype(float)
+    # cumulative weight of the earlier segments.
+    ref_cdf = (ref_cumulative - (np.cumsum(ref_total) - ref_total)[ids]) / ref_total[ids]
+    test_cdf = (test_cumulative - (np.cumsum(test_total) - test_total)[ids]) / test_total[ids]
+
+    last = np.ones(len(values), dtype=bool)
+    last[:-1] = (values[1:] != values[:-1]) | (ids[1:] != ids[:-1])
+    gaps = np.where(last, np.abs(ref_cdf - test_cdf), 0.)
+    present, starts = np.unique(ids, return_index=True)
+    statistics = np.zeros(n_models)
+    statistics[present] = np.maximum.reduceat(gaps, starts)
+    return statistics
+
+
+class EvaluatorBank(object):
+    """
+    Reference statistics of many continuous models stored as contiguous arrays.
+
+    The bank runs the min, max, mean, std and ks tests of a ContinuousEvaluator for every
+    model at once. Test data for all models is passed as one concatenated array with the
+    offset of each model's segment. Moments come from segment reductions (np.minimum.reduceat
+    and friends) and the ks-test from one sort of all samples, so the cost of a check does not
+    grow with the number of Python objects.
+
+    Each outcome is 1 for a pass, 0 for a fail and -1 when the model does not assert the test
+    (or, for the ks-test, has fewer than 25 test values).
+
+    ...
+
+    Parameters
+    ----------
+    minimum : list or np.array
+        Expected minimum of each model.
+    maximum : list or np.array
+        Expected maximum of each model.
+    mean : list or np.array
+        Expected mean of each model.
+    std : list or np.array
+        Expected standard-deviation of each model.
+    ks_stat : float or list or np.array, optional
+        ks-test-statistic threshold of each model. Default is 0.5.
+    references : list, optional
+        Reference data of each model for the ks-test: a list or np.array, a ContinuousProfile
+        (its weighted quantile summary is used) or None (no ks-test).
+    assertions : list of str, optional
+        Tests asserted for every model. Defaults to min, max, mean, std and ks_test
+        (when references are given).
+    names : list of str, optional
+        Name of each model. Defaults to the model's position.
+
+    Attributes
+    ----------
+    names : list of str
+        Name of each model.
+    assertion_params : dict
+        Array of each model's minimum, maximum, mean, std and ks_stat.
+    last_statistics : dict
+        Array of each model's statistics from the latest check.
+
+    """
+    def __init__(self, minimum, maximum, mean, std, ks_stat=0.5, references=None, assertions=None,
+                 names=None):
+        params = [np.asarray(param, dtype=float) for param in (minimum, maximum, mean, std)]
+        n_models = len(params[0])
+        assert all(param.shape == (n_models,) for param in params), 'Need one value of each statistic per model'
+        self.assertion_params = dict(zip(['minimum', 'maximum', 'mean', 'std'], params))
+        self.assertion_params['ks_stat'] = np.broadcast_to(np.asarray(ks_stat, dtype=float), (n_models,)).copy()
+        self.names = [str(i) for i in range(n_models)] if names is None else list(names)
+        assert len(self.names) == n_models, 'Need one name for each model'
+
+        if assertions is None:
+            assertions = _BANK_ASSERTIONS if references is not None else _BANK_ASSERTIONS[:-1]
+        assertions = [assertions] * n_models if not assertions or isinstance(assertions[0], str) else assertions
+        assert len(assertions) == n_models, 'Need assertions for each model'
+        for model_assertions in assertions:
+            for assertion in model_assertions:
+                assert assertion in _BANK_ASSERTIONS, '{0} is not a bank assertion'.format(assertion)
+        self._asserted_ = dict((name, np.array([name in model_assertions for model_assertions in assertions]))
+                               for name in _BANK_ASSERTIONS)
+
+        references = [None] * n_models if references is None else list(references)
+        assert len(references) == n_models, 'Need one reference for each model'
+        values, weights, ids = [], [], []
+        for i, reference in enumerate(references):
+            if reference is None:
+                continue
+            if isinstance(reference, ContinuousProfile):
+                values.append(reference.summary_values)
+                weights.append(reference.summary_weights)
+            else:
+                reference = _as_numbers(reference)
+                assert len(reference.shape) == 1, 'Input data not a single vector'
+                values.append(reference)
+                weights.append(np.ones(len(reference)))
+            assert weights[-1].sum() >= 25, 'Not enough data for reliable KS tests'
+            ids.append(np.full(len(values[-1]), i, dtype=np.int64))
+        self._ref_values_ = np.concatenate(values) if values else np.array([])
+        self._ref_weights_ = np.concatenate(weights) if weights else np.array([])
+        self._ref_ids_ = np.concatenate(ids) if ids else np.array([], dtype=np.int64)
+        self._asserted_['ks_test'] &= np.bincount(self._ref_ids_, minlength=n_models) > 0
+        self.last_statistics = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_evaluators(cls, evaluators, names=None):
+        """Copy the reference statistics of continuous evaluators into a bank.
+
+        Only the min, max, mean, std and ks tests are copied.
+
+        Parameters
+        ----------
+        evaluators : list of ContinuousEvaluator
+            The evaluators of each model.
+        names : list of str, optional
+            Name of each model.
+
+        Returns
+        -------
+        EvaluatorBank
+
+        """
+        params = dict((name, []) for name in ['minimum', 'maximum', 'mean', 'std', 'ks_stat'])
+        references, assertions = [], []
+        for evaluator in evaluators:
+            for name, values in params.items():
+                value = evaluator.assertion_params[name]
+                values.append(np.nan if value is None else value)
+            assertions.append([name for name in evaluator.assertions if name in _BANK_ASSERTIONS])
+            if 'ks_test' not in assertions[-1]:
+                references.append(None)
+            elif isinstance(evaluator.ref_data, ContinuousProfile):
+                references.append(evaluator.ref_data)
+            else:
+                references.append(evaluator._reference_sample(evaluator.ref_data)[0])  # pylint: disable=W0212
+        return cls(params['minimum'], params['maximum'], params['mean'], params['std'],
+                   ks_stat=params['ks_stat'], references=references, assertions=assertions, names=names)
+
+    @classmethod
+    def from_profiles(cls, profiles, assertions=None, ks_stat=0.5, names=None):
+        """Build a bank from the continuous profile of each model.
+
+        Parameters
+        ----------
+        profiles : list of ContinuousProfile
+            The reference profile of each model.
+        assertions : list of str, optional
+            Tests asserted for every model. Default is min, max, mean, std and ks_test.
+        ks_stat : float or list or np.array, optional
+            ks-test-statistic threshold of each model. Default is 0.5.
+        names : list of str, optional
+            Name of each model.
+
+        Returns
+        -------
+        EvaluatorBank
+
+        """
+        profiles = list(profiles)
+        return cls([profile.minimum for profile in profiles], [profile.maximum for profile in profiles],
+                   [profile.mean for profile in profiles], [profile.std for profile in profiles],
+                   ks_stat=ks_stat, references=profiles,
+                   assertions=_BANK_ASSERTIONS if assertions is None else assertions, names=names)
+
+    def moments(self, test_data, offsets):
+        """Find the min, max, mean and standard deviation of every model's test data.
+
+        Parameters
+        ----------
+        test_data : list or np.array
+            Test data of all models, concatenated.
+        offsets : list or np.array of int
+            Start of each model's test data in test_data.
+
+        Returns
+        -------
+        minimum : np.array
+        maximum : np.array
+        mean : np.array
+        std : np.array
+
+        """
+        test_data = _as_numbers(test_data)
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        offsets, sizes = _segment_sizes(offsets, len(test_data))
+        assert len(offsets) == len(self), 'Need one offset for each model'
+        # sums accumulate in float64 whatever the type of the data.
+        mean = np.add.reduceat(test_data, offsets, dtype=np.float64) / sizes
+        deviations = test_data - np.repeat(mean, sizes)
+        std = np.sqrt(np.add.reduceat(deviations * deviations, offsets) / sizes)
+        return np.minimum.reduceat(test_data, offsets), np.maximum.reduceat(test_data, offsets), mean, std
+
+    def ks_statistics(self, test_data, offsets):
+        """Find the ks-test-statistic of every model's test data.
+
+        Parameters
+        ----------
+        test_data : list or np.array
+            Test data of all models, concatenated.
+        offsets : list or np.array of int
+            Start of each model's test data in test_data.
+
+        Returns
+        -------
+        np.array
+            ks-test-statistic of each model (nan for models without reference data).
+
+        """
+        test_data = _as_numbers(test_data)
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        offsets, sizes = _segment_sizes(offsets, len(test_data))
+        assert len(offsets) == len(self), 'Need one offset for each model'
+        has_reference = np.bincount(self._ref_ids_, minlength=len(self)) > 0
+        test_ids = np.repeat(np.arange(len(self)), sizes)
+        keep = has_reference[test_ids]
+        statistics = _segment_ks(self._ref_values_, self._ref_weights_, self._ref_ids_,
+                                 test_data[keep], test_ids[keep], len(self))
+        statistics[~has_reference] = np.nan
+        return statistics
+
+    def check_data(self, test_data, offsets):
+        """Run the asserted tests of every model on its test data.
+
+        Parameters
+        ----------
+        test_data : list or np.array
+            Test data of all models, concatenated.
+        offsets : list or np.array of int
+            Start of each model's test data in test_data.
+
+        Returns
+        -------
+        dict
+            Outcome of each model (1 pass, 0 fail, -1 not asserted) for min, max, mean, std and ks.
+
+        """
+        test_data = _as_numbers(test_data)
+        minimum, maximum, mean, std = self.moments(test_data, offsets)
+        self.last_statistics = {'min': minimum, 'max': maximum, 'mean': mean, 'std': std}
+        params = self.assertion_params
+        two_std = params['std'] * 2
+        half_std = params['std'] * 0.5
+        passed = {
+            'min': minimum >= params['minimum'],
+            'max': maximum <= params['maximum'],
+            'mean': (mean >= params['mean'] - two_std) & (mean <= params['mean'] + two_std),
+            'std': (std >= params['std'] - half_std) & (std <= params['std'] + half_std),
+        }
+        asserted = dict((name, self._asserted_[name]) for name in passed)
+        asserted['ks'] = self._asserted_['ks_test'].copy()
+        if asserted['ks'].any():
+            statistics = self.ks_statistics(test_data, offsets)
+            self.last_statistics['ks'] = statistics
+            passed['ks'] = statistics <= params['ks_stat']
+            asserted['ks'] &= np.diff(np.append(np.asarray(offsets), len(test_data))) >= 25
+        else:
+            passed['ks'] = np.zeros(len(self), dtype=bool)
+        return dict((name, np.where(asserted[name], passed[name], -1).astype(np.int8)) for name in passed)
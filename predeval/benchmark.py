@@ -0,0 +1,331 @@
+"""Accuracy and speed of the approximate evaluation modes against scipy's exact tests.
+
+Each mode checks synthetic test data against synthetic reference data at several sizes. Its
+test statistic and decision are compared with `ks_2samp
+<https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.ks_2samp.html>`_ (continuous)
+or `chi2_contingency
+<https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.chi2_contingency.html>`_
+(categorical) on the full data, and its time and peak memory are recorded next to scipy's.
+
+Run ``python -m predeval.benchmark`` (or ``make benchmark``) to print the results. The
+command exits with 1 when a mode falls below the agreement or speed limits in LIMITS.
+"""
+from functools import partial
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+from scipy import stats
+from .continuous import ContinuousEvaluator
+from .categorical import CategoricalEvaluator
+from .histogram import Histogram
+from .profiles import ContinuousProfile
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# 5% critical value of the ks-test statistic is _KS_CRITICAL * sqrt((n + m) / (n * m)).
+_KS_CRITICAL = 1.358
+
+# number of categories in the categorical distributions.
+_N_CATEGORIES = 50
+
+# ---- synthetic distributions: name -> (reference draw, test draw) ---- #
+
+
+def _normal(rng, size, loc=0.0, scale=1.0):
+    return rng.normal(loc, scale, size)
+
+
+def _student(rng, size, df=3):
+    return rng.standard_t(df, size)
+
+
+def _zipf(rng, size, tilt=0.0):
+    """Draw categories 0 to _N_CATEGORIES - 1 with (tilted) zipf probabilities."""
+    ranks = np.arange(1, _N_CATEGORIES + 1)
+    probabilities = ranks ** -(1.0 + tilt)
+    return rng.choice(_N_CATEGORIES, size=size, p=probabilities / probabilities.sum())
+
+
+CONTINUOUS_DISTRIBUTIONS = {
+    'same': (_normal, _normal),
+    'shift': (_normal, partial(_normal, loc=0.02)),
+    'scale': (_normal, partial(_normal, scale=1.05)),
+    'heavy_tail': (_normal, _student),
+}
+
+CATEGORICAL_DISTRIBUTIONS = {
+    'same': (_zipf, _zipf),
+    'tilt': (_zipf, partial(_zipf, tilt=0.02)),
+}
+
+# ---- modes: name -> (build the evaluator from reference data, prepare the test data) ---- #
+
+
+def _sampled(build, sample_size, ref_data, **kwargs):
+    """Build an evaluator that checks a seeded sample of the test data."""
+    evaluator = build(ref_data, **kwargs)
+    evaluator.enable_sampling(sample_size, random_state=0)
+    return evaluator
+
+
+def _profiled(ref_data, **kwargs):
+    """Build a continuous evaluator from a profile with a compressed quantile summary."""
+    return ContinuousEvaluator(ContinuousProfile.from_data(ref_data), **kwargs)
+
+
+def _binned(test_data, decimals=2):
+    """Round the test data and count each value (a Histogram)."""
+    return Histogram.from_data(np.round(test_data, decimals))
+
+
+_CONTINUOUS = partial(ContinuousEvaluator, assertions=['ks_test'], verbose=False)
+_CATEGORICAL = partial(CategoricalEvaluator, assertions=['chi2_test'], verbose=False)
+
+CONTINUOUS_MODES = {
+    'exact': (_CONTINUOUS, None),
+    'asymptotic': (partial(_CONTINUOUS, pvalue='asymptotic'), None),
+    'no_pvalue': (partial(_CONTINUOUS, pvalue=None), None),
+    'sampled': (partial(_sampled, _CONTINUOUS, 100000), None),
+    'profile': (partial(_profiled, assertions=['ks_test'], verbose=False), None),
+    'binned': (_CONTINUOUS, _binned),
+}
+
+CATEGORICAL_MODES = {
+    'exact': (_CATEGORICAL, None),
+    'asymptotic': (partial(_CATEGORICAL, pvalue='asymptotic'), None),
+    'top_k': (partial(_CATEGORICAL, top_k=20), None),
+}
+
+# lowest share of decisions matching scipy's, largest statistic error and lowest speedup over
+# scipy (at the largest size) allowed for each mode. The speedups hold with either backend.
+LIMITS = {
+    'continuous': {
+        'exact': {'agreement': 1.0, 'error': 1e-9, 'speedup': 0.7},
+        'asymptotic': {'agreement': 1.0, 'error': 1e-9, 'speedup': 0.7},
+        'no_pvalue': {'agreement': 1.0, 'error': 1e-9, 'speedup': 0.7},
+        'sampled': {'agreement': 0.7, 'error': 0.01, 'speedup': 1.0},
+        'profile': {'agreement': 0.7, 'error': 0.01, 'speedup': 1.5},
+        'binned': {'agreement': 0.7, 'error': 0.01, 'speedup': 1.5},
+    },
+    # the chi2 statistic grows with the number of buckets, so the top_k statistics are not
+    # comparable with scipy's (only their decisions are).
+    'categorical': {
+        'exact': {'agreement': 1.0, 'error': 1e-6, 'speedup': 0.7},
+        'asymptotic': {'agreement': 1.0, 'error': 1e-6, 'speedup': 0.7},
+        'top_k': {'agreement': 0.7, 'error': None, 'speedup': 0.7},
+    },
+}
+
+
+def _ks_baseline(ref_data, test_data):
+    return stats.ks_2samp(ref_data, test_data)[0]
+
+
+def _chi2_baseline(ref_data, test_data):
+    """chi2_contingency on the count of each category in both samples."""
+    categories, inverse = np.unique(np.concatenate([ref_data, test_data]), return_inverse=True)
+    table = np.array([np.bincount(inverse[:len(ref_data)], minlength=len(categories)),
+                      np.bincount(inverse[len(ref_data):], minlength=len(categories))])
+    return stats.chi2_contingency(table)[0]
+
+
+def _measure(func, repeat):
+    """Run func repeat times and return its output, best time and peak traced memory."""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        best = min(best, time.perf_counter() - start)
+    # a separate traced run, since tracing slows allocations down.
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return output, best, peak
+
+
+def _run_mode(mode, ref_data, test_data, threshold, kind, repeat):
+    """Check test_data with one mode and return its statistic, time and peak memory."""
+    build, prepare = mode
+    stat_key, name = ('ks', 'ks_stat') if kind == 'continuous' else ('chi2', 'chi2_stat')
+    evaluator = build(ref_data, **{name: threshold})
+
+    def check():
+        evaluator.check_data(test_data if prepare is None else prepare(test_data))
+        return evaluator.last_statistics[stat_key]
+    return _measure(check, repeat)
+
+
+def run_benchmark(kinds=('continuous', 'categorical'), sizes=(10 ** 4, 10 ** 5, 10 ** 6), modes=None,
+                  repeat=3, seed=0):
+    """Run every mode on every synthetic distribution at every size.
+
+    The reference and test samples have the same size. The tests' thresholds are the 5%
+    critical values, so the decisions are not trivial.
+
+    Parameters
+    ----------
+    kinds : tuple of str, optional
+        'continuous' and/or 'categorical'. Default is both.
+    sizes : tuple of int, optional
+        Sizes of the samples. Default is (10 ** 4, 10 ** 5, 10 ** 6).
+    modes : dict, optional
+        For each kind, the modes to run (name -> (build, prepare)). Defaults to
+        CONTINUOUS_MODES and CATEGORICAL_MODES.
+    repeat : int, optional
+        Number of timed runs (the best time is kept). Default is 3.
+    seed : int, optional
+        Seed of the synthetic data. Default is 0.
+
+    Returns
+    -------
+    list of dict
+        One row per kind, distribution, size and mode with the mode's statistic, scipy's
+        statistic, their absolute error, whether the decisions agree, both times, the speedup
+        over scipy and both peak memories (in bytes).
+
+    """
+    assert isinstance(repeat, int) and repeat > 0, 'expected positive integer, input repeat is not a positive integer'
+    modes = modes or {'continuous': CONTINUOUS_MODES, 'categorical': CATEGORICAL_MODES}
+    settings = {'continuous': (CONTINUOUS_DISTRIBUTIONS, _ks_baseline),
+                'categorical': (CATEGORICAL_DISTRIBUTIONS, _chi2_baseline)}
+    rows = []
+    for kind in kinds:
+        distributions, baseline = settings[kind]
+        for distribution, (draw_ref, draw_test) in sorted(distributions.items()):
+            for size in sizes:
+                rng = np.random.RandomState(seed)
+                ref_data, test_data = draw_ref(rng, size), draw_test(rng, size)
+                if kind == 'continuous':
+                    threshold = _KS_CRITICAL * np.sqrt(2.0 / size)
+                else:
+                    threshold = stats.chi2.ppf(0.95, len(np.unique(ref_data)) - 1)
+                expected, base_time, base_peak = _measure(partial(baseline, ref_data, test_data), repeat)
+                for name, mode in sorted(modes[kind].items()):
+                    statistic, mode_time, mode_peak = _run_mode(mode, ref_data, test_data, threshold,
+                                                                kind, repeat)
+                    rows.append({
+                        'kind': kind, 'distribution': distribution, 'size': size, 'mode': name,
+                        'statistic': float(statistic), 'baseline': float(expected),
+                        'error': float(abs(statistic - expected)),
+                        'agree': bool((statistic <= threshold) == (expected <= threshold)),
+                        'time': mode_time, 'baseline_time': base_time,
+                        'speedup': base_time / mode_time,
+                        'peak_bytes': mode_peak, 'baseline_peak_bytes': base_peak,
+                    })
+    return rows
+
+
+def summarize(rows):
+    """Summarize each mode's rows.
+
+    Parameters
+    ----------
+    rows : list of dict
+        The output of run_benchmark.
+
+    Returns
+    -------
+    dict
+        For each (kind, mode), the share of decisions agreeing with scipy, the largest
+        statistic error, the lowest speedup at the largest size and the largest peak memory.
+
+    """
+    summary = {}
+    for row in rows:
+        summary.setdefault((row['kind'], row['mode']), []).append(row)
+    output = {}
+    for key, mode_rows in summary.items():
+        largest = max(row['size'] for row in mode_rows)
+        output[key] = {
+            'agreement': np.mean([row['agree'] for row in mode_rows]),
+            'error': max(row['error'] for row in mode_rows),
+            'speedup': min(row['speedup'] for row in mode_rows if row['size'] == largest),
+            'peak_bytes': max(row['peak_bytes'] for row in mode_rows),
+        }
+    return output
+
+
+def check_limits(rows, limits=None):
+    """Find the modes whose agreement, error or speed regressed past their limits.
+
+    Parameters
+    ----------
+    rows : list of dict
+        The output of run_benchmark.
+    limits : dict, optional
+        For each kind and mode, the lowest agreement, largest error and lowest speedup
+        (None skips a limit). Defaults to LIMITS.
+
+    Returns
+    -------
+    list of str
+        One message per regression (empty when every mode is within its limits).
+
+    """
+    limits = LIMITS if limits is None else limits
+    failures = []
+    for (kind, mode), result in sorted(summarize(rows).items()):
+        mode_limits = limits.get(kind, {}).get(mode, {})
+        for name, value in sorted(result.items()):
+            limit = mode_limits.get(name)
+            if limit is None:
+                continue
+            if (value > limit) if name == 'error' else (value < limit):
+                failures.append('{0} {1}: {2} {3:.4g} (limit {4:.4g})'.format(kind, mode, name, value, limit))
+    return failures
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m predeval.benchmark',
+        description='Compare the accuracy and speed of the evaluation modes with scipy.')
+    parser.add_argument('--kind', dest='kinds', action='append', choices=['continuous', 'categorical'],
+                        help='kind of evaluator to benchmark (can be repeated, default: both)')
+    parser.add_argument('--size', dest='sizes', action='append', type=int,
+                        help='sample size (can be repeated, default: 10000, 100000 and 1000000)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs (default: 3)')
+    parser.add_argument('--output', help='write the rows as json lines to this path')
+    return parser
+
+
+def main(argv=None):
+    """Run the benchmark, print each mode's summary and check the limits.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments. Defaults to sys.argv[1:].
+
+    Returns
+    -------
+    int
+        0 if every mode is within its limits and 1 otherwise.
+
+    """
+    args = _parser().parse_args(argv)
+    rows = run_benchmark(kinds=tuple(args.kinds or ('continuous', 'categorical')),
+                         sizes=tuple(args.sizes or (10 ** 4, 10 ** 5, 10 ** 6)), repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as output:
+            for row in rows:
+                output.write(json.dumps(row) + '\n')
+    print('{0:<12} {1:<11} {2:>9} {3:>10} {4:>8} {5:>12}'.format(
+        'kind', 'mode', 'agreement', 'max error', 'speedup', 'peak MB'))
+    for (kind, mode), result in sorted(summarize(rows).items()):
+        print('{0:<12} {1:<11} {2:>9.3f} {3:>10.2e} {4:>8.2f} {5:>12.1f}'.format(
+            kind, mode, result['agreement'], result['error'], result['speedup'], result['peak_bytes'] / 1e6))
+    failures = check_limits(rows)
+    for failure in failures:
+        print('Regression: ' + failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,23 +4,40 @@ from functools import partial
 import numpy as np
 from scipy import stats
 from .parent import ParentPredEval
+from .histogram import Histogram
+from .profiles import CategoricalProfile
+from .encoding import CategoryEncoder, as_categories
 
 __author__ = 'Dan Vatterott'
 __license__ = 'MIT'
 
 
-def _chi2_test(reference, test_data):
+def _top_categories(counts, top_k, min_count=0):
+    """Index of the top_k most common categories with at least min_count observations."""
+    keep = np.flatnonzero(counts >= min_count)
+    return keep[np.argsort(-counts[keep], kind='mergesort')[:top_k]]
+
+
+def _chi2_test(reference, test_data, pvalue='auto', categories=None):
     """Change chi2_contingency inputs for partial evaluation.
 
     Uses `chi2_contingency test from scipy
     <https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.chi2_contingency.html>`_.
 
+    With pvalue 'asymptotic' or None, the statistic (with Yates' correction when there is one
+    degree of freedom, as in scipy) is computed directly. None skips the p-value.
+
     Parameters
     ----------
     reference : list or np.array
         This the reference data that will be used for the comparison.
     test_data : list or np.array
         This the data compared to the reference data.
+    pvalue : str or None, optional
+        'auto' (scipy), 'asymptotic' or None (the p-value is returned as nan). Default is 'auto'.
+    categories : np.array, optional
+        Categories of the reference counts, used by the evaluator to count test data into them.
+        Default is None (test data is counted by its own categories).
 
     Returns
     -------
@@ -35,7 +52,21 @@ def _chi2_test(reference, test_data):
 
     """
     obs = np.append([reference], [test_data], axis=0)
-    return stats.chi2_contingency(obs)
+    # categories seen in neither sample (e.g., an empty "other" bucket) carry no information.
+    obs = obs[:, obs.sum(axis=0) > 0]
+    if pvalue == 'auto':
+        return stats.chi2_contingency(obs)
+    expected = np.outer(obs.sum(axis=1), obs.sum(axis=0)) / float(obs.sum())
+    if np.any(expected == 0):
+        raise ValueError('The table of expected frequencies has a zero element.')
+    dof = obs.shape[1] - 1
+    if dof == 0:
+        return 0.0, 1.0, dof, expected
+    if dof == 1:
+        diff = expected - obs
+        obs = obs + np.minimum(0.5, np.abs(diff)) * np.sign(diff)
+    chi2 = np.sum((obs - expected) ** 2 / expected)
+    return chi2, np.nan if pvalue is None else stats.chi2.sf(chi2, dof), dof, expected
 
 
 class CategoricalEvaluator(ParentPredEval):
@@ -52,12 +83,26 @@ class CategoricalEvaluator(ParentPredEval):
 
     Parameters
     ----------
-    ref_data : list of int or float or np.array
+    ref_data : list of int or float or np.array or CategoricalProfile or Histogram
         This the reference data for all tests. All future data will be compared to this data.
+        A Histogram is turned into a CategoricalProfile.
     assertions : list of str, optional
         These are the assertion tests that will be created. Defaults is ['chi2_test', 'exist'].
     verbose : bool, optional
         Whether tests should print their output. Default is true
+    top_k : int, optional
+        Turns on the high-cardinality mode. The chi2 test only tracks the top_k most common
+        reference categories (with at least 5 observations) and counts all other values in a
+        single "other" bucket, so its time and memory do not grow with the number of
+        categories. The exist test then only checks that the top_k most common reference
+        categories are present. Default is None (every category is tracked).
+    pvalue : str or None, optional
+        How the chi2 p-value is computed: 'auto' (scipy's chi2_contingency), 'asymptotic'
+        (the statistic is computed directly) or None (not computed, only the statistic decides
+        the test). Default is 'auto'.
+    dtype : numpy dtype, optional
+        Type the reference data is stored in (e.g., np.int16). Default is None (arrays keep
+        their type).
 
     Attributes
     ----------
@@ -75,13 +120,29 @@ class CategoricalEvaluator(ParentPredEval):
         Defaults to ['chi2_test', 'exist']
 
     """
+    _assertion_costs_ = {'exist': 5, 'chi2_test': 6}
+    _profile_class_ = CategoricalProfile
+
     def __init__(
             self,
             ref_data,
             assertions=None,
             verbose=True,
+            top_k=None,
+            pvalue='auto',
+            dtype=None,
             **kwargs):
-        super(CategoricalEvaluator, self).__init__(ref_data, verbose=verbose)
+        if isinstance(ref_data, Histogram):
+            ref_data = CategoricalProfile().update(ref_data)
+        super(CategoricalEvaluator, self).__init__(ref_data, verbose=verbose, dtype=dtype)
+
+        assert top_k is None or (isinstance(top_k, int) and top_k > 0), \
+            'expected positive integer, input top_k is not a positive integer'
+        self.top_k = top_k
+        assert pvalue in ('auto', 'asymptotic', None), 'expected auto, asymptotic or None pvalue'
+        self.pvalue = pvalue
+        self._chi2_encoder_ = None
+        self._exist_encoder_ = None
 
         # ---- Fill in Assertion Parameters ---- #
         self._assertion_params_ = {
@@ -104,8 +165,7 @@ class CategoricalEvaluator(ParentPredEval):
         self._assertions_ = self._check_assertion_types(assertions)
 
         # ---- populate assertion tests with reference data ---- #
-        for i in self._assertions_:
-            self._possible_assertions[i][0](self.ref_data)
+        self._update_assertions(self.ref_data)
 
         # ---- populate list of tests to run and run tests ---- #
         self._tests_ = [self._possible_assertions_[i][1] for i in self._assertions_]
@@ -126,6 +186,33 @@ class CategoricalEvaluator(ParentPredEval):
     def _tests(self):
         return self._tests_
 
+    def check_data(self, test_data, fail_fast=False):
+        """Check whether test_data is as expected.
+
+        Object and byte-string labels are converted to fixed-width strings once and
+        shared by all tests (see ParentPredEval.check_data).
+
+        Parameters
+        ----------
+        test_data : list or np.array or Histogram
+            This the data that will be compared to the reference data.
+        fail_fast : bool, optional
+            Whether to order tests by cost and stop at the first failure. Default is False.
+
+        Returns
+        -------
+        output : list of tuples
+            Each tuple has a string a boolean. The string describes the test.
+            The boolean describes the outcome. True is a pass, False is a fail and
+            None means the test was skipped.
+
+        """
+        if not isinstance(test_data, Histogram):
+            if isinstance(test_data, list):
+                test_data = np.array(test_data, dtype=self.dtype)
+            test_data = as_categories(test_data)
+        return super(CategoricalEvaluator, self).check_data(test_data, fail_fast=fail_fast)
+
     def update_chi2_test(self, input_data):
         """Create partially evaluated chi2 contingency test.
 
@@ -134,7 +221,7 @@ class CategoricalEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or CategoricalProfile
             This the reference data for the ks-test. All future data will be compared to this data.
 
         Returns
@@ -142,19 +229,53 @@ class CategoricalEvaluator(ParentPredEval):
         None
 
         """
-        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
-        assert len(input_data.shape) == 1, 'Input data not a single vector'
-        _, counts = np.unique(input_data, return_counts=True)
+        if isinstance(input_data, CategoricalProfile):
+            categories, counts = input_data.categories, input_data.counts
+        else:
+            input_data = as_categories(input_data)
+            assert len(input_data.shape) == 1, 'Input data not a single vector'
+            categories, counts = np.unique(input_data, return_counts=True)
+        if self.top_k is not None:
+            keep = _top_categories(counts, self.top_k, min_count=5)
+            assert len(keep), \
+                'Not enough data of each type for reliable Chi2 Contingency test. Need at least 5.'
+            other = np.sum(counts) - np.sum(counts[keep])
+            self.update_param('chi2_test', partial(_chi2_test, np.append(counts[keep], other),
+                                                   pvalue=self.pvalue, categories=categories[keep]))
+            return
         assert all([x >= 5 for x in counts]), \
             'Not enough data of each type for reliable Chi2 Contingency test. Need at least 5.'
-        self.assertion_params['chi2_test'] = partial(_chi2_test, np.array(counts))
+        self.update_param('chi2_test', partial(_chi2_test, np.array(counts), pvalue=self.pvalue,
+                                               categories=categories))
+
+    def update_param(self, param_key, param_value):
+        """Update value in assertion param dictionary attribute.
+
+        Setting chi2_test rebuilds the hash table counting test data into its categories.
+
+        Parameters
+        ----------
+        param_key : string
+            This is the assertion param that we want to update.
+        param_value : real number or partially evaluated test.
+            This is the updated value.
+
+        Returns
+        -------
+        None
+
+        """
+        super(CategoricalEvaluator, self).update_param(param_key, param_value)
+        if param_key == 'chi2_test':
+            categories = getattr(param_value, 'keywords', {}).get('categories')
+            self._chi2_encoder_ = None if categories is None else CategoryEncoder(categories)
 
     def update_exist(self, input_data):
         """Create input data for test checking whether all categorical outputs exist.
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or CategoricalProfile
             This the reference data for the check_exist. All future data will be compared to it.
 
         Returns
@@ -162,9 +283,19 @@ class CategoricalEvaluator(ParentPredEval):
         None
 
         """
-        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
-        assert len(input_data.shape) == 1, 'Input data not a single vector'
-        self.assertion_params['cat_exists'] = np.unique(input_data)
+        if isinstance(input_data, CategoricalProfile):
+            categories, counts = input_data.categories, input_data.counts
+        else:
+            input_data = as_categories(input_data)
+            assert len(input_data.shape) == 1, 'Input data not a single vector'
+            if self.top_k is None:
+                self.assertion_params['cat_exists'] = np.unique(input_data)
+                return
+            categories, counts = np.unique(input_data, return_counts=True)
+        if self.top_k is not None:
+            # only the tracked categories are kept, so memory does not grow with the categories.
+            categories = np.sort(categories[_top_categories(counts, self.top_k)])
+        self.assertion_params['cat_exists'] = categories
 
     def check_chi2(self, test_data):
         """Test whether test_data is similar to reference data.
@@ -172,6 +303,10 @@ class CategoricalEvaluator(ParentPredEval):
         If the returned chi2-test-statistic is greater than the threshold (default 2),
         the test failed.
 
+        test_data is counted into the reference categories with a hash table (see
+        predeval.encoding). In the high-cardinality mode (top_k), values outside the top_k
+        reference categories are counted in an "other" bucket.
+
         The threshold is set by assertion_params['chi2_test'].
 
         Uses `chi2_contingency test from scipy
@@ -179,7 +314,7 @@ class CategoricalEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        test_data : list or np.array
+        test_data : list or np.array or Histogram
             This the data that will be compared to the reference data.
 
         Returns
@@ -191,16 +326,35 @@ class CategoricalEvaluator(ParentPredEval):
         assert self.assertion_params['chi2_test'], 'Must input or load reference data chi2-test'
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        _, counts = np.unique(test_data, return_counts=True)
-        assert all([x >= 5 for x in counts]), \
-            'Not enough data of each type for reliable Chi2 Contingency test. '\
-            'Need at least 5 values in each cell.'
+        if isinstance(test_data, Histogram):
+            test_data, weights = test_data.values, test_data.counts
+        else:
+            weights = None
+        missing = False
+        if self._chi2_encoder_ is None:
+            if weights is None:
+                _, counts = np.unique(as_categories(test_data), return_counts=True)
+            else:
+                counts = weights
+        elif self.top_k is not None:
+            counts = np.append(*self._chi2_encoder_.count(test_data, weights=weights))
+        else:
+            counts, unknown = self._chi2_encoder_.count(test_data, weights=weights)
+            missing = bool(unknown) or not np.all(counts)
+            counts = counts[counts > 0]
+        if self.top_k is None:
+            assert all([x >= 5 for x in counts]), \
+                'Not enough data of each type for reliable Chi2 Contingency test. '\
+                'Need at least 5 values in each cell.'
         try:
+            if missing:
+                raise ValueError('Test data does not have the reference categories')
             test_stat, p_value, _, _ = self.assertion_params['chi2_test'](counts)  # pylint: disable=E1102
         except ValueError:
             test_stat = 1000.0
             p_value = 0.00
             print('WARNING: NOT ALL CATEGORIES PRESENT')
+        self.last_statistics['chi2'] = test_stat
         passed = True if test_stat <= self.assertion_params['chi2_stat'] else False
         pass_fail = 'Passed' if passed else 'Failed'
         if self.verbose:
@@ -214,12 +368,17 @@ class CategoricalEvaluator(ParentPredEval):
         """Check that all distinct values present in test_data.
 
         If any values missing, then the function will return a False (rather than true).
+        In the high-cardinality mode (top_k), only the top_k reference categories are expected
+        and other values are allowed.
+
+        Values are matched to the expected categories with a hash table (see predeval.encoding),
+        which is built once for each set of expected categories.
 
         The expected values is controlled by assertion_params['cat_exists'].
 
         Parameters
         ----------
-        test_data : list or np.array
+        test_data : list or np.array or Histogram
             This the data that will be compared to the reference data.
 
         Returns
@@ -229,12 +388,23 @@ class CategoricalEvaluator(ParentPredEval):
         """
         assert self.assertion_params['cat_exists'] is not None,\
             'Must input or load reference categories'
-        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        test_data = test_data.values if isinstance(test_data, Histogram) else as_categories(test_data)
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        obs = np.unique(np.array(test_data))
-        exp = list(self.assertion_params['cat_exists'])
-        passed = True if all([x in exp for x in obs]) and all([x in obs for x in exp]) else False
+        encoder = self._exist_encoder(self.assertion_params['cat_exists'])
+        counts, unknown = encoder.count(test_data)
+        present = counts > 0
+        passed = True if np.all(present) and (not unknown or self.top_k is not None) else False
         pass_fail = 'Passed' if passed else 'Failed'
         if self.verbose:
+            unknown = unknown and self.top_k is None
+            unknown_values = test_data[encoder.encode(test_data) < 0] if unknown else test_data[:0]
+            obs = np.union1d(encoder.categories[present], unknown_values)
+            exp = list(self.assertion_params['cat_exists'])
             print('{0} exist check; observed={1} (Expected {2})'.format(pass_fail, obs, exp))
         return ('exist', passed)
+
+    def _exist_encoder(self, categories):
+        """Get the encoder of the expected categories, rebuilding it when they change."""
+        if self._exist_encoder_ is None or self._exist_encoder_[0] is not categories:
+            self._exist_encoder_ = (categories, CategoryEncoder(categories))
+        return self._exist_encoder_[1]
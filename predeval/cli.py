@@ -0,0 +1,303 @@
+"""Command line interface for evaluating many prediction files against one reference."""
+from functools import partial
+from itertools import chain
+from multiprocessing import Pool
+import argparse
+import csv
+import json
+import os
+import pickle
+import sys
+import numpy as np
+from .continuous import ContinuousEvaluator
+from .categorical import CategoricalEvaluator
+from .history import HistoryStore
+from .profiles import ContinuousProfile, CategoricalProfile
+from .store import ReferenceStore, shared_memory
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+_EVALUATORS = {
+    'continuous': (ContinuousEvaluator, ContinuousProfile),
+    'categorical': (CategoricalEvaluator, CategoricalProfile),
+}
+
+# evaluator shared by the worker processes (set by _init_worker) and the store holding its arrays.
+_WORKER_EVALUATOR = None
+_WORKER_STORE = None
+
+
+def iter_chunks(path, column=None, chunk_size=1000000, dtype=float):
+    """Read a prediction file in chunks.
+
+    .npy files are memory mapped, .npz files are read one array at a time and csv files are
+    read chunk_size rows at a time.
+
+    Parameters
+    ----------
+    path : str
+        Path to a .npy, .npz or .csv file.
+    column : str, optional
+        Array name in a .npz file, or column name or index in a .csv file.
+        Defaults to the first array or column.
+    chunk_size : int, optional
+        Number of values in each chunk. Default is 1000000.
+    dtype : type, optional
+        Type of the values read from csv files. Default is float.
+
+    Yields
+    ------
+    np.array
+        The next chunk of values.
+
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.npy', '.npz'):
+        if extension == '.npy':
+            data = np.load(path, mmap_mode='r')
+        else:
+            with np.load(path, allow_pickle=False) as archive:
+                data = archive[column if column is not None else archive.files[0]]
+        assert len(data.shape) == 1, 'Input data not a single vector'
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+        return
+    assert extension == '.csv', 'Unsupported file type {0}'.format(extension)
+    with open(path) as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader)
+        if column is None:
+            index = 0
+        elif column in header:
+            index = header.index(column)
+        else:
+            index = int(column)
+        chunk = []
+        for row in reader:
+            chunk.append(row[index])
+            if len(chunk) == chunk_size:
+                yield np.array(chunk, dtype=dtype)
+                chunk = []
+        if chunk:
+            yield np.array(chunk, dtype=dtype)
+
+
+def read_array(path, column=None, dtype=float):
+    """Read a whole prediction file (see iter_chunks).
+
+    Parameters
+    ----------
+    path : str
+        Path to a .npy, .npz or .csv file.
+    column : str, optional
+        Array name in a .npz file, or column name or index in a .csv file.
+    dtype : type, optional
+        Type of the values read from csv files. Default is float.
+
+    Returns
+    -------
+    np.array
+
+    """
+    if os.path.splitext(path)[1].lower() == '.npy':
+        return np.load(path, mmap_mode='r')
+    chunks = list(iter_chunks(path, column=column, dtype=dtype))
+    return np.concatenate(chunks) if chunks else np.array([], dtype=dtype)
+
+
+def build_evaluator(paths, kind='continuous', assertions=None, column=None, **kwargs):
+    """Build an evaluator from reference files one chunk at a time.
+
+    Parameters
+    ----------
+    paths : list of str
+        Reference files.
+    kind : str, optional
+        Either 'continuous' or 'categorical'. Default is 'continuous'.
+    assertions : list of str, optional
+        Assertions passed to the evaluator.
+    column : str, optional
+        Array name or csv column holding the predictions.
+    kwargs
+        Passed to the evaluator.
+
+    Returns
+    -------
+    ContinuousEvaluator or CategoricalEvaluator
+
+    """
+    evaluator_class, profile_class = _EVALUATORS[kind]
+    dtype = float if kind == 'continuous' else str
+    profile = profile_class()
+    for path in paths:
+        for chunk in iter_chunks(path, column=column, dtype=dtype):
+            profile.update(np.asarray(chunk))
+    return evaluator_class(profile, assertions=assertions, verbose=False, **kwargs)
+
+
+def _init_worker(evaluator):
+    global _WORKER_EVALUATOR  # pylint: disable=W0603
+    _WORKER_EVALUATOR = evaluator
+
+
+def _attach_worker(manifest, payload):
+    """Load the evaluator with its reference arrays in shared memory (see predeval.store)."""
+    global _WORKER_STORE  # pylint: disable=W0603
+    _WORKER_STORE = ReferenceStore.attach(manifest)
+    _init_worker(_WORKER_STORE.loads(payload))
+
+
+def evaluate_file(path, column=None, fail_fast=False, evaluator=None, chunk_size=1000000, summary_size=100000):
+    """Evaluate one prediction file.
+
+    A file of one chunk is checked with check_data. Larger files are read as a stream of
+    chunks and checked with check_stream, so they are never held in memory. Continuous
+    distribution tests on a stream use a quantile summary of summary_size points, which is
+    exact for files of at most summary_size values.
+
+    Parameters
+    ----------
+    path : str
+        Prediction file.
+    column : str, optional
+        Array name or csv column holding the predictions.
+    fail_fast : bool, optional
+        Passed to check_data. Default is False.
+    evaluator : ContinuousEvaluator or CategoricalEvaluator, optional
+        Defaults to the evaluator of the worker process.
+    chunk_size : int, optional
+        Number of values read at a time. Default is 1000000.
+    summary_size : int, optional
+        Size of the quantile summary of continuous streams. Default is 100000.
+
+    Returns
+    -------
+    dict
+        The file, whether every test passed, the outcome of each test and the statistics
+        (or the error raised while reading or checking the file).
+
+    """
+    evaluator = _WORKER_EVALUATOR if evaluator is None else evaluator
+    dtype = str if isinstance(evaluator, CategoricalEvaluator) else float
+    try:
+        chunks = iter_chunks(path, column=column, chunk_size=chunk_size, dtype=dtype)
+        first, second = next(chunks, np.array([], dtype=dtype)), next(chunks, None)
+        if second is None:
+            output = evaluator.check_data(first, fail_fast=fail_fast)
+        else:
+            kwargs = {'summary_size': summary_size} if isinstance(evaluator, ContinuousEvaluator) else {}
+            output = evaluator.check_stream(chain([first, second], chunks), fail_fast=fail_fast, **kwargs)
+    except (AssertionError, IOError, ValueError) as error:
+        return {'file': path, 'passed': False, 'error': str(error) or repr(error)}
+    results = dict((name, None if passed is None else bool(passed)) for name, passed in output)
+    # only the statistics of tests that ran (last_statistics keeps values from earlier checks).
+    statistics = dict((name, float(evaluator.last_statistics[name])) for name, passed in results.items()
+                      if passed is not None and name in evaluator.last_statistics)
+    return {'file': path,
+            'passed': all(passed is not False for passed in results.values()),
+            'results': results,
+            'statistics': statistics}
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='predeval',
+        description='Evaluate prediction files against a reference and write one json line per file.')
+    parser.add_argument('files', nargs='*', help='prediction files (.npy, .npz or .csv) to evaluate')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--reference', action='append',
+                        help='reference file used to build the evaluator (can be repeated)')
+    source.add_argument('--load', help='pickled evaluator to load')
+    parser.add_argument('--type', dest='kind', choices=sorted(_EVALUATORS), default='continuous',
+                        help='type of model output (default: continuous)')
+    parser.add_argument('--assertion', dest='assertions', action='append',
+                        help='assertion to run (can be repeated, default: all)')
+    parser.add_argument('--column', help='npz array name or csv column (name or index)')
+    parser.add_argument('--save', help='pickle the evaluator to this path')
+    parser.add_argument('--output', help='write json lines here instead of stdout')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes (default: number of cores)')
+    parser.add_argument('--chunk-size', type=int, default=1000000,
+                        help='values read at a time; larger files are checked as streams (default: 1000000)')
+    parser.add_argument('--summary-size', type=int, default=100000,
+                        help='quantile summary size of continuous streams (default: 100000)')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='stop checking a file at its first failed test')
+    parser.add_argument('--history', help='append the outcomes to the history store in this directory')
+    parser.add_argument('--name', default='default',
+                        help='evaluator name kept in the history store (default: default)')
+    return parser
+
+
+def main(argv=None):
+    """Run the predeval command line interface.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments. Defaults to sys.argv[1:].
+
+    Returns
+    -------
+    int
+        0 if every file passed, 1 if any test failed and 2 if any file could not be checked.
+
+    """
+    args = _parser().parse_args(argv)
+    if args.load:
+        with open(args.load, 'rb') as evaluator_file:
+            evaluator = pickle.load(evaluator_file)
+    else:
+        evaluator = build_evaluator(args.reference, kind=args.kind, assertions=args.assertions,
+                                    column=args.column)
+    evaluator.verbose = False
+    if args.save:
+        with open(args.save, 'wb') as evaluator_file:
+            pickle.dump(evaluator, evaluator_file)
+
+    check_file = partial(evaluate_file, column=args.column, fail_fast=args.fail_fast,
+                         chunk_size=args.chunk_size, summary_size=args.summary_size)
+    store = None
+    if args.jobs > 1 and len(args.files) > 1:
+        if shared_memory is not None:
+            # workers attach to one shared copy of the reference arrays instead of each getting a copy.
+            store = ReferenceStore()
+            payload = store.dumps(evaluator)
+            pool = Pool(processes=args.jobs, initializer=_attach_worker, initargs=(store.share(), payload))
+        else:  # pragma: no cover
+            pool = Pool(processes=args.jobs, initializer=_init_worker, initargs=(evaluator,))
+        outcomes = pool.imap(check_file, args.files)
+    else:
+        pool = None
+        _init_worker(evaluator)
+        outcomes = map(check_file, args.files)
+
+    status = 0
+    output = open(args.output, 'w') if args.output else sys.stdout
+    history = HistoryStore(args.history) if args.history else None
+    try:
+        for outcome in outcomes:
+            output.write(json.dumps(outcome) + '\n')
+            output.flush()
+            if history is not None and 'results' in outcome:
+                history.record(args.name, outcome['results'].items(), statistics=outcome['statistics'])
+            if 'error' in outcome:
+                status = 2
+            elif not outcome['passed']:
+                status = max(status, 1)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if store is not None:
+            store.unlink()
+        if history is not None:
+            history.close()
+        if args.output:
+            output.close()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
@@ -1,13 +1,418 @@
 """Library of classes for evaluating continuous model outputs."""
+from concurrent.futures import ThreadPoolExecutor
 from numbers import Real
 from functools import partial
 import numpy as np
-from scipy import stats
+from scipy.special import gammaln, kv
 from .parent import ParentPredEval
+from .histogram import Histogram
+from .profiles import ContinuousProfile
+from .kernels import finite_slice, get_backend, ks_asymptotic_pvalue
 
 __author__ = 'Dan Vatterott'
 __license__ = 'MIT'
 
+# size of the sample bracketing each quantile before it is selected from the test data.
+_BRACKET_SAMPLE = 1 << 12
+
+
+def _weighted_cdf(values, weights, grid):
+    """Evaluate the (weighted) empirical cdf of sorted values at grid."""
+    if weights is None:
+        return np.searchsorted(values, grid, side='right') / float(len(values))
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    return cumulative[np.searchsorted(values, grid, side='right')] / cumulative[-1]
+
+
+def _weighted_ks_test(ref_values, ref_weights, test_data, pvalue='asymptotic'):
+    """Two-sample ks-test against a weighted reference sample.
+
+    The p-value is the asymptotic one of scipy's ks_2samp (see predeval.kernels), with the
+    total weight of each sample as its sample size, so it matches the p-value of array data.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Sorted reference values (e.g., the quantile summary of a ContinuousProfile).
+    ref_weights : np.array or None
+        Weight of each reference value. None gives every value a weight of 1.
+    test_data : list or np.array or Histogram
+        This the data compared to the reference data.
+    pvalue : str or None, optional
+        None skips the p-value (it is returned as nan). Default is 'asymptotic'.
+
+    Returns
+    -------
+    statistic : float
+        The ks-test-statistic.
+    pvalue : float
+        The p-value of the test.
+
+    """
+    if isinstance(test_data, Histogram):
+        test_values, test_weights = test_data.values, test_data.counts
+    else:
+        test_values, test_weights = np.sort(test_data), None
+    grid = np.concatenate([ref_values, test_values])
+    statistic = np.max(np.abs(_weighted_cdf(ref_values, ref_weights, grid) -
+                              _weighted_cdf(test_values, test_weights, grid)))
+    if pvalue is None:
+        return statistic, np.nan
+    n_ref = len(ref_values) if ref_weights is None else np.sum(ref_weights)
+    n_test = len(test_values) if test_weights is None else np.sum(test_weights)
+    return statistic, ks_asymptotic_pvalue(statistic, n_ref, n_test)
+
+
+def _ks_test(ref_values, backend, test_data, pvalue='auto'):
+    """Two-sample ks-test against sorted reference values.
+
+    Arrays go to the backend's ks_2samp and histograms to the weighted ks-test.
+
+    With pvalue 'asymptotic' or None, the statistic is computed directly from the sorted
+    samples and scipy's exact p-value is never computed.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Sorted reference values.
+    backend : Backend
+        Kernels running the test (see predeval.kernels).
+    test_data : np.array or Histogram
+        Sorted data compared to the reference data.
+    pvalue : str or None, optional
+        'auto' (exact p-values for small samples, as in scipy), 'asymptotic' or None (the
+        p-value is returned as nan). Default is 'auto'.
+
+    Returns
+    -------
+    statistic : float
+        The ks-test-statistic.
+    pvalue : float
+        The p-value of the test.
+
+    """
+    if isinstance(test_data, Histogram):
+        return _weighted_ks_test(ref_values, None, test_data,
+                                 pvalue=None if pvalue is None else 'asymptotic')
+    if pvalue == 'auto':
+        return backend.ks_2samp(ref_values, test_data)
+    statistic = backend.ks_statistic(ref_values, test_data)
+    if pvalue is None:
+        return statistic, np.nan
+    return statistic, ks_asymptotic_pvalue(statistic, len(ref_values), len(test_data))
+
+
+def _ecdf_counts(values, weights, grid):
+    """Weight of the sorted values below and at or below each grid point."""
+    if weights is None:
+        return (np.searchsorted(values, grid, side='left').astype(float),
+                np.searchsorted(values, grid, side='right').astype(float))
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    return (cumulative[np.searchsorted(values, grid, side='left')],
+            cumulative[np.searchsorted(values, grid, side='right')])
+
+
+def _pooled_counts(ref_values, ref_weights, test_data):
+    """Find the distinct pooled values and the weight of each sample below and at each one.
+
+    Both samples are already sorted, so pooling them is a merge rather than a full sort.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Sorted reference values.
+    ref_weights : np.array or None
+        Weight of each reference value. None gives every value a weight of 1.
+    test_data : np.array or Histogram
+        Sorted data compared to the reference data.
+
+    Returns
+    -------
+    grid : np.array
+        Sorted distinct values of both samples.
+    counts : list of tuples
+        For the reference and the test data, the weight below and at or below each grid value.
+
+    """
+    if isinstance(test_data, Histogram):
+        test_values, test_weights = test_data.values, test_data.counts
+    else:
+        test_values, test_weights = test_data, None
+    pooled = np.concatenate([ref_values, test_values])
+    pooled.sort(kind='mergesort')
+    grid = pooled[np.concatenate([[True], pooled[1:] != pooled[:-1]])]
+    return grid, [_ecdf_counts(ref_values, ref_weights, grid),
+                  _ecdf_counts(test_values, test_weights, grid)]
+
+
+# critical values and significance levels of the two-sample Anderson-Darling test
+# (table 2 of Scholz and Stephens 1987 with one degree of freedom).
+_AD_CRITICAL = np.array([0.325, 1.226, 1.961, 2.718, 3.752, 4.592, 6.546])
+_AD_LEVELS = np.array([0.25, 0.1, 0.05, 0.025, 0.01, 0.005, 0.001])
+
+
+def _ad_test(ref_values, ref_weights, test_data):
+    """Two-sample Anderson-Darling test (the midrank version of Scholz and Stephens 1987).
+
+    Gives the same result as `anderson_ksamp from scipy
+    <https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.anderson_ksamp.html>`_
+    without sorting either sample again. The p-value is interpolated from the critical
+    values, so it is capped at 0.25 and floored at 0.001.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Sorted reference values.
+    ref_weights : np.array or None
+        Weight of each reference value. None gives every value a weight of 1.
+    test_data : np.array or Histogram
+        Sorted data compared to the reference data.
+
+    Returns
+    -------
+    statistic : float
+        The normalized Anderson-Darling test statistic.
+    pvalue : float
+        The approximate p-value of the test.
+
+    """
+    _, counts = _pooled_counts(ref_values, ref_weights, test_data)
+    below = counts[0][0] + counts[1][0]
+    ties = counts[0][1] + counts[1][1] - below
+    sizes = np.array([upto[-1] for _, upto in counts])
+    total = sizes.sum()
+    midrank = below + ties / 2.
+    statistic = 0.
+    for (sample_below, sample_upto), size in zip(counts, sizes):
+        midcount = (sample_below + sample_upto) / 2.
+        statistic += np.sum(ties / total * (total * midcount - midrank * size) ** 2 /
+                            (midrank * (total - midrank) - total * ties / 4.)) / size
+    statistic *= (total - 1.) / total
+
+    n_total = int(round(total))
+    inverse = (1. / sizes).sum()
+    harmonic = (1. / np.arange(n_total - 1, 1, -1)).cumsum()
+    h = harmonic[-1] + 1
+    g = (harmonic / np.arange(2, n_total)).sum()
+    a = (4 * g - 6) + (10 - 6 * g) * inverse
+    b = (2 * g - 4) * 4 + 16 * h + (2 * g - 14 * h - 4) * inverse - 8 * h + 4 * g - 6
+    c = (6 * h + 2 * g - 2) * 4 + (4 * h - 4 * g + 6) * 2 + (2 * h - 6) * inverse + 4 * h
+    d = (2 * h + 6) * 4 - 8 * h
+    variance = ((a * n_total ** 3 + b * n_total ** 2 + c * n_total + d) /
+                ((n_total - 1.) * (n_total - 2.) * (n_total - 3.)))
+    statistic = (statistic - 1) / np.sqrt(variance)
+
+    if statistic < _AD_CRITICAL[0]:
+        pvalue = _AD_LEVELS[0]
+    elif statistic > _AD_CRITICAL[-1]:
+        pvalue = _AD_LEVELS[-1]
+    else:
+        pvalue = np.exp(np.polyval(np.polyfit(_AD_CRITICAL, np.log(_AD_LEVELS), 2), statistic))
+    return statistic, pvalue
+
+
+def _cvm_cdf(statistic):
+    """Limiting cdf of the Cramer-von Mises statistic (Csorgo and Faraway 1996)."""
+    total, k = 0., 0
+    while True:
+        y = 4 * k + 1
+        q = y ** 2 / (16 * statistic)
+        term = (np.exp(gammaln(k + 0.5) - gammaln(k + 1)) / (np.pi ** 1.5 * np.sqrt(statistic)) *
+                np.sqrt(y) * np.exp(-q) * kv(0.25, q))
+        total += term
+        if abs(term) < 1e-7:
+            return total
+        k += 1
+
+
+def _cvm_test(ref_values, ref_weights, test_data):
+    """Two-sample Cramer-von Mises test.
+
+    Gives the same result as `cramervonmises_2samp from scipy
+    <https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.cramervonmises_2samp.html>`_
+    (with midranks for ties and the asymptotic p-value) without sorting either sample again.
+    The rank sums are computed per distinct value, from the counts below and at each value.
+
+    Parameters
+    ----------
+    ref_values : np.array
+        Sorted reference values.
+    ref_weights : np.array or None
+        Weight of each reference value. None gives every value a weight of 1.
+    test_data : np.array or Histogram
+        Sorted data compared to the reference data.
+
+    Returns
+    -------
+    statistic : float
+        The Cramer-von Mises test statistic.
+    pvalue : float
+        The p-value of the test.
+
+    """
+    _, counts = _pooled_counts(ref_values, ref_weights, test_data)
+    below = counts[0][0] + counts[1][0]
+    midrank = below + (counts[0][1] + counts[1][1] - below + 1) / 2.
+    n_ref, n_test = counts[0][1][-1], counts[1][1][-1]
+    total = n_ref + n_test
+    product = n_ref * n_test
+    rank_sum = 0.
+    for (sample_below, sample_upto), size in zip(counts, [n_ref, n_test]):
+        # sum of (midrank - position in the sample) ** 2 over the sample's tied values.
+        tied = sample_upto - sample_below
+        rank_sum += size * np.sum(tied * (midrank - sample_below - (tied + 1) / 2.) ** 2 +
+                                  tied * (tied ** 2 - 1) / 12.)
+    statistic = rank_sum / (product * total) - (4 * product - 1) / (6 * total)
+
+    expected = (1 + 1 / total) / 6
+    variance = ((total + 1) * (4 * product * total - 3 * (n_ref ** 2 + n_test ** 2) - 2 * product) /
+                (45 * total ** 2 * 4 * product))
+    normalized = 1 / 6. + (statistic - expected) / np.sqrt(45 * variance)
+    pvalue = 1.0 if normalized < 0.003 else max(0, 1. - _cvm_cdf(normalized))
+    return statistic, pvalue
+
+
+# smallest block of test data worth computing moments on its own thread.
+_MIN_BLOCK_SIZE = 1 << 20
+
+
+def _block_moments(moments, n_jobs, test_data):
+    """Compute moments of blocks of test_data on separate threads and combine them.
+
+    The block means and variances are combined with Chan's parallel algorithm.
+
+    Parameters
+    ----------
+    moments : func
+        Computes the min, max, mean and std of one block (see predeval.kernels).
+    n_jobs : int
+        Largest number of blocks (and threads).
+    test_data : np.array
+        This the data that will be compared to the reference data.
+
+    Returns
+    -------
+    minimum, maximum, mean, std, nonfinite
+
+    """
+    n_blocks = min(n_jobs, len(test_data) // _MIN_BLOCK_SIZE)
+    if n_blocks < 2:
+        return moments(test_data)
+    blocks = np.array_split(test_data, n_blocks)
+    with ThreadPoolExecutor(n_blocks) as pool:
+        minimums, maximums, means, stds, nonfinites = zip(*pool.map(moments, blocks))
+    sizes = np.array([len(block) for block in blocks], dtype=float) - nonfinites
+    nonfinite = int(np.sum(nonfinites))
+    if not sizes.any():
+        return np.nan, np.nan, np.nan, np.nan, nonfinite
+    # blocks without finite values have nan moments and no weight.
+    finite = sizes > 0
+    sizes, means, stds = sizes[finite], np.array(means)[finite], np.array(stds)[finite]
+    mean = np.sum(sizes * means) / sizes.sum()
+    m2 = np.sum(sizes * (np.square(stds) + (means - mean) ** 2))
+    return (np.min(np.array(minimums)[finite]), np.max(np.array(maximums)[finite]), mean,
+            np.sqrt(m2 / sizes.sum()), nonfinite)
+
+
+def _histogram_moments(histogram):
+    """Min, max, mean and std of a histogram's finite values (and its number of non-finite values)."""
+    if len(histogram.values) == 0:
+        return np.nan, np.nan, np.nan, np.nan, histogram.nonfinite
+    return histogram.moments() + (histogram.nonfinite,)
+
+
+def _finite_values(input_data):
+    """The finite values of reference data (the data itself when every value is finite)."""
+    if isinstance(input_data, (ContinuousProfile, Histogram)):
+        return input_data
+    input_data = np.asarray(input_data)
+    if input_data.dtype.kind != 'f':
+        return input_data
+    finite = np.isfinite(input_data)
+    return input_data if finite.all() else input_data[finite]
+
+
+def _sort(test_data):
+    """Sort the finite test data (histograms are already sorted and profiles give their histogram)."""
+    if isinstance(test_data, ContinuousProfile):
+        return test_data.to_histogram()
+    return test_data if isinstance(test_data, Histogram) else finite_slice(np.sort(test_data))
+
+
+def _interpolate(levels, count, value_at):
+    """Quantiles of count values, interpolated linearly like np.quantile, from the value at each rank."""
+    positions = np.asarray(levels, dtype=float) * max(count - 1, 0)
+    lower = np.floor(positions)
+    below = value_at(lower.astype(np.int64)).astype(np.float64)
+    above = value_at(np.minimum(lower.astype(np.int64) + 1, max(count - 1, 0)))
+    return below + (positions - lower) * (above - below)
+
+
+def _sorted_quantiles(values, levels, weights=None):
+    """Quantiles of sorted values, each with a weight (default 1)."""
+    assert len(values) > 0, 'Need at least one finite value'
+    if weights is None:
+        return _interpolate(levels, len(values), values.__getitem__)
+    # the value at rank r is the first whose cumulative weight exceeds r.
+    cumulative = np.cumsum(weights)
+    return _interpolate(levels, cumulative[-1], lambda ranks: values[np.minimum(
+        np.searchsorted(cumulative, ranks, side='right'), len(values) - 1)])
+
+
+def _bracketed_ranks(values, sample, ranks):
+    """Values at nearby ranks of values, selected among the values between two sample values.
+
+    Sample value j estimates rank j * n / m of the n values, so a few binomial standard
+    deviations either side of it bracket the ranks. The values inside the bracket are found
+    with vectorized comparisons and only they are partitioned. None when the bracket misses.
+    """
+    n_values, n_sample = len(values), len(sample)
+    level = min(max(ranks[0] / float(n_values), 1. / n_sample), 1 - 1. / n_sample)
+    margin = int(5 * np.sqrt(n_sample * level * (1 - level))) + 5
+    first = int(ranks[0] * n_sample / n_values) - margin
+    last = int(ranks[-1] * n_sample / n_values) + margin
+    inside = np.ones(n_values, dtype=bool)
+    below = 0
+    if first >= 0:
+        inside &= values >= sample[first]
+        below = n_values - np.count_nonzero(inside)
+    if last < n_sample:
+        inside &= values <= sample[last]
+    candidates = values[inside]
+    if not below <= ranks[0] <= ranks[-1] < below + len(candidates):
+        return None
+    return np.partition(candidates, ranks - below)[ranks - below]
+
+
+def _select_ranks(values, ranks):
+    """Values at the given ranks of values (as if sorted) without sorting them."""
+    ranks = np.asarray(ranks)
+    if len(values) <= 16 * _BRACKET_SAMPLE:
+        return np.partition(values, np.unique(ranks))[ranks]
+    # a fixed seed keeps the work (never the result) the same from call to call.
+    sample = np.sort(values[np.random.RandomState(0).randint(0, len(values), _BRACKET_SAMPLE)])
+    selected = np.empty(len(ranks), dtype=values.dtype)
+    # the ranks of one quantile (and of nearby quantiles) share a bracket.
+    order = np.argsort(ranks, kind='mergesort')
+    groups = np.split(order, np.flatnonzero(np.diff(ranks[order]) > len(values) // _BRACKET_SAMPLE) + 1)
+    for group in groups:
+        found = _bracketed_ranks(values, sample, ranks[group])
+        selected[group] = np.partition(values, np.unique(ranks[group]))[ranks[group]] if found is None else found
+    return selected
+
+
+def _select_quantiles(levels, test_data):
+    """Quantiles of the finite test data, selected in linear time rather than by a sort."""
+    if isinstance(test_data, Histogram):
+        return _sorted_quantiles(test_data.values, levels, test_data.counts)
+    values = _finite_values(test_data)
+    assert len(values) > 0, 'Need at least one finite value'
+    levels = np.asarray(levels, dtype=float)
+    positions = np.floor(levels * (len(values) - 1)).astype(np.int64)
+    ranks = np.unique(np.concatenate([positions, np.minimum(positions + 1, len(values) - 1)]))
+    selected = _select_ranks(values, ranks)
+    return _interpolate(levels, len(values), lambda at: selected[np.searchsorted(ranks, at)])
+
 
 class ContinuousEvaluator(ParentPredEval):
     """
@@ -17,18 +422,33 @@ class ContinuousEvaluator(ParentPredEval):
     attribute (['min', 'max', 'mean', 'std', 'ks_test']).
     You can change the tests that will run by listing the desired tests in the assertions parameter.
 
-    The available tests are min, max, mean, std, and ks_test.
+    The available tests are min, max, mean, std, ks_test, ad_test, cvm_test, finite and
+    quantile.
+
+    nan and inf values are left out of every test except finite, which checks how often
+    they occur. They are counted in the same pass as the moments, without copying the data.
 
     ...
 
     Parameters
     ----------
-    ref_data : list of int or float or np.array
+    ref_data : list of int or float or np.array or ContinuousProfile or Histogram
         This the reference data for all tests. All future data will be compared to this data.
+        A Histogram is turned into a ContinuousProfile.
     assertions : list of str, optional
         These are the assertion tests that will be created. Defaults is ['chi2_test', 'exist'].
     verbose : bool, optional
         Whether tests should print their output. Default is true
+    backend : str, optional
+        Kernels used by the checks: 'numba', 'numpy' or 'auto' (numba when it is installed).
+        Default is 'auto'. See predeval.kernels.
+    pvalue : str or None, optional
+        How the ks-test p-value is computed: 'auto' (as scipy's ks_2samp, which is exact for
+        small samples), 'asymptotic' or None (not computed, only the statistic decides the
+        test). Default is 'auto'.
+    dtype : numpy dtype, optional
+        Type the reference data is stored in (e.g., np.float32). Default is None (arrays keep
+        their type). See the compact dtypes section of the usage docs.
 
     Attributes
     ----------
@@ -47,18 +467,58 @@ class ContinuousEvaluator(ParentPredEval):
             ks-test-statistic. When this value is exceeded. The test 'failed'.
         * ks_test : func
             Partially evaluated ks test.
+        * ad_stat : float
+            Anderson-Darling test statistic. When this value is exceeded. The test 'failed'.
+        * ad_test : func
+            Partially evaluated Anderson-Darling test.
+        * cvm_stat : float
+            Cramer-von Mises test statistic. When this value is exceeded. The test 'failed'.
+        * cvm_test : func
+            Partially evaluated Cramer-von Mises test.
+        * nonfinite_rate : float
+            Expected fraction of nan and inf values.
+        * nonfinite_tol : float
+            Allowed excess of the observed non-finite rate over nonfinite_rate. Default is 0.
+        * quantiles : tuple of float
+            Levels of the test data quantiles checked by quantile. Default is (0.01, 0.99).
+        * quantile_band : tuple of float
+            Levels of the reference quantiles bounding them. Default is (0.005, 0.995).
+        * quantile_bounds : tuple of float
+            Reference quantiles at the quantile_band levels.
     assertions : list of str
         This list of strings describes the tests that will be run on comparison data.
         Defaults to ['min', 'max', 'mean', 'std', 'ks_test']
+    backend : str
+        Name of the kernels used by the checks ('numba' or 'numpy').
+    pvalue : str or None
+        How the ks-test p-value is computed ('auto', 'asymptotic' or None).
+    last_quantiles : np.array or None
+        Test data quantiles observed by the latest quantile check.
 
     """
+    _assertion_costs_ = {'min': 1, 'max': 1, 'mean': 1, 'std': 2, 'ks_test': 10, 'cvm_test': 11,
+                         'ad_test': 12, 'finite': 1, 'quantile': 3}
+    _profile_class_ = ContinuousProfile
+    _sampled_assertions_ = ('ks_test', 'ad_test', 'cvm_test')
+
     def __init__(
             self,
             ref_data,
             assertions=None,
             verbose=True,
+            backend='auto',
+            pvalue='auto',
+            dtype=None,
             **kwargs):
-        super(ContinuousEvaluator, self).__init__(ref_data, verbose=verbose)
+        if isinstance(ref_data, Histogram):
+            ref_data = ContinuousProfile(summary_size=max(1000, len(ref_data.values))).update(ref_data)
+        super(ContinuousEvaluator, self).__init__(ref_data, verbose=verbose, dtype=dtype)
+        self._backend_ = get_backend(backend)
+        self.backend = self._backend_.name
+        self._sorted_reference_ = None
+        self.last_quantiles = None
+        assert pvalue in ('auto', 'asymptotic', None), 'expected auto, asymptotic or None pvalue'
+        self.pvalue = pvalue
 
         # ---- Fill in Assertion Parameters ---- #
         self._assertion_params_ = {
@@ -66,12 +526,32 @@ class ContinuousEvaluator(ParentPredEval):
             'maximum': kwargs.get('max', None),
             'mean': kwargs.get('mean', None),
             'std': kwargs.get('std', None),
-            'ks_test': None
+            'ks_test': None,
+            'ad_test': None,
+            'cvm_test': None,
+            'nonfinite_rate': kwargs.get('nonfinite_rate', None),
+            'quantile_bounds': kwargs.get('quantile_bounds', None),
         }
 
         assert isinstance(kwargs.get('ks_stat', 0.5),
                           Real), 'expected number, input ks_test_stat is not a number'
         self._assertion_params_['ks_stat'] = kwargs.get('ks_stat', 0.5)
+        # defaults are the 5% critical values of the tests.
+        assert isinstance(kwargs.get('ad_stat', 1.961),
+                          Real), 'expected number, input ad_stat is not a number'
+        self._assertion_params_['ad_stat'] = kwargs.get('ad_stat', 1.961)
+        assert isinstance(kwargs.get('cvm_stat', 0.461),
+                          Real), 'expected number, input cvm_stat is not a number'
+        self._assertion_params_['cvm_stat'] = kwargs.get('cvm_stat', 0.461)
+        assert isinstance(kwargs.get('nonfinite_tol', 0),
+                          Real), 'expected number, input nonfinite_tol is not a number'
+        self._assertion_params_['nonfinite_tol'] = kwargs.get('nonfinite_tol', 0)
+        for key, default in (('quantiles', (0.01, 0.99)), ('quantile_band', (0.005, 0.995))):
+            levels = tuple(kwargs.get(key, default))
+            assert len(levels) > 0 and all(isinstance(level, Real) and 0 <= level <= 1 for level in levels), \
+                'expected levels between 0 and 1, input {0} is not levels between 0 and 1'.format(key)
+            self._assertion_params_[key] = levels
+        assert len(self._assertion_params_['quantile_band']) == 2, 'expected two quantile_band levels'
 
         # ---- create list of assertions to test ---- #
         self._possible_assertions_ = {
@@ -80,18 +560,22 @@ class ContinuousEvaluator(ParentPredEval):
             'mean': (self.update_mean, self.check_mean),
             'std': (self.update_std, self.check_std),
             'ks_test': (self.update_ks_test, self.check_ks),
+            'ad_test': (self.update_ad_test, self.check_ad),
+            'cvm_test': (self.update_cvm_test, self.check_cvm),
+            'finite': (self.update_finite, self.check_finite),
+            'quantile': (self.update_quantile, self.check_quantile),
         }
 
         # ---- create list of assertions to test ---- #
         assertions = ['min', 'max', 'mean', 'std', 'ks_test'] if assertions is None else assertions
         self._assertions_ = self._check_assertion_types(assertions)
 
-        # ---- populate assertion tests with reference data ---- #
-        for i in self._assertions_:
-            self._possible_assertions[i][0](self.ref_data)
+        self._statistic_functions_['moments'] = self._moments
+        self._statistic_functions_['sorted'] = partial(self._statistic, 'sorted', func=_sort)
+        self._statistic_functions_['quantiles'] = self._quantiles
 
-        if ('std' not in assertions) and ('mean' in assertions):
-            self._possible_assertions['std'][0](self.ref_data)
+        # ---- populate assertion tests with reference data ---- #
+        self._update_assertions(self.ref_data)
 
         # ---- populate list of tests to run and run tests ---- #
         self._tests_ = [self._possible_assertions_[i][1] for i in self._assertions_]
@@ -112,15 +596,79 @@ class ContinuousEvaluator(ParentPredEval):
     def _tests(self):
         return self._tests_
 
+    def _update_assertions(self, ref_data):
+        """Run the update method of every assertion (and std for the mean check) on ref_data.
+
+        Non-finite reference values are left out of every update but finite's.
+        """
+        finite_data = _finite_values(ref_data)
+        for i in self.assertions:
+            self._possible_assertions[i][0](ref_data if i == 'finite' else finite_data)
+        if ('std' not in self.assertions) and ('mean' in self.assertions):
+            self._possible_assertions['std'][0](finite_data)
+
+    def _moments(self, test_data):
+        """Min, max, mean and std of the finite values of test_data and the number of non-finite
+        values, computed once per check_data call."""
+        if isinstance(test_data, ContinuousProfile):
+            return self._stream_statistics(test_data)['moments']
+        if isinstance(test_data, Histogram):
+            return self._statistic('moments', test_data, _histogram_moments)
+        if self.n_jobs > 1:
+            return self._statistic('moments', test_data,
+                                   partial(_block_moments, self._backend_.moments, self.n_jobs))
+        return self._statistic('moments', test_data, self._backend_.moments)
+
+    def _quantiles(self, test_data):
+        """Quantiles of the finite test data at the assertion_params['quantiles'] levels.
+
+        A sort of the whole test data made by the ECDF-based tests is reused. Otherwise the
+        quantiles are selected in linear time, computed once per check_data call.
+        """
+        levels = self.assertion_params['quantiles']
+        if isinstance(test_data, ContinuousProfile):
+            return _sorted_quantiles(test_data.summary_values, levels, test_data.summary_weights)
+        sorted_data = (self._batch_statistics_ or {}).get('sorted')
+        # with sampling, the ECDF-based tests sort a sample rather than the test data.
+        if (isinstance(sorted_data, np.ndarray) and
+                (self.sample_size is None or len(test_data) <= self.sample_size)):
+            return _sorted_quantiles(sorted_data, levels)
+        return self._statistic('quantiles', test_data, partial(_select_quantiles, levels))
+
+    def _stream_statistics(self, profile):
+        """The profile's exact moments (see check_stream)."""
+        return {'moments': (profile.minimum, profile.maximum, profile.mean, profile.std, profile.nonfinite)}
+
+    def _reference_sample(self, input_data):
+        """Sorted reference values and their weights (None when every weight is 1).
+
+        Raw reference data is sorted once and shared by all ECDF-based tests.
+        """
+        if isinstance(input_data, ContinuousProfile):
+            if input_data.exact:
+                return input_data.summary_values, None
+            return input_data.summary_values, input_data.summary_weights
+        if self._sorted_reference_ is None or self._sorted_reference_[0] is not input_data:
+            input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+            assert len(input_data.shape) == 1, 'Input data not a single vector'
+            self._sorted_reference_ = (input_data, finite_slice(np.sort(input_data)))
+        return self._sorted_reference_[1], None
+
     def update_ks_test(self, input_data):
         """Create partially evaluated ks_test.
 
         Uses `Kolmogorov-Smirnov test from scipy
         <https://docs.scipy.org/doc/scipy/reference/generated/scipy.stats.kstest.html>`_.
 
+        The reference data is sorted once here. The test runs on the backend's kernels,
+        which give the same results as scipy. Histogram test data gets the weighted ks-test.
+
+        When input_data is a ContinuousProfile whose quantile summary has been compressed,
+        the test compares against the weighted summary instead.
+
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or ContinuousProfile
             This the reference data for the ks-test. All future data will be compared to this data.
 
         Returns
@@ -128,16 +676,108 @@ class ContinuousEvaluator(ParentPredEval):
         None
 
         """
-        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+        values, weights = self._reference_sample(input_data)
         assert len(input_data) >= 25, 'Not enough data for reliable KS tests'
-        self.assertion_params['ks_test'] = partial(stats.ks_2samp, np.array(input_data))
+        if weights is None:
+            self.assertion_params['ks_test'] = partial(_ks_test, values, self._backend_,
+                                                       pvalue=self.pvalue)
+        else:
+            self.assertion_params['ks_test'] = partial(
+                _weighted_ks_test, values, weights, pvalue=None if self.pvalue is None else 'asymptotic')
+
+    def update_ad_test(self, input_data):
+        """Create partially evaluated Anderson-Darling test (see _ad_test).
+
+        Shares the sorted reference data with the ks-test.
+
+        Parameters
+        ----------
+        input_data : list or np.array or ContinuousProfile
+            This the reference data for the ad-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        values, weights = self._reference_sample(input_data)
+        assert len(input_data) >= 25, 'Not enough data for reliable AD tests'
+        self.assertion_params['ad_test'] = partial(_ad_test, values, weights)
+
+    def update_cvm_test(self, input_data):
+        """Create partially evaluated Cramer-von Mises test (see _cvm_test).
+
+        Shares the sorted reference data with the ks-test.
+
+        Parameters
+        ----------
+        input_data : list or np.array or ContinuousProfile
+            This the reference data for the cvm-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        values, weights = self._reference_sample(input_data)
+        assert len(input_data) >= 25, 'Not enough data for reliable CVM tests'
+        self.assertion_params['cvm_test'] = partial(_cvm_test, values, weights)
+
+    def update_finite(self, input_data):
+        """Find the fraction of nan and inf values in input_data.
+
+        Parameters
+        ----------
+        input_data : list or np.array or ContinuousProfile
+            This the reference data for the finite-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        if isinstance(input_data, ContinuousProfile):
+            self.assertion_params['nonfinite_rate'] = input_data.nonfinite_rate
+            return
+        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+        assert len(input_data.shape) == 1, 'Input data not a single vector'
+        nonfinite = len(input_data) - np.count_nonzero(np.isfinite(input_data))
+        self.assertion_params['nonfinite_rate'] = nonfinite / float(max(len(input_data), 1))
+
+    def update_quantile(self, input_data):
+        """Find the reference quantiles at the assertion_params['quantile_band'] levels.
+
+        Raw reference data shares the sort made for the ECDF-based tests when they are
+        asserted. Otherwise its quantiles are selected without sorting it.
+
+        Parameters
+        ----------
+        input_data : list or np.array or ContinuousProfile
+            This the reference data for the quantile-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        band = self.assertion_params['quantile_band']
+        if isinstance(input_data, ContinuousProfile):
+            bounds = _sorted_quantiles(input_data.summary_values, band, input_data.summary_weights)
+        else:
+            input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+            assert len(input_data.shape) == 1, 'Input data not a single vector'
+            if self._sorted_reference_ is not None and self._sorted_reference_[0] is input_data:
+                bounds = _sorted_quantiles(self._sorted_reference_[1], band)
+            else:
+                bounds = _select_quantiles(band, input_data)
+        self.assertion_params['quantile_bounds'] = (float(bounds[0]), float(bounds[1]))
 
     def update_min(self, input_data):
         """Find min of input_data.
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or ContinuousProfile
             This the reference data for the min-test. All future data will be compared to this data.
 
         Returns
@@ -145,6 +785,9 @@ class ContinuousEvaluator(ParentPredEval):
         None
 
         """
+        if isinstance(input_data, ContinuousProfile):
+            self.assertion_params['minimum'] = input_data.minimum
+            return
         input_data = np.array(input_data) if isinstance(input_data, list) else input_data
         assert len(input_data.shape) == 1, 'Input data not a single vector'
         self.assertion_params['minimum'] = np.min(input_data)
@@ -154,7 +797,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or ContinuousProfile
             This the reference data for the max-test. All future data will be compared to this data.
 
         Returns
@@ -162,6 +805,9 @@ class ContinuousEvaluator(ParentPredEval):
         None
 
         """
+        if isinstance(input_data, ContinuousProfile):
+            self.assertion_params['maximum'] = input_data.maximum
+            return
         input_data = np.array(input_data) if isinstance(input_data, list) else input_data
         assert len(input_data.shape) == 1, 'Input data not a single vector'
         self.assertion_params['maximum'] = np.max(input_data)
@@ -171,7 +817,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or ContinuousProfile
             This the reference data for the max-test. All future data will be compared to this data.
 
         Returns
@@ -179,16 +825,19 @@ class ContinuousEvaluator(ParentPredEval):
         None
 
         """
+        if isinstance(input_data, ContinuousProfile):
+            self.assertion_params['mean'] = input_data.mean
+            return
         input_data = np.array(input_data) if isinstance(input_data, list) else input_data
         assert len(input_data.shape) == 1, 'Input data not a single vector'
-        self.assertion_params['mean'] = np.mean(input_data)
+        self.assertion_params['mean'] = np.mean(input_data, dtype=np.float64)
 
     def update_std(self, input_data):
         """Find standard deviation of input data.
 
         Parameters
         ----------
-        input_data : list or np.array
+        input_data : list or np.array or ContinuousProfile
             This the reference data for the max-test. All future data will be compared to this data.
 
         Returns
@@ -196,9 +845,12 @@ class ContinuousEvaluator(ParentPredEval):
         None
 
         """
+        if isinstance(input_data, ContinuousProfile):
+            self.assertion_params['std'] = input_data.std
+            return
         input_data = np.array(input_data) if isinstance(input_data, list) else input_data
         assert len(input_data.shape) == 1, 'Input data not a single vector'
-        self.assertion_params['std'] = np.std(input_data)
+        self.assertion_params['std'] = np.std(input_data, dtype=np.float64)
 
     def check_min(self, test_data):
         """Check whether test_data has any smaller values than expected.
@@ -207,7 +859,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        comparison_data : list or np.array, optional
+        comparison_data : list or np.array or Histogram, optional
             This the data that will be compared to the reference data.
 
         Returns
@@ -219,7 +871,8 @@ class ContinuousEvaluator(ParentPredEval):
         assert self.assertion_params['minimum'] is not None, 'Must input or load reference minimum'
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        min_obs = np.min(np.array(test_data))
+        min_obs = self._moments(test_data)[0]
+        self.last_statistics['min'] = min_obs
         passed = True if min_obs >= self.assertion_params['minimum'] else False
         pass_fail = 'Passed' if passed else 'Failed'
         if self.verbose:
@@ -233,7 +886,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        comparison_data : list or np.array, optional
+        comparison_data : list or np.array or Histogram, optional
             This the data that will be compared to the reference data.
 
         Returns
@@ -245,7 +898,8 @@ class ContinuousEvaluator(ParentPredEval):
         assert self.assertion_params['maximum'] is not None, 'Must input or load reference maximum'
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        max_obs = np.max(np.array(test_data))
+        max_obs = self._moments(test_data)[1]
+        self.last_statistics['max'] = max_obs
         passed = True if max_obs <= self.assertion_params['maximum'] else False
         pass_fail = 'Passed' if passed else 'Failed'
         if self.verbose:
@@ -264,7 +918,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        comparison_data : list or np.array, optional
+        comparison_data : list or np.array or Histogram, optional
             This the data that will be compared to the reference data.
 
         Returns
@@ -277,7 +931,8 @@ class ContinuousEvaluator(ParentPredEval):
         assert self.assertion_params['std'] is not None, 'Must input or load reference mean'
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        mean_obs = np.mean(np.array(test_data))
+        mean_obs = self._moments(test_data)[2]
+        self.last_statistics['mean'] = mean_obs
 
         two_std = self.assertion_params['std'] * 2
 
@@ -304,7 +959,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        comparison_data : list or np.array, optional
+        comparison_data : list or np.array or Histogram, optional
             This the data that will be compared to the reference data.
 
         Returns
@@ -316,7 +971,8 @@ class ContinuousEvaluator(ParentPredEval):
         assert self.assertion_params['std'] is not None, 'Must input or load reference std'
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
-        std_obs = np.std(np.array(test_data))
+        std_obs = self._moments(test_data)[3]
+        self.last_statistics['std'] = std_obs
 
         half_std = self.assertion_params['std'] * 0.5
 
@@ -333,6 +989,81 @@ class ContinuousEvaluator(ParentPredEval):
                 half_std))
         return ('std', all(passed))
 
+    def check_finite(self, test_data):
+        """Check whether test_data has more nan and inf values than expected.
+
+        The non-finite values are counted in the same pass as the moments. The test fails when
+        their fraction exceeds assertion_params['nonfinite_rate'] plus
+        assertion_params['nonfinite_tol'].
+
+        Parameters
+        ----------
+        comparison_data : list or np.array or Histogram, optional
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['nonfinite_rate'] is not None, 'Must input or load reference nonfinite_rate'
+        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        nonfinite = self._moments(test_data)[4]
+        # a histogram only holds the finite values and counts the others.
+        total = len(test_data) + nonfinite if isinstance(test_data, Histogram) else len(test_data)
+        rate_obs = nonfinite / float(max(total, 1))
+        self.last_statistics['finite'] = rate_obs
+        expected = self.assertion_params['nonfinite_rate'] + self.assertion_params['nonfinite_tol']
+        passed = True if rate_obs <= expected else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} finite check; non-finite rate observed={1:.4f} (Expected at most {2:.4f})'.format(
+                pass_fail, rate_obs, expected))
+        return ('finite', passed)
+
+    def check_quantile(self, test_data):
+        """Check whether the tails of test_data stay within the reference quantile band.
+
+        The test fails when a test data quantile at an assertion_params['quantiles'] level
+        (default the 1st and 99th percentiles) falls outside assertion_params['quantile_bounds'],
+        the reference quantiles at the quantile_band levels (default the 0.5th and 99.5th
+        percentiles). Unlike the min and max tests, a few outliers do not fail it.
+
+        last_statistics['quantile'] is the distance of the furthest quantile outside the band
+        (0 when all are inside) and last_quantiles holds the observed quantiles.
+
+        Parameters
+        ----------
+        comparison_data : list or np.array or Histogram, optional
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['quantile_bounds'] is not None, 'Must input or load reference quantile_bounds'
+        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        quantiles_obs = self._quantiles(test_data)
+        self.last_quantiles = quantiles_obs
+        lower, upper = self.assertion_params['quantile_bounds']
+        # the statistic is how far the furthest quantile lies outside the band (0 inside it).
+        distance = max(lower - quantiles_obs.min(), quantiles_obs.max() - upper, 0.)
+        self.last_statistics['quantile'] = float(distance)
+        passed = True if distance == 0 else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} quantile check; quantiles observed={1} (Expected within [{2:.4f}, {3:.4f}])'.format(
+                pass_fail,
+                np.round(quantiles_obs, 4),
+                lower,
+                upper))
+        return ('quantile', passed)
+
     def check_ks(self, test_data):
         """Test whether test_data is similar to reference data.
 
@@ -346,7 +1077,7 @@ class ContinuousEvaluator(ParentPredEval):
 
         Parameters
         ----------
-        comparison_data : list or np.array, optional
+        comparison_data : list or np.array or Histogram, optional
             This the data that will be compared to the reference data.
 
         Returns
@@ -359,7 +1090,9 @@ class ContinuousEvaluator(ParentPredEval):
         test_data = np.array(test_data) if isinstance(test_data, list) else test_data
         assert len(test_data.shape) == 1, 'Input data not a single vector'
         assert len(test_data) >= 25, 'Not enough data for reliable KS tests'
-        test_stat, p_value = self.assertion_params['ks_test'](np.array(test_data))  # pylint: disable=E1102
+        sorted_data = self._statistic('sorted', test_data, _sort)
+        test_stat, p_value = self.assertion_params['ks_test'](sorted_data)  # pylint: disable=E1102
+        self.last_statistics['ks'] = test_stat
         passed = True if test_stat <= self.assertion_params['ks_stat'] else False
         pass_fail = 'Passed' if passed else 'Failed'
         if self.verbose:
@@ -368,3 +1101,73 @@ class ContinuousEvaluator(ParentPredEval):
                 float(test_stat),
                 float(p_value)))
         return ('ks', passed)
+
+    def check_ad(self, test_data):
+        """Test whether test_data is similar to reference data with the Anderson-Darling test.
+
+        If the returned test statistic is greater than the threshold (default 1.961, the 5%
+        critical value), the test failed. The threshold is set by assertion_params['ad_stat'].
+
+        The sorted test data is shared with the other ECDF-based tests.
+
+        Parameters
+        ----------
+        comparison_data : list or np.array or Histogram, optional
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['ad_test'], 'Must input or load reference data ad-test'
+        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        assert len(test_data) >= 25, 'Not enough data for reliable AD tests'
+        sorted_data = self._statistic('sorted', test_data, _sort)
+        test_stat, p_value = self.assertion_params['ad_test'](sorted_data)  # pylint: disable=E1102
+        self.last_statistics['ad'] = test_stat
+        passed = True if test_stat <= self.assertion_params['ad_stat'] else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} ad check; test statistic={1:.4f}, p={2:.4f}'.format(
+                pass_fail,
+                float(test_stat),
+                float(p_value)))
+        return ('ad', passed)
+
+    def check_cvm(self, test_data):
+        """Test whether test_data is similar to reference data with the Cramer-von Mises test.
+
+        If the returned test statistic is greater than the threshold (default 0.461, the 5%
+        critical value), the test failed. The threshold is set by assertion_params['cvm_stat'].
+
+        The sorted test data is shared with the other ECDF-based tests.
+
+        Parameters
+        ----------
+        comparison_data : list or np.array or Histogram, optional
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['cvm_test'], 'Must input or load reference data cvm-test'
+        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        assert len(test_data) >= 25, 'Not enough data for reliable CVM tests'
+        sorted_data = self._statistic('sorted', test_data, _sort)
+        test_stat, p_value = self.assertion_params['cvm_test'](sorted_data)  # pylint: disable=E1102
+        self.last_statistics['cvm'] = test_stat
+        passed = True if test_stat <= self.assertion_params['cvm_stat'] else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} cvm check; test statistic={1:.4f}, p={2:.4f}'.format(
+                pass_fail,
+                float(test_stat),
+                float(p_value)))
+        return ('cvm', passed)
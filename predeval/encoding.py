@@ -0,0 +1,230 @@
+"""Hash-based encoding of categorical model outputs to integer codes."""
+import numpy as np
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_STRING_PRIME = np.uint64(0x100000001B3)
+
+# narrow integers are counted in blocks of this many values (see CategoryEncoder.count).
+_COUNT_BLOCK = 1 << 16
+
+
+def as_categories(data):
+    """Convert object and byte-string arrays to fixed-width unicode arrays.
+
+    Sorting and comparing fixed-width strings happens in C, while object arrays
+    need a Python comparison for every pair of values.
+
+    Parameters
+    ----------
+    data : list or np.array
+        Categorical values.
+
+    Returns
+    -------
+    np.array
+
+    """
+    data = np.array(data) if isinstance(data, list) else data
+    if data.dtype.kind in 'OS':
+        return data.astype(str)
+    return data
+
+
+def factorize(data):
+    """Find the distinct categories of data and the code of each value.
+
+    Parameters
+    ----------
+    data : list or np.array
+        Categorical values.
+
+    Returns
+    -------
+    categories : np.array
+        Sorted distinct categories.
+    codes : np.array of int
+        Position of each value's category in categories.
+
+    """
+    return np.unique(as_categories(data), return_inverse=True)
+
+
+def _numeric_keys(data):
+    """Map numbers to uint64 keys (integers by value, floats by their bits)."""
+    if data.dtype.kind in 'biu':
+        return data.astype(np.int64).view(np.uint64)
+    # adding 0.0 turns -0.0 into 0.0 so both get the same key.
+    return (data.astype(np.float64) + 0.0).view(np.uint64)
+
+
+def _string_keys(data):
+    """Hash fixed-width unicode strings to uint64 keys one character column at a time.
+
+    Padding characters are zero, so a string gets the same key whatever the width of its array.
+    """
+    chars = np.ascontiguousarray(data).view(np.uint32).reshape(len(data), -1)
+    powers = np.ones(chars.shape[1], dtype=np.uint64)
+    powers[1:] = np.cumprod(np.full(chars.shape[1] - 1, _STRING_PRIME, dtype=np.uint64))
+    keys = np.zeros(len(data), dtype=np.uint64)
+    for column in range(chars.shape[1]):
+        keys += chars[:, column].astype(np.uint64) * powers[column]
+    return keys
+
+
+class CategoryEncoder(object):
+    """
+    Map categories to integer codes with an open-addressing hash table.
+
+    The table is built once from the reference categories. Encoding probes the table for
+    all values at once, so the cost is linear in the number of values and does not
+    depend on the number of categories.
+
+    Numbers are keyed by value. Strings are keyed by a hash of their characters and
+    matches are confirmed by comparing the strings. Object and byte-string arrays are
+    converted to unicode strings first.
+
+    ...
+
+    Parameters
+    ----------
+    categories : list or np.array
+        Distinct categories. A category's code is its position in this array.
+
+    Attributes
+    ----------
+    categories : np.array
+        The encoded categories.
+
+    """
+    def __init__(self, categories):
+        categories = as_categories(categories)
+        assert len(categories.shape) == 1, 'Input data not a single vector'
+        self.categories = categories
+        self._integer = categories.dtype.kind in 'biu'
+        self._strings = categories.dtype.kind == 'U'
+        keys = self._keys(categories)
+        bits = max(int(np.ceil(np.log2(max(2 * len(categories), 2)))), 1)
+        self._shift = np.uint64(64 - bits)
+        self._mask = (1 << bits) - 1
+        self._table_keys = np.zeros(1 << bits, dtype=np.uint64)
+        self._table_codes = np.full(1 << bits, -1, dtype=np.int64)
+
+        slots = self._slots(keys)
+        pending = np.arange(len(keys))
+        while len(pending):
+            free = self._table_codes[slots[pending]] == -1
+            candidates = pending[free]
+            # the first candidate for each free slot claims it, the others probe on.
+            _, first = np.unique(slots[candidates], return_index=True)
+            winners = candidates[first]
+            self._table_keys[slots[winners]] = keys[winners]
+            self._table_codes[slots[winners]] = winners
+            pending = np.setdiff1d(pending, winners, assume_unique=True)
+            slots[pending] = (slots[pending] + 1) & self._mask
+
+    def __len__(self):
+        return len(self.categories)
+
+    def _keys(self, data):
+        """Map values to uint64 keys."""
+        if self._strings:
+            return _string_keys(data)
+        assert data.dtype.kind in 'biuf', 'Unsupported category type {0}'.format(data.dtype)
+        return _numeric_keys(data)
+
+    def _slots(self, keys):
+        """Hash keys to table slots (Fibonacci hashing)."""
+        return ((keys * _GOLDEN) >> self._shift).astype(np.int64)
+
+    def encode(self, data):
+        """Map values to the code of their category.
+
+        Parameters
+        ----------
+        data : list or np.array
+            Values to encode.
+
+        Returns
+        -------
+        np.array of int
+            Code of each value. Values that are not a known category get -1.
+
+        """
+        data = as_categories(data)
+        assert len(data.shape) == 1, 'Input data not a single vector'
+        codes = np.full(len(data), -1, dtype=np.int64)
+        if self._strings:
+            data = data if data.dtype.kind == 'U' else data.astype(str)
+        elif data.dtype.kind not in 'biuf':
+            return codes
+        if self._integer and data.dtype.kind == 'f':
+            # floats only match integer categories when they hold whole numbers.
+            whole = np.flatnonzero(np.isfinite(data) & (np.floor(data) == data))
+            if len(whole):
+                codes[whole] = self.encode(data[whole].astype(np.int64))
+            return codes
+        if not self._integer and data.dtype.kind in 'biu':
+            data = data.astype(np.float64)
+        keys = self._keys(data)
+        slots = self._slots(keys)
+        pending = np.arange(len(data))
+        while len(pending):
+            table_codes = self._table_codes[slots[pending]]
+            found = (table_codes != -1) & (self._table_keys[slots[pending]] == keys[pending])
+            if self._strings:
+                found[found] = self.categories[table_codes[found]] == data[pending[found]]
+            codes[pending[found]] = table_codes[found]
+            pending = pending[~found & (table_codes != -1)]
+            slots[pending] = (slots[pending] + 1) & self._mask
+        return codes
+
+    def _count_narrow(self, data):
+        """Count 8 and 16 bit integers by value, one block at a time, then look up the categories.
+
+        Takes O(len(data) + 2 ** bits) time without widening data to 64 bit keys.
+        """
+        unsigned = np.dtype('u{0}'.format(data.dtype.itemsize))
+        n_values = 1 << (8 * data.dtype.itemsize)
+        value_counts = np.zeros(n_values, dtype=np.int64)
+        for start in range(0, len(data), _COUNT_BLOCK):
+            value_counts += np.bincount(data[start:start + _COUNT_BLOCK].view(unsigned), minlength=n_values)
+        categories = self.categories
+        # categories outside the range of data's type cannot occur in it.
+        fits = (categories >= np.iinfo(data.dtype).min) & (categories <= np.iinfo(data.dtype).max)
+        counts = np.zeros(len(categories), dtype=np.int64)
+        counts[fits] = value_counts[categories[fits].astype(data.dtype).view(unsigned)]
+        return counts, len(data) - counts.sum()
+
+    def count(self, data, weights=None):
+        """Count the values of each category.
+
+        Unweighted 8 and 16 bit integer data (e.g., int16 labels) is counted by value without
+        hashing, so no 64 bit copy of it is made.
+
+        Parameters
+        ----------
+        data : list or np.array
+            Values to count.
+        weights : np.array, optional
+            Count of each value (e.g., the counts of a Histogram). Default is one per value.
+
+        Returns
+        -------
+        counts : np.array of int
+            Number of values in each category.
+        unknown : int
+            Number of values that are not a known category.
+
+        """
+        data = as_categories(data)
+        if (weights is None and self._integer and data.dtype.kind in 'biu' and data.dtype.itemsize <= 2
+                and len(data.shape) == 1):
+            return self._count_narrow(data.view(np.uint8) if data.dtype.kind == 'b' else data)
+        codes = self.encode(data)
+        counts = np.bincount(codes + 1, weights=weights, minlength=len(self) + 1)
+        if weights is not None:
+            counts = counts.astype(np.asarray(weights).dtype)
+        return counts[1:], counts[0]
@@ -0,0 +1,109 @@
+"""Pre-aggregated model outputs stored as distinct values and their counts."""
+import numpy as np
+from .encoding import as_categories
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+
+class Histogram(object):
+    """
+    Model outputs given as distinct values and the number of times each value was seen.
+
+    A histogram can be used in place of reference or test data. The evaluators compute
+    moments, the ks-test and chi2 counts from the counts directly, so memory grows with the
+    number of distinct values rather than the number of outputs.
+
+    Duplicate values are merged and values with a count of zero are dropped. Non-finite
+values (nan and inf) are dropped too and their count is kept in nonfinite.
+
+    ...
+
+    Parameters
+    ----------
+    values : list or np.array
+        Distinct model outputs (duplicates are allowed).
+    counts : list or np.array
+        Number of times each value was seen. Counts can be fractional weights.
+    nonfinite : int or float, optional
+        Number of non-finite values seen besides the ones in values. Default is 0.
+
+    Attributes
+    ----------
+    values : np.array
+        Sorted distinct values.
+    counts : np.array
+        Count of each value.
+    nonfinite : int or float
+        Number of non-finite values.
+
+    """
+    def __init__(self, values, counts, nonfinite=0):
+        values = as_categories(values)
+        counts = np.asarray(counts)
+        assert len(values.shape) == 1, 'Input data not a single vector'
+        assert counts.shape == values.shape, 'Need one count for each value'
+        assert counts.dtype.kind in 'biuf' and np.all(counts >= 0), 'Counts must be non-negative'
+        keep = counts > 0
+        if values.dtype.kind == 'f':
+            finite = np.isfinite(values)
+            nonfinite = nonfinite + counts[keep & ~finite].sum()
+            keep &= finite
+        self.nonfinite = nonfinite
+        self.values, inverse = np.unique(values[keep], return_inverse=True)
+        self.counts = np.bincount(inverse.ravel(), weights=counts[keep],
+                                  minlength=len(self.values)).astype(counts.dtype)
+
+    @classmethod
+    def from_data(cls, input_data):
+        """Count the distinct values of input_data.
+
+        Parameters
+        ----------
+        input_data : list or np.array
+            Model outputs.
+
+        Returns
+        -------
+        Histogram
+
+        """
+        return cls(*np.unique(as_categories(input_data), return_counts=True))
+
+    @property
+    def count(self):
+        """Number of observations in the histogram."""
+        return self.counts.sum()
+
+    @property
+    def shape(self):
+        """Shape of the expanded data."""
+        return (len(self),)
+
+    def __len__(self):
+        return int(self.count)
+
+    def moments(self):
+        """Find the min, max, mean and standard deviation of the expanded data.
+
+        Returns
+        -------
+        minimum : float
+        maximum : float
+        mean : float
+        std : float
+
+        """
+        mean = np.average(self.values, weights=self.counts)
+        std = np.sqrt(np.average((self.values - mean) ** 2, weights=self.counts))
+        return self.values[0], self.values[-1], mean, std
+
+    def expand(self):
+        """Expand the histogram to a 1-D array with each value repeated count times.
+
+        Returns
+        -------
+        np.array
+
+        """
+        return np.repeat(self.values, self.counts.astype(int))
@@ -0,0 +1,258 @@
+"""Append-only columnar store of check_data outcomes for trend analysis."""
+import json
+import os
+import threading
+import time
+import numpy as np
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# name and dtype of each column. Every column is a raw binary file of fixed-width values.
+_COLUMNS = (('time', np.float64), ('model', np.int32), ('assertion', np.int32),
+            ('outcome', np.int8), ('statistic', np.float64))
+
+
+class HistoryStore(object):
+    """
+    Store the outcome of every check in append-only column files.
+
+    Records are buffered in memory and appended to one binary file per column (time, model,
+    assertion, outcome and statistic) in bulk. Model and assertion names are stored as integer
+    codes with a small names file for each. Reading memory maps the columns, so a query only
+    reads the columns it filters on and the rows it returns.
+
+    Each test of a check is one row. The outcome is 1 for a pass, 0 for a fail and -1 for a
+    skipped test. The statistic is nan when it is unknown.
+
+    Rows recorded in time order (e.g., with the default timestamps) let read find a time range
+    by binary search on the time column. Once a row is older than the rows before it, time
+    ranges are found by scanning the whole time column instead.
+
+    ...
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store. It is created if it does not exist.
+    buffer_size : int, optional
+        Number of rows buffered before they are written. Default is 10000.
+
+    Attributes
+    ----------
+    path : str
+        Directory of the store.
+    buffer_size : int
+        Number of rows buffered before they are written.
+
+    """
+    def __init__(self, path, buffer_size=10000):
+        assert isinstance(buffer_size, int) and buffer_size > 0, \
+            'expected positive integer, input buffer_size is not a positive integer'
+        self.path = path
+        self.buffer_size = buffer_size
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._lock = threading.Lock()
+        self._buffer = dict((name, []) for name, _ in _COLUMNS)
+        self._names = {'model': self._read_names('model'), 'assertion': self._read_names('assertion')}
+        self._new_names = {'model': [], 'assertion': []}
+        n_rows = self._n_rows()
+        self._last_time = (np.fromfile(self._column_path('time'), dtype=np.float64, count=n_rows)[-1]
+                           if n_rows else -np.inf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._n_rows() + len(self._buffer['time'])
+
+    def _names_path(self, column):
+        return os.path.join(self.path, '{0}.names'.format(column))
+
+    def _column_path(self, column):
+        return os.path.join(self.path, '{0}.bin'.format(column))
+
+    def _unordered_path(self):
+        """Marker file written once a row is recorded out of time order."""
+        return os.path.join(self.path, 'unordered')
+
+    def _read_names(self, column):
+        """Load the codes of the names stored for a column."""
+        if not os.path.exists(self._names_path(column)):
+            return {}
+        with open(self._names_path(column)) as names_file:
+            return dict((json.loads(line), code) for code, line in enumerate(names_file))
+
+    def _code(self, column, name):
+        """Get the code of a name, adding the name if it is new."""
+        codes = self._names[column]
+        if name not in codes:
+            codes[name] = len(codes)
+            self._new_names[column].append(name)
+        return codes[name]
+
+    def record(self, evaluator_name, test_outputs, statistics=None, timestamp=None):
+        """Buffer the outcome of one check_data call.
+
+        Parameters
+        ----------
+        evaluator_name : str
+            Name of the evaluator (or model).
+        test_outputs : list of tuples
+            The output of the check_data method.
+        statistics : dict, optional
+            Latest statistic values (e.g., the evaluator's last_statistics attribute).
+        timestamp : float, optional
+            Time of the check in seconds since the epoch. Defaults to now.
+
+        Returns
+        -------
+        None
+
+        """
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        statistics = statistics or {}
+        with self._lock:
+            model = self._code('model', evaluator_name)
+            for test_name, test_val in test_outputs:
+                self._buffer['time'].append(timestamp)
+                self._buffer['model'].append(model)
+                self._buffer['assertion'].append(self._code('assertion', test_name))
+                self._buffer['outcome'].append(-1 if test_val is None else int(bool(test_val)))
+                # skipped tests keep a nan statistic (last_statistics may be from an earlier check).
+                statistic = None if test_val is None else statistics.get(test_name)
+                self._buffer['statistic'].append(np.nan if statistic is None else float(statistic))
+            full = len(self._buffer['time']) >= self.buffer_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Append the buffered rows to the column files.
+
+        Values of a partly written row (e.g., after a crash) are cut from the column files
+        first, so the appended rows stay aligned.
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            # names go first, so every code on disk can be decoded.
+            for column, names in self._new_names.items():
+                if names:
+                    with open(self._names_path(column), 'a') as names_file:
+                        names_file.write(''.join(json.dumps(name) + '\n' for name in names))
+                    self._new_names[column] = []
+            if not self._buffer['time']:
+                return
+            times = np.asarray(self._buffer['time'], dtype=np.float64)
+            if (times[0] < self._last_time or np.any(np.diff(times) < 0)) and \
+                    not os.path.exists(self._unordered_path()):
+                open(self._unordered_path(), 'w').close()
+            self._last_time = max(self._last_time, times.max())
+            n_rows = self._n_rows()
+            for name, dtype in _COLUMNS:
+                column_path = self._column_path(name)
+                if os.path.exists(column_path) and \
+                        os.path.getsize(column_path) > n_rows * np.dtype(dtype).itemsize:
+                    os.truncate(column_path, n_rows * np.dtype(dtype).itemsize)
+                with open(column_path, 'ab') as column_file:
+                    np.asarray(self._buffer[name], dtype=dtype).tofile(column_file)
+                self._buffer[name] = []
+
+    def close(self):
+        """Flush the buffered rows.
+
+        Returns
+        -------
+        None
+
+        """
+        self.flush()
+
+    def _n_rows(self):
+        """Number of complete rows on disk (a partly written row is ignored and cut by flush)."""
+        sizes = [os.path.getsize(self._column_path(name)) // np.dtype(dtype).itemsize
+                 if os.path.exists(self._column_path(name)) else 0 for name, dtype in _COLUMNS]
+        return min(sizes)
+
+    def columns(self):
+        """Memory map the columns.
+
+        Returns
+        -------
+        dict
+            Read-only array of each column (time, model, assertion, outcome and statistic).
+            model and assertion hold codes (see names).
+
+        """
+        self.flush()
+        n_rows = self._n_rows()
+        if n_rows == 0:
+            return dict((name, np.array([], dtype=dtype)) for name, dtype in _COLUMNS)
+        return dict((name, np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(n_rows,)))
+                    for name, dtype in _COLUMNS)
+
+    def names(self, column):
+        """Names of the codes of the model or assertion column.
+
+        Parameters
+        ----------
+        column : str
+            Either 'model' or 'assertion'.
+
+        Returns
+        -------
+        np.array of str
+            The name of each code.
+
+        """
+        codes = self._names[column]
+        return np.array(sorted(codes, key=codes.get), dtype=str)
+
+    def read(self, evaluator_name=None, start=None, end=None):
+        """Read the rows of one evaluator and/or time range.
+
+        The time range is found by binary search on the memory-mapped time column (see the
+        class docstring), so only the rows in the range are read.
+
+        Parameters
+        ----------
+        evaluator_name : str, optional
+            Only return rows of this evaluator. Default is every evaluator.
+        start : float, optional
+            Only return rows at or after this time (in seconds since the epoch).
+        end : float, optional
+            Only return rows before this time (in seconds since the epoch).
+
+        Returns
+        -------
+        dict
+            Array of each column (time, model, assertion, outcome and statistic) with the
+            model and assertion names decoded.
+
+        """
+        columns = self.columns()
+        times = columns['time']
+        if os.path.exists(self._unordered_path()):
+            keep = np.ones(len(times), dtype=bool)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times < end
+            rows = np.flatnonzero(keep)
+        else:
+            first = 0 if start is None else np.searchsorted(times, start, side='left')
+            last = len(times) if end is None else np.searchsorted(times, end, side='left')
+            rows = np.arange(first, max(first, last))
+        if evaluator_name is not None:
+            rows = rows[columns['model'][rows] == self._names['model'].get(evaluator_name, -1)]
+        output = dict((name, np.array(column[rows])) for name, column in columns.items())
+        output['model'] = self.names('model')[output['model']]
+        output['assertion'] = self.names('assertion')[output['assertion']]
+        return output
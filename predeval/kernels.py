@@ -0,0 +1,267 @@
+"""Numerical kernels for the continuous evaluator with an optional numba backend.
+
+The numba backend is used when numba is installed. Its kernels are compiled with nogil, so
+checks running in separate threads do not hold the GIL while they work. The numpy backend
+is the fallback and gives the same results.
+"""
+from collections import namedtuple
+import numpy as np
+from scipy import stats
+
+try:
+    import numba
+except ImportError:  # pragma: no cover
+    numba = None
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# scipy's ks_2samp computes exact p-values up to this sample size (asymptotic ones above it).
+_MAX_EXACT_KS = 10000
+
+# narrow data (e.g., float32 or int16) is converted to float64 in blocks of this many bytes.
+_BLOCK_BYTES = 1 << 18
+
+Backend = namedtuple('Backend', ['name', 'moments', 'ks_statistic', 'ks_2samp'])
+
+
+def ks_asymptotic_pvalue(statistic, n_ref, n_test):
+    """Asymptotic p-value of a two-sample ks-test-statistic (as in scipy's ks_2samp).
+
+    Parameters
+    ----------
+    statistic : float
+        The ks-test-statistic.
+    n_ref : float
+        Size of the reference sample.
+    n_test : float
+        Size of the test sample.
+
+    Returns
+    -------
+    float
+
+    """
+    larger, smaller = sorted([float(n_ref), float(n_test)], reverse=True)
+    return np.clip(stats.kstwo.sf(statistic, np.round(larger * smaller / (larger + smaller))), 0, 1)
+
+
+def finite_slice(sorted_data):
+    """View of the finite values of sorted data (-inf sorts first, inf and nan last).
+
+    Parameters
+    ----------
+    sorted_data : np.array
+        Sorted data.
+
+    Returns
+    -------
+    np.array
+        A slice of sorted_data (no copy).
+
+    """
+    if sorted_data.dtype.kind != 'f' or len(sorted_data) == 0:
+        return sorted_data
+    if np.isfinite(sorted_data[0]) and np.isfinite(sorted_data[-1]):
+        return sorted_data
+    return sorted_data[np.searchsorted(sorted_data, -np.inf, side='right'):
+                       np.searchsorted(sorted_data, np.inf, side='left')]
+
+
+def _narrow(test_data):
+    """Whether test_data holds numbers narrower than float64 (e.g., float32 or int16)."""
+    return test_data.dtype.kind in 'biuf' and test_data.dtype.itemsize < 8
+
+
+def _blocked_mean_std(test_data):
+    """Mean and standard deviation with float64 accumulators, converting one block at a time.
+
+    The block means and sums of squared deviations are combined with Chan's parallel
+    algorithm, so no float64 copy of the whole batch is made.
+    """
+    block_size = _BLOCK_BYTES // 8
+    count, mean, m2 = 0, 0.0, 0.0
+    for start in range(0, len(test_data), block_size):
+        block = test_data[start:start + block_size].astype(np.float64)
+        block_mean = block.mean()
+        deviations = block - block_mean
+        total = count + len(block)
+        delta = block_mean - mean
+        mean += delta * len(block) / total
+        m2 += np.dot(deviations, deviations) + delta ** 2 * count * len(block) / total
+        count = total
+    return mean, np.sqrt(m2 / count)
+
+
+def _numpy_moments(test_data):
+    """Min, max, mean and standard deviation of the finite values of test_data (and the number
+    of non-finite values). The mean and std of narrow data are accumulated in float64."""
+    narrow = _narrow(test_data)
+    with np.errstate(invalid='ignore'):
+        minimum, maximum = np.min(test_data), np.max(test_data)
+        mean, std = _blocked_mean_std(test_data) if narrow else (np.mean(test_data), None)
+    # any nan or inf makes the mean non-finite, so finite data needs no extra pass.
+    if np.isfinite(mean):
+        return minimum, maximum, mean, np.std(test_data) if std is None else std, 0
+    finite = np.isfinite(test_data)
+    n_finite = np.count_nonzero(finite)
+    if n_finite == len(test_data):
+        # the sum overflowed.
+        return minimum, maximum, mean, np.std(test_data), 0
+    if n_finite == 0:
+        return np.nan, np.nan, np.nan, np.nan, len(test_data)
+    # masked reductions leave the non-finite values out without copying the finite ones.
+    dtype = np.float64 if narrow else None
+    return (np.min(test_data, where=finite, initial=np.inf), np.max(test_data, where=finite, initial=-np.inf),
+            np.mean(test_data, where=finite, dtype=dtype), np.std(test_data, where=finite, dtype=dtype),
+            len(test_data) - n_finite)
+
+
+def _numpy_ks_statistic(sorted_ref, sorted_test):
+    """Two-sample ks-test-statistic of two sorted samples."""
+    grid = np.concatenate([sorted_ref, sorted_test])
+    ref_cdf = np.searchsorted(sorted_ref, grid, side='right') / float(len(sorted_ref))
+    test_cdf = np.searchsorted(sorted_test, grid, side='right') / float(len(sorted_test))
+    return np.max(np.abs(ref_cdf - test_cdf))
+
+
+def _numpy_ks_2samp(sorted_ref, test_data):
+    """Two-sample ks-test (scipy's ks_2samp)."""
+    statistic, pvalue = stats.ks_2samp(sorted_ref, test_data)[:2]
+    return statistic, pvalue
+
+
+if numba is not None:
+    @numba.njit(nogil=True, cache=True)
+    def _moments_kernel(test_data):  # pragma: no cover
+        # non-finite values are counted and skipped in the same pass as the sums.
+        # compensated sums keep the mean and std as accurate as numpy's pairwise sums.
+        minimum = test_data[0]
+        maximum = test_data[0]
+        count = 0
+        total = 0.0
+        error = 0.0
+        for i in range(test_data.shape[0]):
+            value = test_data[i]
+            if not np.isfinite(value):
+                continue
+            if count == 0 or value < minimum:
+                minimum = value
+            if count == 0 or value > maximum:
+                maximum = value
+            count += 1
+            term = value - error
+            new_total = total + term
+            error = (new_total - total) - term
+            total = new_total
+        if count == 0:
+            return minimum, maximum, np.nan, np.nan, test_data.shape[0]
+        mean = total / count
+        total = 0.0
+        error = 0.0
+        for i in range(test_data.shape[0]):
+            if not np.isfinite(test_data[i]):
+                continue
+            term = (test_data[i] - mean) ** 2 - error
+            new_total = total + term
+            error = (new_total - total) - term
+            total = new_total
+        return minimum, maximum, mean, np.sqrt(total / count), test_data.shape[0] - count
+
+    @numba.njit(nogil=True, cache=True)
+    def _ks_statistic_kernel(sorted_ref, sorted_test):  # pragma: no cover
+        n_ref = sorted_ref.shape[0]
+        n_test = sorted_test.shape[0]
+        i = 0
+        j = 0
+        statistic = 0.0
+        # walk both samples in order; the gap between the cdfs only changes at sample values.
+        while i < n_ref and j < n_test:
+            value = min(sorted_ref[i], sorted_test[j])
+            while i < n_ref and sorted_ref[i] <= value:
+                i += 1
+            while j < n_test and sorted_test[j] <= value:
+                j += 1
+            gap = abs(i / n_ref - j / n_test)
+            if gap > statistic:
+                statistic = gap
+        return statistic
+
+    @numba.njit(nogil=True, cache=True)
+    def _is_sorted_kernel(test_data):  # pragma: no cover
+        for i in range(1, test_data.shape[0]):
+            if test_data[i] < test_data[i - 1]:
+                return False
+        return True
+
+
+def _jit_ready(test_data):
+    """Whether the compiled kernels accept test_data."""
+    return (len(test_data) > 0 and test_data.dtype.kind in 'iuf'
+            and test_data.dtype.isnative and test_data.dtype.char != 'e')
+
+
+def _numba_moments(test_data):
+    """Min, max, mean and standard deviation of the finite values of test_data in two passes
+    (and the number of non-finite values)."""
+    test_data = np.asarray(test_data)
+    if not _jit_ready(test_data):
+        return _numpy_moments(test_data)
+    minimum, maximum, mean, std, nonfinite = _moments_kernel(test_data)
+    if nonfinite == len(test_data):
+        return np.nan, np.nan, np.nan, np.nan, nonfinite
+    if not np.isfinite(mean):
+        # leave overflow to numpy.
+        return _numpy_moments(test_data)
+    return test_data.dtype.type(minimum), test_data.dtype.type(maximum), mean, std, nonfinite
+
+
+def _numba_ks_statistic(sorted_ref, sorted_test):
+    """Two-sample ks-test-statistic of two sorted samples by merging them."""
+    sorted_ref, sorted_test = np.asarray(sorted_ref), np.asarray(sorted_test)
+    if not (_jit_ready(sorted_ref) and _jit_ready(sorted_test)):
+        return _numpy_ks_statistic(sorted_ref, sorted_test)
+    return _ks_statistic_kernel(sorted_ref, sorted_test)
+
+
+def _numba_ks_2samp(sorted_ref, test_data):
+    """Two-sample ks-test with the merge kernel.
+
+    Small samples go to scipy for its exact p-value. Larger samples use the same asymptotic
+    p-value as scipy, so the results match ks_2samp.
+    """
+    test_data = np.asarray(test_data)
+    if max(len(sorted_ref), len(test_data)) <= _MAX_EXACT_KS or not _jit_ready(test_data):
+        return _numpy_ks_2samp(sorted_ref, test_data)
+    if not _is_sorted_kernel(test_data):
+        test_data = np.sort(test_data)
+    statistic = _numba_ks_statistic(sorted_ref, test_data)
+    return statistic, ks_asymptotic_pvalue(statistic, len(sorted_ref), len(test_data))
+
+
+NUMPY_BACKEND = Backend('numpy', _numpy_moments, _numpy_ks_statistic, _numpy_ks_2samp)
+NUMBA_BACKEND = Backend('numba', _numba_moments, _numba_ks_statistic, _numba_ks_2samp)
+
+
+def get_backend(backend='auto'):
+    """Find the kernels of a backend.
+
+    Parameters
+    ----------
+    backend : str, optional
+        'numba', 'numpy' or 'auto' (numba when it is installed, otherwise numpy).
+        Default is 'auto'.
+
+    Returns
+    -------
+    Backend
+        Named tuple with the backend's name and its moments, ks_statistic and ks_2samp kernels.
+        moments gives the min, max, mean and std of the finite values and the number of
+        non-finite values.
+
+    """
+    assert backend in ('auto', 'numba', 'numpy'), 'expected auto, numba or numpy backend'
+    if backend == 'auto':
+        backend = 'numpy' if numba is None else 'numba'
+    assert backend == 'numpy' or numba is not None, 'numba backend requested but numba is not installed'
+    return NUMBA_BACKEND if backend == 'numba' else NUMPY_BACKEND
@@ -0,0 +1,216 @@
+"""Keep resident evaluators within a memory budget by spilling references to disk."""
+from collections import OrderedDict
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from .store import ReferenceStore, _storable
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# smaller arrays stay in the pickle rather than getting a file of their own.
+_MIN_SPILL_BYTES = 1 << 12
+
+
+class _SpillPickler(pickle.Pickler):
+    """Pickler that writes large arrays to .npy files named by their digest."""
+
+    def __init__(self, directory, output):
+        pickle.Pickler.__init__(self, output, pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+
+    def persistent_id(self, obj):  # pylint: disable=E0202
+        if not (_storable(obj) and obj.nbytes >= _MIN_SPILL_BYTES):
+            return None
+        key = ReferenceStore.digest(obj)
+        path = os.path.join(self.directory, key + '.npy')
+        # files are content addressed, so evaluators spilling the same reference share one file.
+        if not os.path.exists(path):
+            partial_path = '{0}.{1}.tmp'.format(path, os.getpid())
+            with open(partial_path, 'wb') as array_file:
+                np.save(array_file, obj)
+            os.replace(partial_path, path)
+        return key
+
+
+class _SpillUnpickler(pickle.Unpickler):
+    """Unpickler that memory maps the spilled arrays (each file once)."""
+
+    def __init__(self, directory, data):
+        pickle.Unpickler.__init__(self, data)
+        self.directory = directory
+        self.arrays = {}
+
+    def persistent_load(self, pid):  # pylint: disable=E0202
+        if pid not in self.arrays:
+            self.arrays[pid] = np.load(os.path.join(self.directory, pid + '.npy'), mmap_mode='r')
+        return self.arrays[pid]
+
+
+class EvaluatorManager(object):
+    """
+    Keep the evaluators of a process within a memory budget.
+
+    Each evaluator's footprint is its memory_footprint total. When the resident evaluators
+    exceed the budget, the least recently used ones are spilled: their large arrays are
+    written to .npy files in spill_dir and the evaluator is dropped from memory. Getting a
+    spilled evaluator reloads it with its arrays memory mapped from those files, so the
+    operating system pages the reference in as the tests read it and mapped arrays do not
+    count against the budget.
+
+    Get evaluators from the manager by name on each use. An evaluator held elsewhere stays
+    in memory after it is spilled.
+
+    ...
+
+    Parameters
+    ----------
+    budget : int
+        Largest number of bytes held by the resident evaluators' arrays.
+    spill_dir : str, optional
+        Directory of the spilled arrays. Defaults to a temporary directory removed by close.
+
+    Attributes
+    ----------
+    usage : int
+        Bytes held by the resident evaluators' arrays.
+    spilled : list of str
+        Names of the spilled evaluators.
+
+    """
+    def __init__(self, budget, spill_dir=None):
+        assert isinstance(budget, int) and budget > 0, \
+            'expected positive integer, input budget is not a positive integer'
+        self.budget = budget
+        self._owns_dir_ = spill_dir is None
+        self.spill_dir = tempfile.mkdtemp(prefix='predeval-') if spill_dir is None else spill_dir
+        if not os.path.isdir(self.spill_dir):
+            os.makedirs(self.spill_dir)
+        # name -> (evaluator, bytes), least recently used first.
+        self._resident_ = OrderedDict()
+        # name -> pickle of the evaluator without its spilled arrays.
+        self._spilled_ = {}
+
+    def __len__(self):
+        return len(self._resident_) + len(self._spilled_)
+
+    def __contains__(self, name):
+        return name in self._resident_ or name in self._spilled_
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def usage(self):
+        return sum(nbytes for _, nbytes in self._resident_.values())
+
+    @property
+    def spilled(self):
+        return sorted(self._spilled_)
+
+    def add(self, name, evaluator):
+        """Add (or replace) an evaluator and spill others if the budget is exceeded.
+
+        Parameters
+        ----------
+        name : str
+            Name of the evaluator.
+        evaluator : ParentPredEval
+            The evaluator. It must be picklable to be spilled.
+
+        Returns
+        -------
+        None
+
+        """
+        self._spilled_.pop(name, None)
+        self._resident_.pop(name, None)
+        self._resident_[name] = (evaluator, evaluator.memory_footprint()['total'])
+        self._enforce(name)
+
+    def get(self, name):
+        """Get an evaluator, reloading it if it was spilled.
+
+        Parameters
+        ----------
+        name : str
+            Name of the evaluator.
+
+        Returns
+        -------
+        ParentPredEval
+
+        """
+        if name in self._resident_:
+            evaluator = self._resident_.pop(name)[0]
+        else:
+            evaluator = _SpillUnpickler(self.spill_dir, io.BytesIO(self._spilled_.pop(name))).load()
+        # the footprint changes as the evaluator builds caches (or after refresh_reference).
+        self._resident_[name] = (evaluator, evaluator.memory_footprint()['total'])
+        self._enforce(name)
+        return evaluator
+
+    def remove(self, name):
+        """Forget an evaluator (its spilled files are kept until close).
+
+        Parameters
+        ----------
+        name : str
+            Name of the evaluator.
+
+        Returns
+        -------
+        None
+
+        """
+        if self._resident_.pop(name, None) is None:
+            del self._spilled_[name]
+
+    def spill(self, name):
+        """Spill a resident evaluator to disk.
+
+        Parameters
+        ----------
+        name : str
+            Name of the evaluator.
+
+        Returns
+        -------
+        None
+
+        """
+        evaluator = self._resident_[name][0]
+        output = io.BytesIO()
+        _SpillPickler(self.spill_dir, output).dump(evaluator)
+        self._spilled_[name] = output.getvalue()
+        del self._resident_[name]
+
+    def _enforce(self, keep):
+        """Spill the least recently used evaluators (except keep) until usage fits the budget."""
+        for name in list(self._resident_):
+            if self.usage <= self.budget:
+                return
+            if name != keep:
+                self.spill(name)
+
+    def close(self):
+        """Drop every evaluator and remove the spill directory if the manager created it.
+
+        Returns
+        -------
+        None
+
+        """
+        self._resident_.clear()
+        self._spilled_.clear()
+        if self._owns_dir_:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
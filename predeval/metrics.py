@@ -0,0 +1,229 @@
+"""Metrics exposition of check outcomes and timings in the OpenMetrics text format."""
+from bisect import bisect_left
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler
+from numbers import Real
+import math
+import os
+import tempfile
+import threading
+import time
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    """Format a float as an OpenMetrics number (NaN, +Inf and -Inf are spelled out)."""
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _labels(**labels):
+    """Format labels as {name="value",...}."""
+    return '{' + ','.join('{0}="{1}"'.format(key, _escape(labels[key])) for key in sorted(labels)) + '}'
+
+
+class MetricsExporter(object):
+    """
+    Collect check outcomes and render them in the OpenMetrics text format.
+
+    Recording a check only updates counters, gauges and histogram buckets held in dicts.
+    All formatting happens in render, so exporting is cheap for the check path.
+
+    ...
+
+    Parameters
+    ----------
+    buckets : list of float, optional
+        Upper bounds (in seconds) of the check latency histogram buckets.
+    prefix : str, optional
+        Prefix of every metric name. Default is 'predeval'.
+
+    Attributes
+    ----------
+    buckets : tuple of float
+        Upper bounds (in seconds) of the check latency histogram buckets.
+    prefix : str
+        Prefix of every metric name.
+
+    """
+    def __init__(
+            self,
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+            prefix='predeval'):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._checks = defaultdict(int)
+        self._failures = defaultdict(int)
+        self._statistics = {}
+        self._latency = {}
+
+    def observe(self, evaluator_name, test_outputs, seconds=None, statistics=None):
+        """Record the outcome of one check_data call.
+
+        Parameters
+        ----------
+        evaluator_name : str
+            Name of the evaluator (used as a label).
+        test_outputs : list of tuples
+            The output of the check_data method.
+        seconds : float, optional
+            How long the check took.
+        statistics : dict, optional
+            Latest statistic values (e.g., the evaluator's last_statistics attribute).
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            self._checks[evaluator_name] += 1
+            for test_name, test_val in test_outputs:
+                self._failures[(evaluator_name, test_name)] += test_val is False
+            for key, value in (statistics or {}).items():
+                if isinstance(value, Real):
+                    self._statistics[(evaluator_name, key)] = value
+            if seconds is not None:
+                latency = self._latency.setdefault(
+                    evaluator_name, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                latency[0][bisect_left(self.buckets, seconds)] += 1
+                latency[1] += seconds
+                latency[2] += 1
+
+    def check(self, evaluator_name, evaluator, test_data, **kwargs):
+        """Run check_data on an evaluator and record its outcome and latency.
+
+        Parameters
+        ----------
+        evaluator_name : str
+            Name of the evaluator (used as a label).
+        evaluator : ContinuousEvaluator or CategoricalEvaluator
+            The evaluator to run.
+        test_data : list or np.array
+            This the data that will be compared to the reference data.
+        kwargs
+            Passed to check_data.
+
+        Returns
+        -------
+        output : list of tuples
+            The output of the check_data method.
+
+        """
+        start = time.perf_counter()
+        output = evaluator.check_data(test_data, **kwargs)
+        self.observe(evaluator_name, output, seconds=time.perf_counter() - start,
+                     statistics=evaluator.last_statistics)
+        return output
+
+    def render(self):
+        """Render all metrics in the OpenMetrics text format.
+
+        Returns
+        -------
+        str
+
+        """
+        with self._lock:
+            checks = dict(self._checks)
+            failures = dict(self._failures)
+            statistics = dict(self._statistics)
+            latency = dict((key, (list(value[0]), value[1], value[2]))
+                           for key, value in self._latency.items())
+        name = self.prefix
+        lines = ['# TYPE {0}_checks counter'.format(name),
+                 '# HELP {0}_checks Number of check_data calls.'.format(name)]
+        lines.extend('{0}_checks_total{1} {2}'.format(name, _labels(evaluator=key), value)
+                     for key, value in sorted(checks.items()))
+        lines.extend(['# TYPE {0}_failures counter'.format(name),
+                      '# HELP {0}_failures Number of failed tests.'.format(name)])
+        lines.extend('{0}_failures_total{1} {2}'.format(
+            name, _labels(evaluator=key[0], assertion=key[1]), value)
+                     for key, value in sorted(failures.items()))
+        lines.extend(['# TYPE {0}_statistic gauge'.format(name),
+                      '# HELP {0}_statistic Latest observed test statistic.'.format(name)])
+        lines.extend('{0}_statistic{1} {2}'.format(
+            name, _labels(evaluator=key[0], statistic=key[1]), _number(value))
+                     for key, value in sorted(statistics.items()))
+        lines.extend(['# TYPE {0}_check_seconds histogram'.format(name),
+                      '# HELP {0}_check_seconds Latency of check_data calls.'.format(name)])
+        for key, (counts, total, count) in sorted(latency.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = _number(bound)
+                lines.append('{0}_check_seconds_bucket{1} {2}'.format(
+                    name, _labels(evaluator=key, le=le), cumulative))
+            lines.append('{0}_check_seconds_count{1} {2}'.format(name, _labels(evaluator=key), count))
+            lines.append('{0}_check_seconds_sum{1} {2}'.format(name, _labels(evaluator=key), _number(total)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the rendered metrics to a file (e.g., for a node exporter's textfile collector).
+
+        The file is replaced atomically so scrapers never read a partial file.
+
+        Parameters
+        ----------
+        path : str
+            Destination file.
+
+        Returns
+        -------
+        None
+
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w') as metrics_file:
+                metrics_file.write(self.render())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def make_handler(self):
+        """Create an http.server request handler that serves the rendered metrics.
+
+        Returns
+        -------
+        subclass of http.server.BaseHTTPRequestHandler
+
+        Examples
+        --------
+        >>> from http.server import HTTPServer
+        >>> server = HTTPServer(('localhost', 8000), exporter.make_handler())  # doctest: +SKIP
+        >>> server.serve_forever()  # doctest: +SKIP
+
+        """
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):  # pylint: disable=C0111
+            def do_GET(self):  # pylint: disable=C0103
+                body = exporter.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=W0221
+                pass
+
+        return MetricsHandler
@@ -1,11 +1,68 @@
 """Library of classes for evaluating continuous model outputs."""
 from abc import ABCMeta, abstractproperty
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from numbers import Real
+import hashlib
+import mmap
+import os
+import threading
 import numpy as np
+from .histogram import Histogram
+from .profiles import ParentProfile
 
 __author__ = 'Dan Vatterott'
 __license__ = 'MIT'
 
 
+def _as_histogram(input_data):
+    """Count the distinct values of input_data (profiles give their histogram)."""
+    if isinstance(input_data, Histogram):
+        return input_data
+    if isinstance(input_data, ParentProfile):
+        return input_data.to_histogram()
+    return Histogram.from_data(input_data)
+
+
+def _find_arrays(obj, arrays, seen):
+    """Collect the arrays reachable from obj through containers, partials and attributes."""
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        arrays.append(obj)
+        return
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    elif isinstance(obj, partial):
+        children = list(obj.args) + list(obj.keywords.values())
+    elif hasattr(obj, '__dict__') and not callable(obj):
+        children = vars(obj).values()
+    else:
+        return
+    for child in children:
+        _find_arrays(child, arrays, seen)
+
+
+def _owner(array):
+    """The array owning the memory behind a view."""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _mapped(array):
+    """Whether an array's memory is memory mapped (a spilled file or a shared memory block)."""
+    base = _owner(array).base
+    # shared memory blocks (and frombuffer arrays) expose their mapping through a memoryview.
+    if isinstance(base, memoryview):
+        base = base.obj
+    return isinstance(base, mmap.mmap)
+
+
 class ParentPredEval(object):
     """
     Parent Class for evaluator classes.
@@ -14,21 +71,53 @@ class ParentPredEval(object):
 
     Parameters
     ----------
-    ref_data : list of int or float or np.array
+    ref_data : list of int or float or np.array or profile
         This the reference data for all tests. All future data will be compared to this data.
+        A profile (see predeval.profiles) can be used in place of the raw reference data.
+        The evaluators also turn a Histogram (see predeval.histogram) into a profile.
     verbose : bool, optional
         Whether tests should print their output. Default is true
+    dtype : numpy dtype, optional
+        Type the reference data is stored in (e.g., np.float32 or np.int16 to halve the memory
+        of a float64 or int32 reference). Lists of test data are converted to it. Default is None
+        (arrays keep their type).
 
     Attributes
     ----------
     verbose : bool
         Whether or not tests will print output.
-    ref_data : : list of int or float or np.array
+    dtype : numpy dtype or None
+        Type of the stored reference data and of test data given as lists.
+    ref_data : : list of int or float or np.array or profile
         This the reference data for all tests. All future data will be compared to this data.
+    cache_size : int
+        Maximum number of check_data results kept by the result cache. 0 means no cache.
+    n_jobs : int
+        Number of threads used by check_data (see enable_threads).
+    sample_size : int or None
+        Number of test values the distribution tests are run on (see enable_sampling).
+    last_statistics : dict
+        The statistic observed by the latest run of each test (e.g., the observed min or the
+        ks-test-statistic).
 
     """
     __metaclass__ = ABCMeta
 
+    # relative cost of each assertion, used to order assertions when failing fast.
+    _assertion_costs_ = {}
+
+    # name in the output of assertions whose check returns a different name (e.g., skipped tests).
+    _result_names_ = {'ks_test': 'ks', 'ad_test': 'ad', 'cvm_test': 'cvm', 'chi2_test': 'chi2'}
+
+    # profile class summarizing the reference data (see predeval.profiles).
+    _profile_class_ = None
+
+    # distribution tests that run on a sample of the test data when sampling is enabled.
+    _sampled_assertions_ = ()
+
+    # number of dimensions of the model outputs (1 for a vector with one output per row).
+    _output_ndim_ = 1
+
     @abstractproperty
     def _possible_assertions(self):
         raise NotImplementedError  # pragma: no cover
@@ -48,12 +137,37 @@ class ParentPredEval(object):
     def __init__(
             self,
             ref_data,
-            verbose=True):
+            verbose=True,
+            dtype=None):
         assert isinstance(verbose, bool), 'expected boolean, input verbose is not a boolean'
         self.verbose = verbose
+        self.dtype = None if dtype is None else np.dtype(dtype)
+
+        if isinstance(ref_data, list) or (self.dtype is not None and not isinstance(ref_data, ParentProfile)):
+            ref_data = np.asarray(ref_data, dtype=self.dtype)
+        self.ref_data = ref_data
+        if not isinstance(self.ref_data, ParentProfile):
+            self._check_shape(self.ref_data)
 
-        self.ref_data = np.array(ref_data) if isinstance(ref_data, list) else ref_data
-        assert len(self.ref_data.shape) == 1, 'Input data not a single vector'
+        self.last_statistics = {}
+        self.cache_size = 0
+        self._result_cache_ = OrderedDict()
+        self._params_version_ = 0
+        self._batch_statistics_ = None
+        self._batch_locks_ = None
+        self.n_jobs = 1
+        self.sample_size = None
+        self._sampling_ = {}
+        # statistics that custom assertions can be built on (see register_assertion).
+        self._statistic_functions_ = {'histogram': partial(self._statistic, 'histogram', func=_as_histogram)}
+
+    def _check_shape(self, input_data):
+        """Assert that input_data has one row per model output."""
+        if self._output_ndim_ == 1:
+            assert len(input_data.shape) == 1, 'Input data not a single vector'
+        else:
+            assert len(input_data.shape) == self._output_ndim_, \
+                'Input data not a {0}-d array'.format(self._output_ndim_)
 
     def _check_assertion_types(self, assertions):
         """Check whether requested assertions are as expected.
@@ -69,35 +183,465 @@ class ParentPredEval(object):
 
         """
         assert isinstance(assertions, (str, list)), 'assertions given in unexpected type'
-        assertions = [assertions] if isinstance(assertions, str) else assertions
+        # a copy, so registering assertions does not change the caller's list.
+        assertions = [assertions] if isinstance(assertions, str) else list(assertions)
         assert all([x in self._possible_assertions
                     for x in assertions]), 'unexpected assertion request'
         return assertions
 
-    def check_data(self, test_data):
+    def _update_assertions(self, ref_data):
+        """Run the update method of every assertion on ref_data.
+
+        Parameters
+        ----------
+        ref_data : list or np.array or profile
+            This the reference data for all tests.
+
+        Returns
+        -------
+        None
+
+        """
+        for i in self.assertions:
+            self._possible_assertions[i][0](ref_data)
+
+    def refresh_reference(self, new_data, decay=1.0, window=None):
+        """Blend a chunk of new reference data into the reference.
+
+        The reference is kept as a profile (see predeval.profiles). Each refresh scales down
+        the weight of the current reference, merges in a profile of new_data and reruns the
+        update methods from the merged profile. Only new_data is sorted, so a refresh takes
+        time proportional to the chunk (plus the size of the profile's summaries). The first
+        refresh of an evaluator built from raw data summarizes that data once.
+
+        Refreshing clears the result cache and replaces values set with update_param.
+
+        Parameters
+        ----------
+        new_data : list or np.array or Histogram
+            The new chunk of reference data.
+        decay : float, optional
+            Weight multiplier (between 0 and 1) applied to the current reference before the
+            new data is added. Default is 1 (no decay).
+        window : float, optional
+            Largest total weight of the reference. The current reference is scaled down so that
+            it and new_data add up to at most window observations. Default is None (no limit).
+
+        Returns
+        -------
+        None
+
+        """
+        assert isinstance(decay, Real) and 0 <= decay <= 1, 'expected decay between 0 and 1'
+        assert window is None or (isinstance(window, Real) and window > 0), \
+            'expected positive number, input window is not a positive number'
+        assert self._profile_class_ is not None, 'This evaluator has no reference profile'
+        reference = self.ref_data
+        if not isinstance(reference, ParentProfile):
+            reference = self._profile_class_.from_data(reference)
+        new_profile = self._profile_class_.from_data(new_data)
+        factor = decay
+        if window is not None and reference.count > 0:
+            factor = min(factor, max(window - new_profile.count, 0) / float(reference.count))
+        self.ref_data = reference.scale(factor).merge(new_profile)
+        self._update_assertions(self.ref_data)
+        self._params_version_ += 1
+        self._result_cache_.clear()
+
+    def memory_footprint(self):
+        """Report the bytes held by the evaluator's arrays.
+
+        Arrays are found in the evaluator's attributes (the reference data, arrays inside the
+        partially evaluated tests, sorted references, category arrays and caches). Memory
+        shared by several arrays (e.g., views or arrays interned in a ReferenceStore) is
+        counted once. Memory-mapped arrays (spilled or shared references) are reported
+        separately from the total, since the operating system pages them in and out.
+
+        Returns
+        -------
+        dict
+            Bytes held through each attribute (e.g., 'ref_data' and 'assertion_params'),
+            'total' (the sum) and 'mapped' (bytes of memory-mapped arrays).
+
+        """
+        report, counted, seen = {}, set(), set([id(self)])
+        mapped = 0
+        for name, value in vars(self).items():
+            arrays = []
+            _find_arrays(value, arrays, seen)
+            nbytes = 0
+            for array in arrays:
+                owner = _owner(array)
+                if id(owner) in counted:
+                    continue
+                counted.add(id(owner))
+                if _mapped(owner):
+                    mapped += owner.nbytes
+                else:
+                    nbytes += owner.nbytes
+            if nbytes:
+                report[name.strip('_')] = nbytes
+        report['total'] = sum(report.values())
+        report['mapped'] = mapped
+        return report
+
+    def enable_cache(self, cache_size=128):
+        """Keep the results of recent check_data calls.
+
+        Results are keyed by a hash of the test data, the current assertion_params and the
+        number of update_param calls. The least recently used result is dropped when the
+        cache is full. Cached results are returned without printing and restore the
+        last_statistics of the cached check.
+
+        Parameters
+        ----------
+        cache_size : int, optional
+            Maximum number of results to keep. 0 turns the cache off. Default is 128.
+
+        Returns
+        -------
+        None
+
+        """
+        assert isinstance(cache_size, int) and cache_size >= 0, \
+            'expected non-negative integer, input cache_size is not a non-negative integer'
+        self.cache_size = cache_size
+        self._result_cache_ = OrderedDict()
+
+    def enable_threads(self, n_jobs=None):
+        """Run the tests of check_data in a thread pool.
+
+        numpy reductions and sorts release the GIL, so independent tests run in parallel
+        on the shared, read-only test data. Large batches also have their moments computed
+        in blocks on separate threads. Tests that print may print in any order.
+
+        Tests always run one at a time with fail_fast. An evaluator should not be used by
+        several check_data calls at the same time.
+
+        Parameters
+        ----------
+        n_jobs : int, optional
+            Number of threads. 1 turns threading off. Defaults to the number of cores.
+
+        Returns
+        -------
+        None
+
+        """
+        n_jobs = (os.cpu_count() or 1) if n_jobs is None else n_jobs
+        assert isinstance(n_jobs, int) and n_jobs > 0, \
+            'expected positive integer, input n_jobs is not a positive integer'
+        self.n_jobs = n_jobs
+
+    def enable_sampling(self, sample_size=100000, stratified=False, random_state=None,
+                        confidence=0.95):
+        """Run the ecdf-based distribution tests (e.g., ks_test) on a sample of large test data.
+
+        Test data with more than sample_size values is sampled once per check_data call and
+        shared by the distribution tests. The other tests (e.g., min and max) still see all of
+        the test data. Histograms are never sampled. The chi2 test always counts all of the
+        test data: counting is one pass, and a sample can miss rare categories.
+
+        By the Dvoretzky-Kiefer-Wolfowitz inequality, the empirical cdf of the sample is within
+        sqrt(log(2 / (1 - confidence)) / (2 * sample_size)) of the empirical cdf of the test data
+        with the given confidence. This bound is stored in last_statistics['sampling_error'] (and
+        printed), and it bounds the change sampling makes to the ks-test-statistic.
+
+        Parameters
+        ----------
+        sample_size : int or None, optional
+            Number of values to sample. None turns sampling off. Default is 100000.
+        stratified : bool, optional
+            Whether to draw one value from each of sample_size equal slices of the test data
+            instead of drawing uniformly (with replacement). Default is False.
+        random_state : int, optional
+            Seed of the sampling. The same seed draws the same sample from the same test data.
+            Default is None (a different sample each time).
+        confidence : float, optional
+            Confidence of the reported bound. Default is 0.95.
+
+        Returns
+        -------
+        None
+
+        """
+        assert sample_size is None or (isinstance(sample_size, int) and sample_size > 0), \
+            'expected positive integer, input sample_size is not a positive integer'
+        assert isinstance(stratified, bool), 'expected boolean, input stratified is not a boolean'
+        assert isinstance(confidence, Real) and 0 < confidence < 1, 'expected confidence between 0 and 1'
+        self.sample_size = sample_size
+        self._sampling_ = {'stratified': stratified, 'random_state': random_state,
+                           'confidence': confidence}
+        self._result_cache_.clear()
+
+    def _draw_sample(self, test_data):
+        """Sample test_data and record the sampling error bound (see enable_sampling)."""
+        rng = np.random.RandomState(self._sampling_['random_state'])
+        n_values, n_samples = len(test_data), self.sample_size
+        if self._sampling_['stratified']:
+            index = ((np.arange(n_samples) + rng.uniform(size=n_samples)) *
+                     (n_values / float(n_samples))).astype(np.int64)
+        else:
+            # sorted indices read the test data in order.
+            index = np.sort(rng.randint(0, n_values, size=n_samples))
+        error = np.sqrt(np.log(2 / (1 - self._sampling_['confidence'])) / (2. * n_samples))
+        self.last_statistics['sampling_error'] = error
+        if self.verbose:
+            print('Sampled {0} of {1} values; ecdf error <= {2:.4f} ({3:.0%} confidence)'.format(
+                n_samples, n_values, error, self._sampling_['confidence']))
+        return test_data[index]
+
+    def _assertion_data(self, assertion, test_data):
+        """Get the data an assertion runs on (a shared sample for sampled distribution tests)."""
+        if (self.sample_size is None or assertion not in self._sampled_assertions_
+                or isinstance(test_data, Histogram) or len(test_data) <= self.sample_size):
+            return test_data
+        return self._statistic('sample', test_data, self._draw_sample)
+
+    @staticmethod
+    def _fingerprint(value):
+        """Describe an assertion param so that changes to it change the cache key."""
+        if value is None or isinstance(value, (Real, str)):
+            return value
+        if isinstance(value, np.ndarray):
+            return (value.dtype.str, value.shape, hashlib.md5(value.tobytes()).hexdigest())
+        # holding the object itself keeps its id from being reused while it is cached.
+        return value if getattr(value, '__hash__', None) else id(value)
+
+    def _cache_key(self, test_data, *options):
+        """Create the result cache key for test_data or None if it cannot be hashed."""
+        arrays = ((test_data.values, test_data.counts) if isinstance(test_data, Histogram)
+                  else (test_data,))
+        if any(array.dtype.hasobject for array in arrays):
+            return None
+        digest = hashlib.blake2b()
+        for array in arrays:
+            digest.update(np.ascontiguousarray(array).view(np.uint8))
+        params = tuple((key, self._fingerprint(self.assertion_params[key]))
+                       for key in sorted(self.assertion_params))
+        return (digest.hexdigest(), tuple(array.dtype.str for array in arrays), test_data.shape,
+                self._params_version_, params) + options
+
+    def _ordered_tests(self):
+        """List (assertion, test) pairs from cheapest to most expensive assertion.
+
+        Returns
+        -------
+        list of tuples
+            Each tuple has the assertion name and the function running its test.
+
+        """
+        pairs = list(zip(self.assertions, self._tests))
+        return sorted(pairs, key=lambda pair: self._assertion_costs_.get(pair[0], float('inf')))
+
+    def check_data(self, test_data, fail_fast=False):
         """Check whether test_data is as expected.
 
         Run threw all tests in assertions and return whether the data passed these tests.
 
+        With fail_fast, the tests run from cheapest to most expensive (e.g., min and max before
+        the ks-test) and stop at the first failure. Tests that did not run are reported with
+        None as their outcome.
+
         Parameters
         ----------
-        test_data : list or np.array
+        test_data : list or np.array or Histogram
             This the data that will be compared to the reference data.
+            A Histogram (see predeval.histogram) is checked without expanding its counts.
+        fail_fast : bool, optional
+            Whether to order tests by cost and stop at the first failure. Default is False.
 
         Returns
         -------
         output : list of tuples
             Each tuple has a string a boolean. The string describes the test.
             The boolean describes the outcome. True is a pass and False is a fail.
+            None means the test was skipped after an earlier failure.
 
         """
-        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
-        assert len(test_data.shape) == 1, 'Input data not a single vector'
+        assert isinstance(fail_fast, bool), 'expected boolean, input fail_fast is not a boolean'
+        test_data = np.array(test_data, dtype=self.dtype) if isinstance(test_data, list) else test_data
+        self._check_shape(test_data)
+        key = self._cache_key(test_data, fail_fast) if self.cache_size else None
+        if key is not None and key in self._result_cache_:
+            self._result_cache_.move_to_end(key)
+            output, statistics = self._result_cache_[key]
+            # restore the statistics of the cached check (a different batch may have run since).
+            self.last_statistics.update(statistics)
+            return list(output)
+        output = self._run_tests(test_data, fail_fast)
+        if key is not None:
+            self._result_cache_[key] = (list(output), dict(self.last_statistics))
+            while len(self._result_cache_) > self.cache_size:
+                self._result_cache_.popitem(last=False)
+        return output
+
+    def _statistic(self, name, test_data, func):
+        """Compute func(test_data), sharing the result between the tests of one check_data call.
+
+        Parameters
+        ----------
+        name : str
+            Name of the statistic (e.g., 'moments' or 'sorted').
+        test_data : np.array
+            This the data that will be compared to the reference data.
+        func : func
+            Computes the statistic from test_data.
+
+        Returns
+        -------
+        The statistic.
+
+        """
+        batch = self._batch_statistics_
+        if batch is None:
+            return func(test_data)
+        # tests running in other threads wait for the first one to compute the statistic.
+        with self._batch_locks_.setdefault(name, threading.Lock()):
+            if name not in batch:
+                batch[name] = func(test_data)
+        return batch[name]
+
+    def _run_tests(self, test_data, fail_fast, statistics=None):
+        """Run the tests in assertions on test_data (see check_data).
+
+        statistics are known statistics of test_data shared with the tests (e.g., exact moments).
+        """
+        self._batch_statistics_, self._batch_locks_ = dict(statistics or {}), {}
+        try:
+            return self._run_ordered_tests(test_data, fail_fast)
+        finally:
+            self._batch_statistics_, self._batch_locks_ = None, None
+
+    def _run_ordered_tests(self, test_data, fail_fast):
+        """Run the tests, stopping at the first failure with fail_fast."""
+        def run(test):
+            return test[1](self._assertion_data(test[0], test_data))
+
+        tests = list(zip(self.assertions, self._tests))
+        if not fail_fast and self.n_jobs > 1 and len(tests) > 1:
+            with ThreadPoolExecutor(min(self.n_jobs, len(tests))) as pool:
+                return list(pool.map(run, tests))
+        if not fail_fast:
+            return [run(test) for test in tests]
         output = []
-        for funs in self._tests:
-            output.append(funs(test_data))
+        tests = self._ordered_tests()
+        for i, test in enumerate(tests):
+            output.append(run(test))
+            if not output[-1][1]:
+                skipped = [self._result_names_.get(name, name) for name, _ in tests[i + 1:]]
+                if self.verbose and skipped:
+                    print('Skipped {0} checks after failure'.format(', '.join(skipped)))
+                output.extend([(name, None) for name in skipped])
+                break
         return output
 
+    def register_assertion(self, name, decide, statistic='histogram', cost=5):
+        """Add a custom assertion built on a statistic shared with the other tests.
+
+        The statistic is computed once on the reference data (and again on every reference
+        refresh) and stored in assertion_params[name]. Each check_data call computes it once
+        on the test data, shares it with every other test that uses it, and passes both to
+        decide.
+
+        Available statistics are 'histogram' (a Histogram of the data) for all evaluators and
+        'moments' (min, max, mean and std), 'sorted' (the sorted data or a Histogram) and
+        'quantiles' (the quantiles at assertion_params['quantiles']) for continuous evaluators.
+
+        Evaluators with custom assertions can only be pickled when decide can be pickled
+        (e.g., a module-level function rather than a lambda).
+
+        Parameters
+        ----------
+        name : str
+            Name of the assertion and of its test in the check_data output.
+        decide : func
+            Called as decide(test_statistic, reference_statistic). Returns whether the test
+            passed, or a tuple of whether it passed and a value stored in last_statistics[name].
+        statistic : str, optional
+            The statistic decide is given. Default is 'histogram'.
+        cost : float, optional
+            Relative cost of the assertion, used to order tests when failing fast
+            (min costs 1 and the ks-test 10). Default is 5.
+
+        Returns
+        -------
+        None
+
+        """
+        assert isinstance(name, str) and name not in self._possible_assertions, \
+            'expected a new assertion name, {0} already exists'.format(name)
+        assert statistic in self._statistic_functions_, 'unknown statistic {0}, expected one of {1}'.format(
+            statistic, sorted(self._statistic_functions_))
+        assert callable(decide), 'expected function, input decide is not callable'
+        self._possible_assertions[name] = (partial(self._update_custom, name, statistic),
+                                           partial(self._check_custom, name, statistic, decide))
+        self._assertion_costs_ = dict(self._assertion_costs_, **{name: cost})
+        self.assertions.append(name)
+        self._tests.append(self._possible_assertions[name][1])
+        self._possible_assertions[name][0](self.ref_data)
+        self._params_version_ += 1
+        self._result_cache_.clear()
+
+    def _update_custom(self, name, statistic, input_data):
+        """Compute the statistic of a custom assertion on the reference data."""
+        self.assertion_params[name] = self._statistic_functions_[statistic](input_data)
+
+    def _check_custom(self, name, statistic, decide, test_data):
+        """Run a custom assertion (see register_assertion)."""
+        test_data = np.array(test_data) if isinstance(test_data, list) else test_data
+        self._check_shape(test_data)
+        outcome = decide(self._statistic_functions_[statistic](test_data), self.assertion_params[name])
+        passed, value = outcome if isinstance(outcome, tuple) else (outcome, None)
+        passed = True if passed else False
+        if value is not None:
+            self.last_statistics[name] = value
+        if self.verbose:
+            pass_fail = 'Passed' if passed else 'Failed'
+            if value is None:
+                print('{0} {1} check'.format(pass_fail, name))
+            else:
+                print('{0} {1} check; statistic={2:.4f}'.format(pass_fail, name, float(value)))
+        return (name, passed)
+
+    def _stream_statistics(self, profile):  # pylint: disable=W0613, R0201
+        """Statistics of a test stream known exactly from its profile (see check_stream)."""
+        return {}
+
+    def check_stream(self, chunks, fail_fast=False, **kwargs):
+        """Check a stream of test data chunks in one pass.
+
+        Each chunk is folded into a profile of the test data (see predeval.profiles), so the
+        stream is read once and never held in memory. The tests then run on the profile's
+        Histogram and share its statistics like the tests of one check_data call.
+
+        Categorical streams are checked exactly. For continuous streams the min, max, mean
+        and std are exact, while the ks, ad and cvm tests use the profile's quantile summary,
+        which is exact until the stream has more than summary_size values.
+
+        Parameters
+        ----------
+        chunks : iterable of list or np.array or Histogram
+            The chunks of test data.
+        fail_fast : bool, optional
+            Passed to check_data. Default is False.
+        kwargs
+            Passed to the profile (e.g., summary_size for continuous evaluators).
+
+        Returns
+        -------
+        output : list of tuples
+            The outcome of each test (see check_data).
+
+        """
+        assert isinstance(fail_fast, bool), 'expected boolean, input fail_fast is not a boolean'
+        assert self._profile_class_ is not None, 'This evaluator has no profile for streams'
+        profile = self._profile_class_(**kwargs)
+        for chunk in chunks:
+            profile.update(chunk)
+        assert profile.count > 0, 'Need at least one test value'
+        return self._run_tests(profile.to_histogram(), fail_fast, self._stream_statistics(profile))
+
     def update_param(self, param_key, param_value):
         """Update value in assertion param dictionary attribute.
 
@@ -108,6 +652,8 @@ class ParentPredEval(object):
         param_value : real number or partially evaluated test.
             This is the updated value.
 
+        Updating a param clears the result cache.
+
         Returns
         -------
         None
@@ -115,3 +661,5 @@ class ParentPredEval(object):
         """
         assert param_key in self.assertion_params, 'Requested key is not in assertion_params dict'
         self.assertion_params[param_key] = param_value
+        self._params_version_ += 1
+        self._result_cache_.clear()
@@ -0,0 +1,479 @@
+"""Library of classes for evaluating the class probabilities of classifiers."""
+from numbers import Real
+from functools import partial
+import numpy as np
+from .parent import ParentPredEval
+from .categorical import _chi2_test
+from .kernels import get_backend
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# bytes of rows reduced at a time, so that every statistic of a block is computed while it is in cache.
+_BLOCK_BYTES = 1 << 18
+
+
+def _matrix_statistics(test_data):
+    """Find every statistic of a probability matrix in one pass over its rows.
+
+    The rows are read in cache-sized blocks. Each block's column moments are combined with
+    Chan's parallel algorithm.
+
+    Parameters
+    ----------
+    test_data : np.array
+        Probability matrix with one row per output and one column per class.
+
+    Returns
+    -------
+    dict
+        Column min, max, mean and std, the largest distance of a row sum from 1
+        ('row_error') and the number of rows predicting each class ('counts').
+
+    """
+    n_rows, n_classes = test_data.shape
+    assert n_rows > 0, 'Need at least one row'
+    block_rows = max(1, _BLOCK_BYTES // max(1, n_classes * test_data.itemsize))
+    minimum = np.full(n_classes, np.inf)
+    maximum = np.full(n_classes, -np.inf)
+    mean = np.zeros(n_classes)
+    m2 = np.zeros(n_classes)
+    counts = np.zeros(n_classes, dtype=np.int64)
+    row_error = 0.
+    seen = 0
+    for start in range(0, n_rows, block_rows):
+        block = np.asarray(test_data[start:start + block_rows], dtype=float)
+        np.minimum(minimum, block.min(axis=0), out=minimum)
+        np.maximum(maximum, block.max(axis=0), out=maximum)
+        block_mean = block.mean(axis=0)
+        deviations = block - block_mean
+        total = seen + len(block)
+        delta = block_mean - mean
+        mean = mean + delta * len(block) / total
+        m2 = m2 + np.einsum('ij,ij->j', deviations, deviations) + delta ** 2 * seen * len(block) / total
+        seen = total
+        row_error = max(row_error, np.max(np.abs(block.sum(axis=1) - 1)))
+        counts += np.bincount(block.argmax(axis=1), minlength=n_classes)
+    return {'min': minimum, 'max': maximum, 'mean': mean, 'std': np.sqrt(m2 / n_rows),
+            'row_error': row_error, 'counts': counts}
+
+
+def _sort_columns(test_data):
+    """Sort each column of a matrix (columns are contiguous in the output)."""
+    return np.asfortranarray(np.sort(test_data, axis=0))
+
+
+def _class_ks_test(sorted_ref, backend, sorted_test):
+    """ks-test-statistic of each class's probabilities.
+
+    Parameters
+    ----------
+    sorted_ref : np.array
+        Reference probability matrix with each column sorted.
+    backend : Backend
+        Kernels running the test (see predeval.kernels).
+    sorted_test : np.array
+        Test probability matrix with each column sorted.
+
+    Returns
+    -------
+    np.array
+        The ks-test-statistic of each class.
+
+    """
+    return np.array([backend.ks_statistic(sorted_ref[:, i], sorted_test[:, i])
+                     for i in range(sorted_ref.shape[1])])
+
+
+class ProbabilityEvaluator(ParentPredEval):
+    """
+    Evaluator for the class probabilities of classifiers (e.g., the output of predict_proba).
+
+    Model outputs are (n, K) matrices with one row per prediction and one column per class.
+    Every statistic the tests need (class moments, row sums and predicted class counts) is
+    found in one pass over the matrix and shared by the tests.
+
+    By default, this will run the tests listed in the assertions
+    attribute (['row_sum', 'mean', 'std', 'ks_test', 'chi2_test']).
+    You can change the tests that will run by listing the desired tests in the assertions parameter.
+
+    The available tests are row_sum, mean, std, ks_test and chi2_test. The mean, std and
+    ks-tests compare each class's probabilities with the reference like the
+    ContinuousEvaluator's tests and fail if any class fails. The chi2-test compares how often
+    each class is the predicted (most probable) class. The row_sum test checks that every
+    probability is between 0 and 1 and that every row sums to 1.
+
+    ...
+
+    Parameters
+    ----------
+    ref_data : list of lists or np.array
+        This the reference probability matrix for all tests. All future data will be compared to this data.
+    assertions : list of str, optional
+        These are the assertion tests that will be created.
+        Defaults is ['row_sum', 'mean', 'std', 'ks_test', 'chi2_test'].
+    verbose : bool, optional
+        Whether tests should print their output. Default is true
+    backend : str, optional
+        Kernels used by the ks-test: 'numba', 'numpy' or 'auto' (numba when it is installed).
+        Default is 'auto'. See predeval.kernels.
+
+    Attributes
+    ----------
+    assertion_params : dict
+        dictionary of test names and values defining these tests.
+
+        * mean : np.array
+            Expected mean of each class.
+        * std : np.array
+            Expected standard-deviation of each class.
+        * ks_stat: float
+            ks-test-statistic. When any class exceeds this value. The test 'failed'.
+        * ks_test : func
+            Partially evaluated ks test.
+        * chi2_stat : float
+            Chi2-test-statistic. When this value is exceeded. The test 'failed'.
+        * chi2_test : func
+            Partially evaluated chi2 test of the predicted class counts.
+        * row_sum_tol : float
+            Largest allowed distance of a row sum from 1.
+    assertions : list of str
+        This list of strings describes the tests that will be run on comparison data.
+        Defaults to ['row_sum', 'mean', 'std', 'ks_test', 'chi2_test']
+    last_class_statistics : dict
+        The statistic of each class observed by the latest run of the mean, std and ks tests
+        and the predicted class counts. last_statistics holds the statistic of the worst class.
+
+    """
+    _assertion_costs_ = {'row_sum': 1, 'mean': 1, 'std': 1, 'chi2_test': 2, 'ks_test': 10}
+    # the chi2-test shares the one-pass statistics of all of the test data, so it is not sampled.
+    _sampled_assertions_ = ('ks_test',)
+    _output_ndim_ = 2
+
+    def __init__(
+            self,
+            ref_data,
+            assertions=None,
+            verbose=True,
+            backend='auto',
+            **kwargs):
+        super(ProbabilityEvaluator, self).__init__(ref_data, verbose=verbose)
+        assert self.ref_data.shape[1] >= 2, 'Need at least two classes'
+        self._backend_ = get_backend(backend)
+        self.backend = self._backend_.name
+        self.last_class_statistics = {}
+
+        # ---- Fill in Assertion Parameters ---- #
+        self._assertion_params_ = {
+            'mean': None,
+            'std': None,
+            'ks_test': None,
+            'chi2_test': None,
+        }
+
+        assert isinstance(kwargs.get('ks_stat', 0.5),
+                          Real), 'expected number, input ks_test_stat is not a number'
+        self._assertion_params_['ks_stat'] = kwargs.get('ks_stat', 0.5)
+        assert isinstance(kwargs.get('chi2_stat', 2),
+                          Real), 'expected number, input chi2_test_stat is not a number'
+        self._assertion_params_['chi2_stat'] = kwargs.get('chi2_stat', 2)
+        assert isinstance(kwargs.get('row_sum_tol', 1e-6),
+                          Real), 'expected number, input row_sum_tol is not a number'
+        self._assertion_params_['row_sum_tol'] = kwargs.get('row_sum_tol', 1e-6)
+
+        # ---- create list of assertions to test ---- #
+        self._possible_assertions_ = {
+            'row_sum': (self.update_row_sum, self.check_row_sum),
+            'mean': (self.update_mean, self.check_mean),
+            'std': (self.update_std, self.check_std),
+            'ks_test': (self.update_ks_test, self.check_ks),
+            'chi2_test': (self.update_chi2_test, self.check_chi2),
+        }
+
+        # ---- create list of assertions to test ---- #
+        assertions = ['row_sum', 'mean', 'std', 'ks_test', 'chi2_test'] if assertions is None else assertions
+        self._assertions_ = self._check_assertion_types(assertions)
+
+        self._statistic_functions_['moments'] = self._moments
+        self._statistic_functions_['sorted'] = partial(self._statistic, 'sorted', func=_sort_columns)
+
+        # ---- populate assertion tests with reference data ---- #
+        self._update_assertions(self.ref_data)
+
+        # ---- populate list of tests to run and run tests ---- #
+        self._tests_ = [self._possible_assertions_[i][1] for i in self._assertions_]
+
+    @property
+    def assertion_params(self):
+        return self._assertion_params_
+
+    @property
+    def _possible_assertions(self):
+        return self._possible_assertions_
+
+    @property
+    def assertions(self):
+        return self._assertions_
+
+    @property
+    def _tests(self):
+        return self._tests_
+
+    def _update_assertions(self, ref_data):
+        """Run the update method of every assertion (and std for the mean check) on ref_data.
+
+        The updates share one pass over the reference data.
+        """
+        self._batch_statistics_, self._batch_locks_ = {}, {}
+        try:
+            super(ProbabilityEvaluator, self)._update_assertions(ref_data)
+            if ('std' not in self.assertions) and ('mean' in self.assertions):
+                self._possible_assertions['std'][0](ref_data)
+        finally:
+            self._batch_statistics_, self._batch_locks_ = None, None
+
+    def _moments(self, test_data):
+        """Statistics of test_data (see _matrix_statistics), computed once per check_data call."""
+        return self._statistic('moments', test_data, _matrix_statistics)
+
+    def _input_matrix(self, input_data):
+        """Convert input_data to a probability matrix with one column per reference class."""
+        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+        self._check_shape(input_data)
+        assert input_data.shape[1] == self.ref_data.shape[1], \
+            'Expected {0} classes, input data has {1}'.format(self.ref_data.shape[1], input_data.shape[1])
+        return input_data
+
+    def update_row_sum(self, input_data):  # pylint: disable=W0613
+        """The row_sum test needs no reference data (see assertion_params['row_sum_tol']).
+
+        Parameters
+        ----------
+        input_data : list of lists or np.array
+            This the reference data.
+
+        Returns
+        -------
+        None
+
+        """
+        return
+
+    def update_mean(self, input_data):
+        """Find the mean of each class.
+
+        Parameters
+        ----------
+        input_data : list of lists or np.array
+            This the reference data for the mean-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        self.assertion_params['mean'] = self._moments(self._input_matrix(input_data))['mean']
+
+    def update_std(self, input_data):
+        """Find the standard deviation of each class.
+
+        Parameters
+        ----------
+        input_data : list of lists or np.array
+            This the reference data for the std-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        self.assertion_params['std'] = self._moments(self._input_matrix(input_data))['std']
+
+    def update_ks_test(self, input_data):
+        """Create partially evaluated ks_test of each class.
+
+        Each column of the reference is sorted once here.
+
+        Parameters
+        ----------
+        input_data : list of lists or np.array
+            This the reference data for the ks-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        input_data = self._input_matrix(input_data)
+        assert len(input_data) >= 25, 'Not enough data for reliable KS tests'
+        self.assertion_params['ks_test'] = partial(_class_ks_test, _sort_columns(input_data), self._backend_)
+
+    def update_chi2_test(self, input_data):
+        """Create partially evaluated chi2 contingency test of the predicted class counts.
+
+        Parameters
+        ----------
+        input_data : list of lists or np.array
+            This the reference data for the chi2-test. All future data will be compared to this data.
+
+        Returns
+        -------
+        None
+
+        """
+        counts = self._moments(self._input_matrix(input_data))['counts']
+        self.assertion_params['chi2_test'] = partial(_chi2_test, counts, pvalue='asymptotic')
+
+    def check_row_sum(self, test_data):
+        """Check that every probability is between 0 and 1 and every row sums to 1.
+
+        The largest distance of a row sum from 1 is allowed to be assertion_params['row_sum_tol'].
+
+        Parameters
+        ----------
+        comparison_data : list of lists or np.array
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        moments = self._moments(self._input_matrix(test_data))
+        self.last_statistics['row_sum'] = moments['row_error']
+        passed = True if (moments['row_error'] <= self.assertion_params['row_sum_tol']
+                          and np.all(moments['min'] >= 0) and np.all(moments['max'] <= 1)) else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} row_sum check; largest row sum error={1:.4g}, probabilities in [{2:.4f}, {3:.4f}]'.format(
+                pass_fail, moments['row_error'], np.min(moments['min']), np.max(moments['max'])))
+        return ('row_sum', passed)
+
+    def check_mean(self, test_data):
+        """Check whether any class has a different mean probability than expected.
+
+        If the observed mean of a class is more than 2 standard deviations from its expected
+        mean, the test fails.
+
+        The expected means are controlled by assertion_params['mean'].
+
+        The expected standard deviations are controlled by assertion_params['std'].
+
+        Parameters
+        ----------
+        comparison_data : list of lists or np.array
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['mean'] is not None, 'Must input or load reference mean'
+        assert self.assertion_params['std'] is not None, 'Must input or load reference mean'
+        mean_obs = self._moments(self._input_matrix(test_data))['mean']
+        self.last_class_statistics['mean'] = mean_obs
+        shift = np.abs(mean_obs - self.assertion_params['mean'])
+        self.last_statistics['mean'] = np.max(shift)
+        failed = np.flatnonzero(shift > self.assertion_params['std'] * 2)
+        passed = True if len(failed) == 0 else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} mean check; largest mean shift={1:.4f}, failed classes={2}'.format(
+                pass_fail, np.max(shift), list(failed)))
+        return ('mean', passed)
+
+    def check_std(self, test_data):
+        """Check whether any class has a different standard deviation than expected.
+
+        If the observed standard deviation of a class is less than 1/2 its expected std or
+        greater than 1.5 times its expected std, then the test fails.
+
+        The expected standard deviations are controlled by assertion_params['std'].
+
+        Parameters
+        ----------
+        comparison_data : list of lists or np.array
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['std'] is not None, 'Must input or load reference std'
+        std_obs = self._moments(self._input_matrix(test_data))['std']
+        self.last_class_statistics['std'] = std_obs
+        change = np.abs(std_obs - self.assertion_params['std'])
+        self.last_statistics['std'] = np.max(change)
+        failed = np.flatnonzero(change > self.assertion_params['std'] * 0.5)
+        passed = True if len(failed) == 0 else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} std check; largest std change={1:.4f}, failed classes={2}'.format(
+                pass_fail, np.max(change), list(failed)))
+        return ('std', passed)
+
+    def check_ks(self, test_data):
+        """Test whether the probabilities of each class are similar to the reference.
+
+        If the ks-test-statistic of any class is greater than the threshold (default 0.5),
+        the test failed. The threshold is set by assertion_params['ks_stat'].
+
+        Parameters
+        ----------
+        comparison_data : list of lists or np.array
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['ks_test'], 'Must input or load reference data ks-test'
+        test_data = self._input_matrix(test_data)
+        assert len(test_data) >= 25, 'Not enough data for reliable KS tests'
+        sorted_data = self._statistic('sorted', test_data, _sort_columns)
+        test_stats = self.assertion_params['ks_test'](sorted_data)  # pylint: disable=E1102
+        self.last_class_statistics['ks'] = test_stats
+        self.last_statistics['ks'] = np.max(test_stats)
+        failed = np.flatnonzero(test_stats > self.assertion_params['ks_stat'])
+        passed = True if len(failed) == 0 else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} ks check; largest test statistic={1:.4f}, failed classes={2}'.format(
+                pass_fail, np.max(test_stats), list(failed)))
+        return ('ks', passed)
+
+    def check_chi2(self, test_data):
+        """Test whether each class is predicted (is the most probable class) as often as expected.
+
+        If the chi2-test-statistic of the predicted class counts is greater than the threshold
+        (default 2), the test failed. The threshold is set by assertion_params['chi2_stat'].
+
+        Parameters
+        ----------
+        comparison_data : list of lists or np.array
+            This the data that will be compared to the reference data.
+
+        Returns
+        -------
+        (string, bool)
+            2 item tuple with test name and boolean expressing whether passed test.
+
+        """
+        assert self.assertion_params['chi2_test'], 'Must input or load reference data chi2-test'
+        counts = self._moments(self._input_matrix(test_data))['counts']
+        self.last_class_statistics['counts'] = counts
+        test_stat, p_value, _, _ = self.assertion_params['chi2_test'](counts)  # pylint: disable=E1102
+        self.last_statistics['chi2'] = test_stat
+        passed = True if test_stat <= self.assertion_params['chi2_stat'] else False
+        pass_fail = 'Passed' if passed else 'Failed'
+        if self.verbose:
+            print('{0} chi2 check; test statistic={1:.4f}, p={2:.4f}'.format(
+                pass_fail, float(test_stat), float(p_value)))
+        return ('chi2', passed)
@@ -0,0 +1,480 @@
+"""Library of mergeable reference profiles for building evaluators from sharded data."""
+from abc import ABCMeta, abstractmethod
+from functools import reduce
+import numpy as np
+from .encoding import as_categories
+from .histogram import Histogram
+from .kernels import finite_slice
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+
+# capacity of each summary level relative to the level above it (as in the KLL sketch).
+_LEVEL_DECAY = 2 / 3.
+
+
+def _offset(level, compactions):
+    """Pseudo-random number in (0, 1] for a compaction (a splitmix64 hash of its level and count)."""
+    mask = (1 << 64) - 1
+    key = (level * 0x9E3779B97F4A7C15 + (compactions + 1) * 0xBF58476D1CE4E5B9) & mask
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & mask
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & mask
+    return 1 - ((key ^ (key >> 31)) >> 11) / float(1 << 53)
+
+
+def _compact(values, weights, level, compactions):
+    """Halve a weighted, sorted level of the quantile summary into equally weighted points.
+
+    Each point is taken at an offset within an equal-weight slice of the cumulative weights,
+    so the weighted empirical cdf moves by at most the weight of one point. As in the KLL
+    sketch the offset is random, so the errors of many compactions cancel rather than add up.
+    It is hashed from the level and its number of compactions, which keeps profiles
+    reproducible and merges independent of their order.
+
+    Parameters
+    ----------
+    values : np.array
+        Sorted values of the level.
+    weights : np.array
+        Weight of each value.
+    level : int
+        Level of the summary.
+    compactions : int
+        Number of earlier compactions of the level.
+
+    Returns
+    -------
+    values : np.array
+        Compacted values.
+    weights : np.array
+        Weight of each compacted value.
+
+    """
+    n_points = max(len(values) // 2, 1)
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    offset = _offset(level, compactions)
+    targets = (np.arange(n_points) + offset) * (total / n_points)
+    index = np.minimum(np.searchsorted(cumulative, targets), len(values) - 1)
+    return values[index], np.full(n_points, total / n_points)
+
+
+def _merge_sorted(left_values, left_weights, right_values, right_weights):
+    """Merge two sorted, weighted samples."""
+    values = np.concatenate([left_values, right_values])
+    weights = np.concatenate([left_weights, right_weights])
+    order = np.argsort(values, kind='mergesort')
+    return values[order], weights[order]
+
+
+def merge_profiles(profiles):
+    """Merge a sequence of profiles into a single profile.
+
+    Parameters
+    ----------
+    profiles : list of ContinuousProfile or list of CategoricalProfile
+        Partial profiles (e.g., one for each shard of the reference data).
+
+    Returns
+    -------
+    ContinuousProfile or CategoricalProfile
+        The combined profile.
+
+    """
+    profiles = list(profiles)
+    assert profiles, 'Need at least one profile to merge'
+    return reduce(lambda left, right: left.merge(right), profiles)
+
+
+class ParentProfile(object):
+    """
+    Parent Class for mergeable reference profiles.
+
+    A profile holds the reference statistics that the evaluators' update methods need.
+    Profiles can be built on separate workers and merged in any order.
+
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def update(self, input_data):
+        """Add data to the profile."""
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    def merge(self, other):
+        """Combine two profiles into a new profile."""
+        raise NotImplementedError  # pragma: no cover
+
+    @classmethod
+    def from_data(cls, input_data, **kwargs):
+        """Create a profile from a single chunk of data.
+
+        Parameters
+        ----------
+        input_data : list or np.array or Histogram
+            This is the reference data (or a shard of it).
+        kwargs
+            Passed to the profile constructor.
+
+        Returns
+        -------
+        profile
+
+        """
+        return cls(**kwargs).update(input_data)
+
+    @abstractmethod
+    def scale(self, factor):
+        """Multiply the weight of every observation by factor."""
+        raise NotImplementedError  # pragma: no cover
+
+    @abstractmethod
+    def to_histogram(self):
+        """Express the profile's distribution as a Histogram."""
+        raise NotImplementedError  # pragma: no cover
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def __len__(self):
+        return int(self.count)
+
+
+class ContinuousProfile(ParentProfile):
+    """
+    Mergeable profile of continuous reference data.
+
+    Keeps the min, max, count, mean and sum of squared deviations (merged with Chan's
+    parallel algorithm) and a weighted quantile summary used for ks-tests.
+
+    The quantile summary is exact until it holds more than summary_size values. After that
+    it is a KLL-style sketch: a stack of levels, each compacted into half as many points of
+    twice the weight when it outgrows its capacity. Merging two profiles merges them level by
+    level, so data compacted once is not compacted again at the same level and the cdf error
+    does not grow with the number of merges. The merge of two profiles does not depend on
+    their order.
+
+    ...
+
+    Parameters
+    ----------
+    summary_size : int, optional
+        Maximum number of points kept in the quantile summary. Default is 1000.
+
+    Attributes
+    ----------
+    count : int
+        Number of observations in the profile.
+    minimum : float
+        Minimum observed value.
+    maximum : float
+        Maximum observed value.
+    mean : float
+        Mean of the observed values.
+    m2 : float
+        Sum of squared deviations from the mean.
+    summary_values : np.array
+        Sorted values of the quantile summary (every level).
+    summary_weights : np.array
+        Weight of each value in the quantile summary.
+    nonfinite : int
+        Number of nan and inf values seen (left out of the other statistics).
+
+    """
+    def __init__(self, summary_size=1000):
+        assert isinstance(summary_size, int) and summary_size > 0, \
+            'expected positive integer, input summary_size is not a positive integer'
+        self.summary_size = summary_size
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.nonfinite = 0
+        # (values, weights) of each summary level and the number of compactions of each level.
+        self._levels_ = []
+        self._compactions_ = []
+        self._summary_ = None
+
+    @property
+    def std(self):
+        """Population standard deviation of the observed values."""
+        return np.sqrt(self.m2 / self.count) if self.count else None
+
+    @property
+    def nonfinite_rate(self):
+        """Fraction of the values seen that were nan or inf."""
+        total = self.count + self.nonfinite
+        return self.nonfinite / float(total) if total else 0.0
+
+    @property
+    def summary_values(self):
+        return self._summary()[0]
+
+    @property
+    def summary_weights(self):
+        return self._summary()[1]
+
+    def _summary(self):
+        """The levels merged into one sorted, weighted sample (built once per change)."""
+        if self._summary_ is None:
+            summary = (np.array([]), np.array([]))
+            for values, weights in self._levels_:
+                summary = _merge_sorted(summary[0], summary[1], values, weights)
+            self._summary_ = summary
+        return self._summary_
+
+    def _add_level(self, level, values, weights):
+        """Merge a sorted, weighted sample into a level of the summary."""
+        while len(self._levels_) <= level:
+            self._levels_.append((np.array([]), np.array([])))
+            self._compactions_.append(0)
+        self._levels_[level] = _merge_sorted(self._levels_[level][0], self._levels_[level][1], values, weights)
+
+    def _compress(self):
+        """Compact levels, lowest first, until the summary holds at most summary_size points."""
+        while sum(len(values) for values, _ in self._levels_) > self.summary_size:
+            top = len(self._levels_) - 1
+            capacities = [max(2, int(self.summary_size * (1 - _LEVEL_DECAY) * _LEVEL_DECAY ** (top - level)))
+                          for level in range(top + 1)]
+            sizes = [len(values) for values, _ in self._levels_]
+            full = [level for level in range(top + 1) if sizes[level] > capacities[level]]
+            level = full[0] if full else min(level for level in range(top + 1) if sizes[level] > 0)
+            values, weights = _compact(self._levels_[level][0], self._levels_[level][1], level,
+                                       self._compactions_[level])
+            self._compactions_[level] += 1
+            self._levels_[level] = (np.array([]), np.array([]))
+            self._add_level(level + 1, values, weights)
+
+    @property
+    def exact(self):
+        """Whether the quantile summary still holds every observed value."""
+        return len(self.summary_values) == self.count and bool(np.all(self.summary_weights == 1))
+
+    def _combine(self, count, minimum, maximum, mean, m2, levels, nonfinite=0, compactions=()):
+        """Fold summary statistics and the (values, weights) of summary levels into this profile
+        in place."""
+        self.nonfinite += nonfinite
+        if count == 0:
+            return self
+        if self.count == 0:
+            self.minimum, self.maximum = minimum, maximum
+        else:
+            self.minimum = min(self.minimum, minimum)
+            self.maximum = max(self.maximum, maximum)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+        for level, (values, weights) in enumerate(levels):
+            self._add_level(level, values, weights)
+        for level, count in enumerate(compactions):
+            self._compactions_[level] += count
+        self._compress()
+        self._summary_ = None
+        return self
+
+    def update(self, input_data):
+        """Add a chunk of data to the profile.
+
+        Parameters
+        ----------
+        input_data : list or np.array or Histogram
+            This is the reference data (or a shard of it).
+
+        Returns
+        -------
+        self
+
+        """
+        if isinstance(input_data, Histogram):
+            if len(input_data.values) == 0:
+                self.nonfinite += input_data.nonfinite
+                return self
+            values, weights = input_data.values, input_data.counts.astype(float)
+            mean = np.average(values, weights=weights)
+            return self._combine(input_data.count, values[0], values[-1], mean,
+                                 np.sum(weights * (values - mean) ** 2), [(values, weights)], input_data.nonfinite)
+        input_data = np.array(input_data) if isinstance(input_data, list) else input_data
+        assert len(input_data.shape) == 1, 'Input data not a single vector'
+        if len(input_data) == 0:
+            return self
+        values = finite_slice(np.sort(input_data))
+        nonfinite = len(input_data) - len(values)
+        if len(values) == 0:
+            self.nonfinite += nonfinite
+            return self
+        # float64 accumulators, whatever the type of the data (e.g., float32).
+        mean = np.mean(values, dtype=np.float64)
+        deviations = np.subtract(values, mean, dtype=np.float64)
+        return self._combine(len(values), values[0], values[-1], mean,
+                             np.dot(deviations, deviations), [(values, np.ones(len(values)))], nonfinite)
+
+    def merge(self, other):
+        """Combine this profile with another continuous profile.
+
+        Parameters
+        ----------
+        other : ContinuousProfile
+            The profile to combine with this one.
+
+        Returns
+        -------
+        ContinuousProfile
+            A new profile. Neither input is modified.
+
+        """
+        assert isinstance(other, ContinuousProfile), 'Can only merge with a ContinuousProfile'
+        merged = ContinuousProfile(summary_size=max(self.summary_size, other.summary_size))
+        merged._combine(self.count, self.minimum, self.maximum, self.mean, self.m2,
+                        self._levels_, self.nonfinite, self._compactions_)
+        return merged._combine(other.count, other.minimum, other.maximum, other.mean, other.m2,
+                               other._levels_, other.nonfinite, other._compactions_)
+
+    def scale(self, factor):
+        """Multiply the weight of every observation by factor (e.g., to decay old data).
+
+        The mean is unchanged. The min and max are kept unless factor is 0, which
+        empties the profile.
+
+        Parameters
+        ----------
+        factor : float
+            Non-negative weight multiplier.
+
+        Returns
+        -------
+        ContinuousProfile
+            A new profile. The input is not modified.
+
+        """
+        assert factor >= 0, 'expected non-negative factor'
+        scaled = ContinuousProfile(summary_size=self.summary_size)
+        if factor == 0:
+            return scaled
+        return scaled._combine(self.count * factor, self.minimum, self.maximum, self.mean,
+                               self.m2 * factor, [(values, weights * factor) for values, weights in self._levels_],
+                               self.nonfinite * factor, self._compactions_)
+
+    def to_histogram(self):
+        """Express the quantile summary as a Histogram (exact while the summary is exact).
+
+        Returns
+        -------
+        Histogram
+
+        """
+        return Histogram(self.summary_values, self.summary_weights, self.nonfinite)
+
+
+class CategoricalProfile(ParentProfile):
+    """
+    Mergeable profile of categorical reference data.
+
+    Keeps the count of each observed category.
+
+    ...
+
+    Attributes
+    ----------
+    categories : np.array
+        Sorted array of the observed categories.
+    counts : np.array
+        Number of observations of each category.
+
+    """
+    def __init__(self):
+        self.categories = np.array([])
+        self.counts = np.array([], dtype=int)
+
+    @property
+    def count(self):
+        """Number of observations in the profile."""
+        return self.counts.sum()
+
+    def _combine(self, categories, counts):
+        """Fold category counts into this profile in place."""
+        if len(categories) == 0:
+            return self
+        if len(self.categories) == 0:
+            self.categories, self.counts = categories, counts
+            return self
+        all_categories, inverse = np.unique(np.concatenate([self.categories, categories]),
+                                            return_inverse=True)
+        all_counts = np.concatenate([self.counts, counts])
+        merged = np.zeros(len(all_categories), dtype=all_counts.dtype)
+        np.add.at(merged, inverse, all_counts)
+        self.categories, self.counts = all_categories, merged
+        return self
+
+    def update(self, input_data):
+        """Add a chunk of data to the profile.
+
+        Parameters
+        ----------
+        input_data : list or np.array or Histogram
+            This is the reference data (or a shard of it).
+
+        Returns
+        -------
+        self
+
+        """
+        if isinstance(input_data, Histogram):
+            return self._combine(input_data.values, input_data.counts)
+        input_data = as_categories(input_data)
+        assert len(input_data.shape) == 1, 'Input data not a single vector'
+        return self._combine(*np.unique(input_data, return_counts=True))
+
+    def merge(self, other):
+        """Combine this profile with another categorical profile.
+
+        Parameters
+        ----------
+        other : CategoricalProfile
+            The profile to combine with this one.
+
+        Returns
+        -------
+        CategoricalProfile
+            A new profile. Neither input is modified.
+
+        """
+        assert isinstance(other, CategoricalProfile), 'Can only merge with a CategoricalProfile'
+        merged = CategoricalProfile()
+        merged._combine(self.categories, self.counts)
+        return merged._combine(other.categories, other.counts)
+
+    def scale(self, factor):
+        """Multiply the count of every category by factor (e.g., to decay old data).
+
+        Parameters
+        ----------
+        factor : float
+            Non-negative weight multiplier.
+
+        Returns
+        -------
+        CategoricalProfile
+            A new profile. The input is not modified.
+
+        """
+        assert factor >= 0, 'expected non-negative factor'
+        scaled = CategoricalProfile()
+        if factor == 0:
+            return scaled
+        return scaled._combine(self.categories, self.counts * factor)
+
+    def to_histogram(self):
+        """Express the category counts as a Histogram.
+
+        Returns
+        -------
+        Histogram
+
+        """
+        return Histogram(self.categories, self.counts)
@@ -0,0 +1,234 @@
+"""Sequential drift detectors that check a stream of continuous model outputs value by value."""
+from numbers import Real
+import numpy as np
+from .profiles import ContinuousProfile
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+
+def _reference_moments(evaluator):
+    """Reference mean and std of a continuous evaluator."""
+    mean, std = evaluator.assertion_params['mean'], evaluator.assertion_params['std']
+    if mean is None or std is None:
+        reference = evaluator.ref_data
+        if isinstance(reference, ContinuousProfile):
+            mean, std = reference.mean, reference.std
+        else:
+            mean, std = np.mean(reference), np.std(reference)
+    return mean, std
+
+
+def _reset_sum(values, start):
+    """Running value of s = max(0, s + value) from s = start, for every value at once.
+
+    With C the cumulative sum of values, s_t = C_t - min(-start, min of C up to t).
+    """
+    cumulative = np.cumsum(values)
+    return cumulative - np.minimum(np.minimum.accumulate(cumulative), -start)
+
+
+class ParentDetector(object):
+    """
+    Parent Class for sequential drift detectors.
+
+    A detector keeps a constant amount of state, however many values it has seen. update
+    takes a micro-batch of values and processes it with vectorized numpy operations, giving
+    the same result as updating one value at a time.
+
+    ...
+
+    Parameters
+    ----------
+    mean : float
+        Reference mean.
+    std : float
+        Reference standard deviation. Drift and thresholds are in units of std.
+    threshold : float
+        Statistic above which the detector alarms.
+
+    Attributes
+    ----------
+    n_seen : int
+        Number of values seen.
+    alarm_index : int or None
+        Position in the stream of the value that raised the first alarm (None before an alarm).
+    statistic : float
+        Current value of the detection statistic.
+
+    """
+    def __init__(self, mean, std, threshold):
+        assert isinstance(mean, Real) and isinstance(std, Real), 'expected numbers, input mean or std is not a number'
+        assert std > 0, 'expected positive std'
+        assert isinstance(threshold, Real) and threshold > 0, 'expected positive threshold'
+        self.mean = float(mean)
+        self.std = float(std)
+        self.threshold = threshold
+        self.n_seen = 0
+        self.alarm_index = None
+        self.statistic = 0.0
+
+    @classmethod
+    def from_evaluator(cls, evaluator, **kwargs):
+        """Create a detector from the reference mean and std of a ContinuousEvaluator.
+
+        Parameters
+        ----------
+        evaluator : ContinuousEvaluator
+            Evaluator holding the reference data.
+        kwargs
+            Passed to the detector.
+
+        Returns
+        -------
+        detector
+
+        """
+        mean, std = _reference_moments(evaluator)
+        return cls(mean, std, **kwargs)
+
+    @property
+    def alarm(self):
+        """Whether the detector has alarmed."""
+        return self.alarm_index is not None
+
+    def _statistics(self, z_scores):
+        """Detection statistic after each value (and the new state)."""
+        raise NotImplementedError  # pragma: no cover
+
+    def update(self, values):
+        """Add a micro-batch of values to the stream.
+
+        Parameters
+        ----------
+        values : float or list or np.array
+            The next values of the stream.
+
+        Returns
+        -------
+        int or None
+            Position in the stream of the first value in this batch whose statistic exceeds
+            the threshold (None if there is none).
+
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        assert len(values.shape) == 1, 'Input data not a single vector'
+        if len(values) == 0:
+            return None
+        statistics = self._statistics((values - self.mean) / self.std)
+        self.statistic = statistics[-1]
+        above = np.flatnonzero(statistics > self.threshold)
+        first = self.n_seen + int(above[0]) if len(above) else None
+        self.n_seen += len(values)
+        if first is not None and self.alarm_index is None:
+            self.alarm_index = first
+        return first
+
+    def reset(self):
+        """Forget the stream (e.g., after handling an alarm).
+
+        Returns
+        -------
+        None
+
+        """
+        self.n_seen = 0
+        self.alarm_index = None
+        self.statistic = 0.0
+
+
+class CusumDetector(ParentDetector):
+    """
+    Two-sided CUSUM detector of a shift in the mean from the reference mean.
+
+    Keeps the upper and lower cumulative sums of the standardized values (less the drift),
+    reset at 0. The detector alarms when either sum exceeds the threshold. The defaults
+    (drift 0.5, threshold 5) detect a shift of one standard deviation within about 10 values
+    and false alarm about once every 400 values of an unshifted stream (raise threshold for
+    fewer false alarms).
+
+    ...
+
+    Parameters
+    ----------
+    mean : float
+        Reference mean.
+    std : float
+        Reference standard deviation.
+    drift : float, optional
+        Shift (in standard deviations) allowed without raising the sums. Default is 0.5.
+    threshold : float, optional
+        Sum (in standard deviations) above which the detector alarms. Default is 5.
+
+    Attributes
+    ----------
+    upper : float
+        Cumulative sum of upward deviations.
+    lower : float
+        Cumulative sum of downward deviations.
+
+    """
+    def __init__(self, mean, std, drift=0.5, threshold=5.0):
+        super(CusumDetector, self).__init__(mean, std, threshold)
+        assert isinstance(drift, Real) and drift >= 0, 'expected non-negative drift'
+        self.drift = drift
+        self.upper = 0.0
+        self.lower = 0.0
+
+    def _statistics(self, z_scores):
+        upper = _reset_sum(z_scores - self.drift, self.upper)
+        lower = _reset_sum(-z_scores - self.drift, self.lower)
+        self.upper, self.lower = upper[-1], lower[-1]
+        return np.maximum(upper, lower)
+
+    def reset(self):
+        super(CusumDetector, self).reset()
+        self.upper = 0.0
+        self.lower = 0.0
+
+
+class PageHinkleyDetector(ParentDetector):
+    """
+    Two-sided Page-Hinkley detector of a change in the mean of the stream.
+
+    Keeps the cumulative deviation of each value from the running mean of the stream (less
+    delta) and its extreme so far. The detector alarms when the deviation moves more than the
+    threshold from its extreme. Unlike CUSUM, the test compares the stream with its own past,
+    so only the reference std (the scale of delta and threshold) is used. The running mean is
+    noisy early in a stream, so the default threshold is higher than CUSUM's.
+
+    ...
+
+    Parameters
+    ----------
+    mean : float
+        Reference mean (the statistic does not depend on it).
+    std : float
+        Reference standard deviation.
+    delta : float, optional
+        Change (in standard deviations) allowed without raising the statistic. Default is 0.5.
+    threshold : float, optional
+        Statistic (in standard deviations) above which the detector alarms. Default is 8.
+
+    """
+    def __init__(self, mean, std, delta=0.5, threshold=8.0):
+        super(PageHinkleyDetector, self).__init__(mean, std, threshold)
+        assert isinstance(delta, Real) and delta >= 0, 'expected non-negative delta'
+        self.delta = delta
+        self._state_ = np.zeros(5)
+
+    def _statistics(self, z_scores):
+        # running total, cumulative deviations and their extremes.
+        total, up, up_min, down, down_max = self._state_
+        counts = self.n_seen + np.arange(1, len(z_scores) + 1)
+        deviations = z_scores - (total + np.cumsum(z_scores)) / counts
+        up = up + np.cumsum(deviations - self.delta)
+        down = down + np.cumsum(deviations + self.delta)
+        up_min = np.minimum(np.minimum.accumulate(up), up_min)
+        down_max = np.maximum(np.maximum.accumulate(down), down_max)
+        self._state_ = np.array([total + z_scores.sum(), up[-1], up_min[-1], down[-1], down_max[-1]])
+        return np.maximum(up - up_min, down_max - down)
+
+    def reset(self):
+        super(PageHinkleyDetector, self).reset()
+        self._state_ = np.zeros(5)
@@ -0,0 +1,259 @@
+"""Content-addressed store of read-only reference arrays shared by evaluators and processes."""
+import hashlib
+import io
+import pickle
+import sys
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+__author__ = 'Dan Vatterott'
+__license__ = 'MIT'
+
+# arrays in a shared block start on cache line boundaries.
+_ALIGNMENT = 64
+
+
+def _storable(obj):
+    """Whether obj is an array the store can hold (not an object array)."""
+    return isinstance(obj, np.ndarray) and obj.dtype.kind in 'biufcUSmM' and not obj.dtype.hasobject
+
+
+class _StorePickler(pickle.Pickler):
+    """Pickler that replaces arrays with their digest in the store."""
+
+    def __init__(self, store, output):
+        pickle.Pickler.__init__(self, output, pickle.HIGHEST_PROTOCOL)
+        self.store = store
+
+    def persistent_id(self, obj):  # pylint: disable=E0202
+        if _storable(obj):
+            return self.store.digest(self.store.add(obj))
+        return None
+
+
+class _StoreUnpickler(pickle.Unpickler):
+    """Unpickler that looks digests up in the store."""
+
+    def __init__(self, store, data):
+        pickle.Unpickler.__init__(self, data)
+        self.store = store
+
+    def persistent_load(self, pid):  # pylint: disable=E0202
+        return self.store.get(pid)
+
+
+class ReferenceStore(object):
+    """
+    Keep one read-only copy of each distinct reference array.
+
+    Arrays are keyed by a hash of their dtype, shape and bytes, so evaluators built on the
+    same reference (for example, several assertion configurations over one baseline) share
+    one copy of the reference, its sorted values and the arrays inside their partially
+    evaluated tests. Memory grows with the number of distinct arrays rather than the number
+    of evaluators.
+
+    share moves the arrays into one block of shared memory. Other processes attach to the
+    block and load evaluators whose arrays are views of it instead of copies.
+
+    ...
+
+    Attributes
+    ----------
+    nbytes : int
+        Bytes held by the store's arrays.
+
+    """
+    def __init__(self):
+        self._arrays_ = {}
+        self._shared_ = None
+
+    def __len__(self):
+        return len(self._arrays_)
+
+    def __contains__(self, key):
+        return key in self._arrays_
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays_.values())
+
+    @staticmethod
+    def digest(array):
+        """Hash the dtype, shape and bytes of an array.
+
+        Parameters
+        ----------
+        array : np.array
+
+        Returns
+        -------
+        str
+
+        """
+        array = np.ascontiguousarray(array)
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update('{0}{1}'.format(array.dtype.str, array.shape).encode('utf-8'))
+        hasher.update(array.view(np.uint8).reshape(-1) if array.size else b'')
+        return hasher.hexdigest()
+
+    def add(self, array):
+        """Add an array to the store.
+
+        Parameters
+        ----------
+        array : list or np.array
+
+        Returns
+        -------
+        np.array
+            The store's read-only copy (the existing one when an equal array was added before).
+
+        """
+        array = np.asarray(array)
+        assert _storable(array), 'Unsupported array type {0}'.format(array.dtype)
+        key = self.digest(array)
+        if key not in self._arrays_:
+            assert self._shared_ is None, 'Cannot add arrays to a shared store'
+            stored = np.array(array, order='C')
+            stored.flags.writeable = False
+            self._arrays_[key] = stored
+        return self._arrays_[key]
+
+    def get(self, key):
+        """Get an array by its digest.
+
+        Parameters
+        ----------
+        key : str
+            Digest of the array.
+
+        Returns
+        -------
+        np.array
+
+        """
+        return self._arrays_[key]
+
+    def dumps(self, obj):
+        """Pickle obj with its arrays added to the store and replaced by their digests.
+
+        Parameters
+        ----------
+        obj : object
+            For example, an evaluator.
+
+        Returns
+        -------
+        bytes
+
+        """
+        output = io.BytesIO()
+        _StorePickler(self, output).dump(obj)
+        return output.getvalue()
+
+    def loads(self, data):
+        """Unpickle the output of dumps with arrays taken from the store.
+
+        Parameters
+        ----------
+        data : bytes
+
+        Returns
+        -------
+        object
+
+        """
+        return _StoreUnpickler(self, io.BytesIO(data)).load()
+
+    def intern(self, obj):
+        """Copy obj with every array replaced by the store's copy.
+
+        Parameters
+        ----------
+        obj : object
+            For example, an evaluator.
+
+        Returns
+        -------
+        object
+            A copy of obj that shares the store's read-only arrays.
+
+        """
+        return self.loads(self.dumps(obj))
+
+    def share(self):
+        """Move the arrays into one block of shared memory.
+
+        Objects loaded afterwards get views of the block. The store's owner must call
+        unlink when every process is done with it.
+
+        Returns
+        -------
+        dict
+            Manifest passed to attach in other processes.
+
+        """
+        assert shared_memory is not None, 'shared memory requires python 3.8 or newer'
+        if self._shared_ is not None:
+            return self._shared_[1]
+        layout, offset = {}, 0
+        for key, array in self._arrays_.items():
+            layout[key] = (offset, array.dtype.str, array.shape)
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        manifest = {'name': block.name, 'layout': layout}
+        arrays = self._views(block, layout)
+        for key, array in arrays.items():
+            array.flags.writeable = True
+            array[...] = self._arrays_[key]
+            array.flags.writeable = False
+        self._arrays_, self._shared_ = arrays, (block, manifest)
+        return manifest
+
+    @staticmethod
+    def _views(block, layout):
+        """Read-only array views of a shared memory block."""
+        arrays = {}
+        for key, (offset, dtype, shape) in layout.items():
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf, offset=offset)
+            array.flags.writeable = False
+            arrays[key] = array
+        return arrays
+
+    @classmethod
+    def attach(cls, manifest):
+        """Open a store shared by another process.
+
+        Parameters
+        ----------
+        manifest : dict
+            The output of share.
+
+        Returns
+        -------
+        ReferenceStore
+
+        """
+        assert shared_memory is not None, 'shared memory requires python 3.8 or newer'
+        # the owner unlinks the block, so attached processes do not track it (python 3.13+).
+        kwargs = {'track': False} if sys.version_info >= (3, 13) else {}
+        block = shared_memory.SharedMemory(name=manifest['name'], **kwargs)
+        store = cls()
+        store._arrays_ = cls._views(block, manifest['layout'])
+        store._shared_ = (block, manifest)
+        return store
+
+    def unlink(self):
+        """Free the shared memory block once every process has closed it (owner only).
+
+        Returns
+        -------
+        None
+
+        """
+        if self._shared_ is not None:
+            self._shared_[0].unlink()
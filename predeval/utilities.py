@@ -4,7 +4,8 @@ __author__ = 'Dan Vatterott'
 __license__ = 'MIT'
 
 
-def evaluate_tests(test_ouputs, assert_test=False, verbose=True):
+def evaluate_tests(test_ouputs, assert_test=False, verbose=True, exporter=None,
+                   evaluator_name='default', history=None, statistics=None):
     """Check whether the data passed evaluation tests.
 
     Parameters
@@ -12,19 +13,35 @@ def evaluate_tests(test_ouputs, assert_test=False, verbose=True):
     test_ouputs : list of tuples
         Each tuple has a string a boolean. The string describes the test.
         The boolean describes the outcome. True is a pass and False is a fail.
+        None means the test was skipped.
         This is the output of the check_data method.
     assert_test : bool
         Whether to assert the test passed. Default is False.
     verbose : bool
         Whether to print whether each test was passed or not.
+    exporter : MetricsExporter, optional
+        Exporter that records the outcomes (see predeval.metrics).
+    evaluator_name : str, optional
+        Name of the evaluator used by the exporter and history. Default is 'default'.
+    history : HistoryStore, optional
+        Store that keeps the outcomes (see predeval.history).
+    statistics : dict, optional
+        Statistics kept with the outcomes in history (e.g., the evaluator's last_statistics).
 
     Returns
     -------
     None
 
     """
+    if exporter is not None:
+        exporter.observe(evaluator_name, test_ouputs)
+    if history is not None:
+        history.record(evaluator_name, test_ouputs, statistics=statistics)
     for test_name, test_val in test_ouputs:
-        if test_val:
+        if test_val is None:
+            if verbose:
+                print('Skipped {} test.'.format(test_name))
+        elif test_val:
             if verbose:
                 print('Passed {} test.'.format(test_name))
         else:
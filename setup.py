@@ -11,7 +11,8 @@ with open('README.rst') as readme_file:
 with open('HISTORY.rst') as history_file:
     HISTORY = history_file.read()
 
-REQUIREMENTS = ['numpy>=1.17.0', 'scipy>=1.0.0', 'joblib>=0.9.2', 'cloudpickle']
+# scipy>=1.5: the asymptotic ks p-value (predeval.kernels) uses stats.kstwo like scipy's ks_2samp.
+REQUIREMENTS = ['numpy>=1.20.0', 'scipy>=1.5.0', 'joblib>=0.9.2', 'cloudpickle']
 
 SETUP_REQUIREMENTS = ['pytest-runner', ]
 
@@ -34,6 +35,12 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules'
     ],
     description="Identify changes in model outputs at prediction time.",
+    entry_points={
+        'console_scripts': [
+            'predeval=predeval.cli:main',
+        ],
+    },
+    extras_require={'numba': ['numba>=0.50.0']},
     install_requires=REQUIREMENTS,
     license="MIT license",
     long_description=README + '\n\n' + HISTORY,
@@ -4,14 +4,36 @@
 """Tests for `predeval` package."""
 import sys
 import os
+import json
+import mmap
+import threading
+from functools import partial
+from http.server import HTTPServer
+from unittest import mock
+from urllib.request import urlopen
 import numpy as np
 from numpy.random import choice, seed
+from scipy import stats
 # import pytest
 
 sys.path.append(os.path.abspath("../predeval"))
 from predeval import ContinuousEvaluator  # noqa pylint: disable=W0611, C0413
 from predeval import CategoricalEvaluator  # noqa pylint: disable=W0611, C0413
 from predeval import evaluate_tests  # noqa pylint: disable=W0611, C0413
+from predeval import ProbabilityEvaluator  # noqa pylint: disable=W0611, C0413
+from predeval import EvaluatorBank  # noqa pylint: disable=W0611, C0413
+from predeval import Histogram  # noqa pylint: disable=W0611, C0413
+from predeval import HistoryStore  # noqa pylint: disable=W0611, C0413
+from predeval import ContinuousProfile, CategoricalProfile, merge_profiles  # noqa pylint: disable=W0611, C0413
+from predeval import MetricsExporter  # noqa pylint: disable=W0611, C0413
+from predeval import ReferenceStore  # noqa pylint: disable=W0611, C0413
+from predeval import EvaluatorManager  # noqa pylint: disable=W0611, C0413
+from predeval import CusumDetector, PageHinkleyDetector  # noqa pylint: disable=W0611, C0413
+from predeval.encoding import CategoryEncoder  # noqa pylint: disable=W0611, C0413
+from predeval.categorical import _chi2_test  # noqa pylint: disable=W0611, C0413
+from predeval.kernels import get_backend  # noqa pylint: disable=W0611, C0413
+from predeval.cli import main, evaluate_file  # noqa pylint: disable=W0611, C0413
+from predeval import benchmark  # noqa pylint: disable=W0611, C0413
 
 
 class TestContinuous(object):
@@ -148,6 +170,268 @@ class TestContinuous(object):
         self.con_eval.update_param('minimum', -1)
         assert self.con_eval.assertion_params['minimum'] == -1
 
+    def test_result_cache(self, capsys):  # pylint: disable=R0201
+        """Assert that check_data results are cached and invalidated."""
+        con_eval = ContinuousEvaluator([x for x in range(31)], assertions=['min', 'max'])
+        con_eval.enable_cache(2)
+        test_data = np.array([x for x in range(51)])
+        output = con_eval.check_data(test_data)
+        assert con_eval.check_data(test_data.copy()) == output
+        captured = capsys.readouterr()
+        assert captured.out == ("Passed min check; min observed=0.0000\n"
+                                "Failed max check; max observed=50.0000\n")
+        con_eval.check_data(test_data[:10])
+        con_eval.check_data(test_data[:20])
+        assert len(con_eval._result_cache_) == 2  # pylint: disable=W0212
+        capsys.readouterr()
+        con_eval.update_param('maximum', 50)
+        assert con_eval.check_data(test_data) == [('min', True), ('max', True)]
+        con_eval.update_max([10])
+        assert con_eval.check_data(test_data) == [('min', True), ('max', False)]
+        captured = capsys.readouterr()
+        assert captured.out.count('max check') == 2
+
+    def test_cached_statistics(self):  # pylint: disable=R0201
+        """Assert that a cache hit restores the statistics of the cached check."""
+        seed(1234)
+        batch_a = np.random.normal(0, 1, 1000)
+        batch_b = np.random.normal(2, 1, 1000)
+        con_eval = ContinuousEvaluator(np.random.normal(0, 1, 1000), verbose=False)
+        con_eval.enable_cache()
+        output = con_eval.check_data(batch_a)
+        statistics = dict(con_eval.last_statistics)
+        con_eval.check_data(batch_b)
+        assert np.isclose(con_eval.last_statistics['mean'], np.mean(batch_b))
+        assert con_eval.check_data(batch_a) == output
+        assert con_eval.last_statistics == statistics
+        assert np.isclose(con_eval.last_statistics['mean'], np.mean(batch_a))
+
+    def test_backend(self):  # pylint: disable=R0201
+        """Assert that every backend gives the same results as numpy and scipy."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 20000)
+        test_data = np.random.normal(0.1, 1, 20000)
+        assert get_backend('numpy').name == 'numpy'
+        numpy_eval = ContinuousEvaluator(ref_data, verbose=False, backend='numpy')
+        auto_eval = ContinuousEvaluator(ref_data, verbose=False, backend='auto')
+        assert numpy_eval.check_data(test_data) == auto_eval.check_data(test_data)
+        for key, value in numpy_eval.last_statistics.items():
+            assert np.isclose(auto_eval.last_statistics[key], value, rtol=1e-12, atol=0)
+        sorted_ref, sorted_test = np.sort(ref_data), np.sort(test_data)
+        for backend in set(['numpy', auto_eval.backend]):
+            kernels = get_backend(backend)
+            assert np.isclose(kernels.ks_statistic(sorted_ref, sorted_test),
+                              numpy_eval.last_statistics['ks'])
+            assert kernels.moments(np.arange(5))[:2] == (0, 4)
+
+    def test_nonfinite(self):  # pylint: disable=R0201
+        """Assert that nan and inf values are left out of the tests and counted by the finite test."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 1000)
+        ref_data[:10] = np.nan
+        test_data = np.random.normal(0, 1, 500)
+        test_data[:5], test_data[5:10], test_data[10] = np.inf, np.nan, -np.inf
+        finite_data = test_data[np.isfinite(test_data)]
+        for backend in set(['numpy', get_backend().name]):
+            con_eval = ContinuousEvaluator(ref_data, assertions=['min', 'mean', 'ks_test', 'finite'],
+                                           verbose=False, backend=backend)
+            assert np.isclose(con_eval.assertion_params['mean'], np.nanmean(ref_data))
+            assert con_eval.assertion_params['nonfinite_rate'] == 0.01
+            assert con_eval.check_data(test_data) == [('min', True), ('mean', True), ('ks', True), ('finite', False)]
+            assert np.isclose(con_eval.last_statistics['mean'], finite_data.mean())
+            assert np.isclose(con_eval.last_statistics['ks'], stats.ks_2samp(ref_data[10:], finite_data)[0])
+            assert con_eval.last_statistics['finite'] == 11 / 500.
+            assert con_eval.check_stream(np.array_split(test_data, 3))[-1] == ('finite', False)
+            assert con_eval.last_statistics['finite'] == 11 / 500.
+            con_eval.update_param('nonfinite_tol', 0.02)
+            assert con_eval.check_data(test_data)[-1] == ('finite', True)
+            assert get_backend(backend).moments(np.full(5, np.nan))[4] == 5
+
+    def test_compact_dtype(self):  # pylint: disable=R0201
+        """Assert that float32 data is stored and tested without float64 copies or precision loss."""
+        seed(1234)
+        ref_data = np.random.normal(1000, 1, 20000)
+        test_data = np.random.normal(1000, 1, 5000).astype(np.float32)
+        wide_eval = ContinuousEvaluator(ref_data, verbose=False)
+        con_eval = ContinuousEvaluator(ref_data, verbose=False, dtype=np.float32)
+        assert con_eval.ref_data.dtype == np.float32
+        assert con_eval.memory_footprint()['ref_data'] * 2 == wide_eval.memory_footprint()['ref_data']
+        assert con_eval.check_data(test_data) == wide_eval.check_data(test_data)
+        wide_ref = ref_data.astype(np.float32).astype(float)
+        for reference_eval in (con_eval, ContinuousEvaluator(ContinuousProfile().update(con_eval.ref_data),
+                                                             verbose=False)):
+            assert np.isclose(reference_eval.assertion_params['mean'], wide_ref.mean(), rtol=1e-12)
+            assert np.isclose(reference_eval.assertion_params['std'], wide_ref.std(), rtol=1e-9)
+        for backend in set(['numpy', get_backend().name]):
+            minimum, maximum, mean, std, _ = get_backend(backend).moments(test_data)
+            assert minimum == test_data.min() and maximum == test_data.max()
+            assert np.isclose(mean, test_data.astype(float).mean(), rtol=1e-12)
+            assert np.isclose(std, test_data.astype(float).std(), rtol=1e-9)
+        int_data = np.random.randint(-300, 300, 5000).astype(np.int16)
+        moments = get_backend('numpy').moments(int_data)
+        assert moments[:4] == (-300, 299, int_data.astype(float).mean(), int_data.astype(float).std())
+
+    def test_quantile(self, capsys):  # pylint: disable=R0201
+        """Assert that the quantile test bounds the tails without failing on a few outliers."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 5000)
+        test_data = np.random.normal(0, 1, 2000)
+        test_data[:3], test_data[3] = 50, np.nan
+        finite_data = test_data[np.isfinite(test_data)]
+        con_eval = ContinuousEvaluator(ref_data, assertions=['min', 'max', 'quantile'])
+        assert np.allclose(con_eval.assertion_params['quantile_bounds'], np.quantile(ref_data, [0.005, 0.995]))
+        assert con_eval.check_data(test_data) == [('min', True), ('max', False), ('quantile', True)]
+        expected = np.quantile(finite_data, [0.01, 0.99])
+        assert np.allclose(con_eval.last_quantiles, expected)
+        assert capsys.readouterr().out.endswith(
+            'Passed quantile check; quantiles observed=[-2.2066  2.2434] (Expected within [-2.5309, 2.5113])\n')
+        con_eval.verbose = False
+        assert con_eval.check_data(test_data + 1)[-1] == ('quantile', False)
+        assert np.isclose(con_eval.last_statistics['quantile'],
+                          expected[1] + 1 - con_eval.assertion_params['quantile_bounds'][1])
+        # the ks sort is reused, streams use their histogram and profiles their summary.
+        ks_eval = ContinuousEvaluator(ref_data, assertions=['ks_test', 'quantile'], verbose=False)
+        assert ks_eval.assertion_params['quantile_bounds'] == con_eval.assertion_params['quantile_bounds']
+        assert ks_eval.check_data(test_data) == [('ks', True), ('quantile', True)]
+        assert np.allclose(ks_eval.last_quantiles, expected)
+        assert ks_eval.check_stream(np.array_split(test_data, 4), summary_size=2000)[-1] == ('quantile', True)
+        assert np.allclose(ks_eval.last_quantiles, expected)
+        profile_eval = ContinuousEvaluator(ContinuousProfile().update(ref_data), assertions=['quantile'],
+                                           verbose=False)
+        # the summary bounds the rank error of the band.
+        ranks = np.searchsorted(np.sort(ref_data), profile_eval.assertion_params['quantile_bounds']) / 5000.
+        assert np.allclose(ranks, (0.005, 0.995), atol=0.005)
+        assert profile_eval.check_data(test_data) == [('quantile', True)]
+
+    def test_ecdf_tests(self):  # pylint: disable=R0201
+        """Assert that ad and cvm tests match scipy and share one sort of the test data."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 500)
+        test_data = np.round(np.random.normal(0.2, 1, 400), 1)
+        con_eval = ContinuousEvaluator(ref_data, assertions=['ks_test', 'ad_test', 'cvm_test'],
+                                       verbose=False)
+        ks_test = con_eval.assertion_params['ks_test']
+        assert ks_test.args[0] is con_eval.assertion_params['ad_test'].args[0]
+        assert ks_test.args[0] is con_eval.assertion_params['cvm_test'].args[0]
+        with mock.patch('predeval.continuous._sort', wraps=np.sort) as sort:
+            assert con_eval.check_data(test_data) == [('ks', True), ('ad', False), ('cvm', False)]
+        assert sort.call_count == 1
+        assert np.isclose(con_eval.last_statistics['ad'],
+                          stats.anderson_ksamp([ref_data, test_data]).statistic)
+        assert np.isclose(con_eval.last_statistics['cvm'],
+                          stats.cramervonmises_2samp(ref_data, test_data).statistic)
+
+    def test_pvalue(self, capsys):  # pylint: disable=R0201
+        """Assert that the ks-test statistic does not depend on the p-value mode."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 3000)
+        test_data = np.random.normal(0.1, 1, 2000)
+        outputs = []
+        for pvalue in ['auto', 'asymptotic', None]:
+            con_eval = ContinuousEvaluator(ref_data, assertions=['ks_test'], pvalue=pvalue)
+            outputs.append(con_eval.check_data(test_data))
+            assert np.isclose(con_eval.last_statistics['ks'], stats.ks_2samp(ref_data, test_data)[0])
+        assert outputs[0] == outputs[1] == outputs[2]
+        captured = capsys.readouterr()
+        assert captured.out.splitlines()[1].endswith(
+            'p={0:.4f}'.format(stats.ks_2samp(ref_data, test_data, method='asymp')[1]))
+        assert captured.out.splitlines()[2].endswith('p=nan')
+
+    def test_sampling(self, capsys):  # pylint: disable=R0201
+        """Assert that distribution tests run on a seeded sample and other tests on all data."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 1000)
+        test_data = np.random.normal(0, 1, 20000)
+        con_eval = ContinuousEvaluator(ref_data, assertions=['max', 'ks_test'])
+        con_eval.enable_sampling(2000, random_state=0)
+        con_eval.check_data(test_data)
+        captured = capsys.readouterr()
+        assert con_eval.last_statistics['max'] == np.max(test_data)
+        assert 'Sampled 2000 of 20000 values; ecdf error <= 0.0304 (95% confidence)' in captured.out
+        ks_stat = con_eval.last_statistics['ks']
+        assert abs(ks_stat - stats.ks_2samp(ref_data, test_data)[0]) <= 0.0304
+        con_eval.check_data(test_data)
+        assert con_eval.last_statistics['ks'] == ks_stat
+        con_eval.enable_sampling(2000, stratified=True, random_state=0)
+        con_eval.check_data(test_data)
+        assert abs(con_eval.last_statistics['ks'] - stats.ks_2samp(ref_data, test_data)[0]) <= 0.0304
+        con_eval.enable_sampling(None)
+        capsys.readouterr()
+        con_eval.check_data(test_data)
+        captured = capsys.readouterr()
+        assert 'Sampled' not in captured.out
+
+    def test_threads(self):  # pylint: disable=R0201
+        """Assert that threaded tests and block moments match the serial results."""
+        seed(1234)
+        ref_data = np.random.normal(0, 1, 1000)
+        test_data = np.random.normal(0.1, 1, 5000)
+        con_eval = ContinuousEvaluator(ref_data, assertions=['min', 'max', 'mean', 'std', 'ks_test',
+                                                             'ad_test'], verbose=False)
+        expected = con_eval.check_data(test_data)
+        statistics = dict(con_eval.last_statistics)
+        con_eval.enable_threads(4)
+        assert con_eval.n_jobs == 4
+        with mock.patch('predeval.continuous._MIN_BLOCK_SIZE', 1000):
+            assert con_eval.check_data(test_data) == expected
+        for key, value in statistics.items():
+            assert np.isclose(con_eval.last_statistics[key], value, rtol=1e-12)
+        assert con_eval.check_data(test_data, fail_fast=True)[1] == ('max', None)
+
+    def test_register_assertion(self, capsys):  # pylint: disable=R0201
+        """Assert that custom assertions share statistics with the built-in tests."""
+        seed(1234)
+        con_eval = ContinuousEvaluator(np.random.normal(0, 1, 1000), verbose=False)
+        con_eval.register_assertion('range', lambda test, ref: test[1] - test[0] <= 2 * (ref[1] - ref[0]),
+                                    statistic='moments', cost=0)
+        con_eval.register_assertion('median', lambda test, ref: (True, np.median(test) - np.median(ref)),
+                                    statistic='sorted')
+        moments = mock.Mock(wraps=con_eval._backend_.moments)  # pylint: disable=W0212
+        con_eval._backend_ = con_eval._backend_._replace(moments=moments)  # pylint: disable=W0212
+        test_data = np.random.normal(0, 1, 500)
+        output = con_eval.check_data(test_data)
+        assert [name for name, _ in output] == ['min', 'max', 'mean', 'std', 'ks', 'range', 'median']
+        assert output[-2:] == [('range', True), ('median', True)]
+        assert moments.call_count == 1
+        assert np.isclose(con_eval.last_statistics['median'], np.median(test_data) - np.median(con_eval.ref_data))
+        assert con_eval.check_data(test_data * 10, fail_fast=True)[0] == ('range', False)
+        con_eval.verbose = True
+        con_eval.check_data(test_data)
+        assert 'Passed range check\nPassed median check; statistic=' in capsys.readouterr().out
+        assertions = ['mean', 'row_sum']
+        prob_eval = ProbabilityEvaluator(np.random.dirichlet([1, 1], size=100), assertions=assertions, verbose=False)
+        prob_eval.register_assertion('distinct', lambda test, ref: len(test.values) > 10)
+        assert assertions == ['mean', 'row_sum'] and prob_eval.assertions[-1] == 'distinct'
+        assert prob_eval.check_data(np.random.dirichlet([1, 1], size=50))[-1] == ('distinct', True)
+
+    def test_check_stream(self):  # pylint: disable=R0201
+        """Assert that a stream of chunks gives the same results as one batch."""
+        seed(1234)
+        con_eval = ContinuousEvaluator(np.random.normal(0, 1, 1000), verbose=False)
+        test_data = np.random.normal(0.2, 1, 800)
+        expected = con_eval.check_data(test_data)
+        statistics = dict(con_eval.last_statistics)
+        assert con_eval.check_stream(np.array_split(test_data, 7)) == expected
+        for key, value in statistics.items():
+            assert np.isclose(con_eval.last_statistics[key], value)
+        long_stream = [np.random.normal(0, 1, 1000) for _ in range(10)]
+        assert con_eval.check_stream(long_stream, summary_size=2000) == \
+            con_eval.check_data(np.concatenate(long_stream))
+        assert np.isclose(con_eval.last_statistics['std'], np.std(np.concatenate(long_stream)))
+
+    def test_fail_fast(self, capsys):  # pylint: disable=R0201
+        """Assert that fail_fast orders tests by cost and skips after a failure."""
+        con_eval = ContinuousEvaluator([x for x in range(31)],
+                                       assertions=['ks_test', 'std', 'max', 'min'])
+        output = con_eval.check_data(np.array([x for x in range(51)]), fail_fast=True)
+        captured = capsys.readouterr()
+        assert output == [('max', False), ('min', None), ('std', None), ('ks', None)]
+        assert captured.out == ("Failed max check; max observed=50.0000\n"
+                                "Skipped min, std, ks checks after failure\n")
+        output = con_eval.check_data(np.array([x for x in range(31)]), fail_fast=True)
+        assert [name for name, _ in output] == ['max', 'min', 'std', 'ks']
+        assert all(passed for _, passed in output)
+
 
 class TestCategorical(object):
     """Class containing categorical evaluator tests."""
@@ -237,6 +521,151 @@ class TestCategorical(object):
                       "Passed chi2 check; test statistic=0.0000, p=1.0000\n")
         assert captured.out == expect_out
 
+    def test_custom_stream(self):  # pylint: disable=R0201
+        """Assert that custom assertions on histograms run in batch and stream checks."""
+        cat_eval = CategoricalEvaluator(np.array(list('aabbc') * 50), verbose=False)
+        cat_eval.register_assertion('share_a', lambda test, ref: (
+            test.counts[test.values == 'a'].sum() >= ref.counts[ref.values == 'a'].sum() / ref.count * test.count / 2,
+            test.counts[test.values == 'a'].sum() / float(test.count)))
+        test_data = np.array(list('abbcc') * 20)
+        expected = [('exist', True), ('chi2', False), ('share_a', True)]
+        assert cat_eval.check_data(test_data) == expected
+        assert cat_eval.check_stream(np.array_split(test_data, 3)) == expected
+        assert cat_eval.last_statistics['share_a'] == 0.2
+
+    def test_pvalue(self):  # pylint: disable=R0201
+        """Assert that the direct chi2 statistic matches scipy."""
+        ref_data = np.array([1] * 50 + [2] * 30 + [3] * 20)
+        for test_data in [np.array([1] * 20 + [2] * 25 + [3] * 5), np.array([1] * 20 + [2] * 25)]:
+            ref = ref_data[np.isin(ref_data, test_data)]
+            statistics = []
+            for pvalue in ['auto', 'asymptotic', None]:
+                cat_eval = CategoricalEvaluator(ref, assertions=['chi2_test'], verbose=False,
+                                                pvalue=pvalue)
+                cat_eval.check_data(test_data)
+                statistics.append(cat_eval.last_statistics['chi2'])
+            assert np.allclose(statistics, statistics[0])
+
+    def test_sampling(self, capsys):  # pylint: disable=R0201
+        """Assert that the chi2 test counts every value of sampled test data (rare categories stay)."""
+        seed(1234)
+        ref_data = np.array([1] * 100000 + [2] * 100000 + [3] * 30)
+        test_data = np.random.permutation(ref_data)
+        cat_eval = CategoricalEvaluator(ref_data, assertions=['chi2_test'])
+        expected = cat_eval.check_data(test_data)
+        chi2 = cat_eval.last_statistics['chi2']
+        assert expected == [('chi2', True)]
+        cat_eval.enable_sampling(2000, random_state=0)
+        capsys.readouterr()
+        assert cat_eval.check_data(test_data) == expected
+        assert cat_eval.last_statistics['chi2'] == chi2
+        captured = capsys.readouterr()
+        assert 'NOT ALL CATEGORIES PRESENT' not in captured.out and 'Sampled' not in captured.out
+
+    def test_top_k(self, capsys):  # pylint: disable=R0201
+        """Assert that the high-cardinality mode buckets rare categories."""
+        seed(1234)
+        ref_data = np.append(choice([0, 1, 2], size=(300,)), np.arange(10, 1010))
+        cat_eval = CategoricalEvaluator(ref_data, assertions='chi2_test', top_k=2)
+        assert list(cat_eval._chi2_encoder_.categories) == [1, 0]  # noqa pylint: disable=W0212
+        assert list(cat_eval.assertion_params['chi2_test'].args[0]) == [109, 101, 1090]
+        seed(1234)
+        test_data = np.append(choice([0, 1, 2], size=(300,)), np.arange(5000, 6000))
+        cat_eval.check_data(test_data)
+        captured = capsys.readouterr()
+        assert captured.out == "Passed chi2 check; test statistic=0.0000, p=1.0000\n"
+        test_data[:300] = 7
+        cat_eval.check_data(test_data)
+        captured = capsys.readouterr()
+        assert captured.out.startswith("Failed chi2 check")
+        # exist only expects the tracked categories and chi2_test params rebuild the encoder.
+        cat_eval = CategoricalEvaluator(ref_data, top_k=2, verbose=False)
+        assert list(cat_eval.assertion_params['cat_exists']) == [0, 1]
+        assert cat_eval.check_exist(np.array([0, 1, 5000])) == ('exist', True)
+        assert cat_eval.check_exist(np.array([0, 2, 5000])) == ('exist', False)
+        cat_eval.update_param('chi2_test', partial(_chi2_test, np.array([100, 100, 0]), categories=np.array([2, 3])))
+        assert list(cat_eval._chi2_encoder_.categories) == [2, 3]  # noqa pylint: disable=W0212
+        assert cat_eval.check_chi2(np.array([2, 3] * 50)) == ('chi2', True)
+
+    def test_string_labels(self, capsys):  # pylint: disable=R0201
+        """Assert that string and object labels are factorized."""
+        seed(1234)
+        ref_data = choice(['bird', 'cat', 'dog'], size=(100,))
+        cat_eval = CategoricalEvaluator(ref_data.astype(object))
+        assert cat_eval.assertion_params['cat_exists'].dtype.kind == 'U'
+        cat_eval.check_data(ref_data.astype(object))
+        captured = capsys.readouterr()
+        assert captured.out == ("Passed exist check; observed=['bird' 'cat' 'dog'] "
+                                "(Expected ['bird', 'cat', 'dog'])\n"
+                                "Passed chi2 check; test statistic=0.0000, p=1.0000\n")
+        test_data = ref_data.astype('<U10')
+        test_data[:5] = 'elephant'
+        cat_eval.check_exist(test_data)
+        captured = capsys.readouterr()
+        assert captured.out == ("Failed exist check; observed=['bird' 'cat' 'dog' 'elephant'] "
+                                "(Expected ['bird', 'cat', 'dog'])\n")
+        cat_eval.update_param('cat_exists', ['bird', 'cat', 'dog', 'elephant'])
+        assert cat_eval.check_exist(test_data) == ('exist', True)
+
+    def test_encoder(self):  # pylint: disable=R0201
+        """Assert that the hash encoder maps values to category codes."""
+        encoder = CategoryEncoder(np.array([7, -3, 10 ** 12, 0]))
+        codes = encoder.encode(np.array([0, 7, 5, 10 ** 12, -3, 7]))
+        assert list(codes) == [3, 0, -1, 2, 1, 0]
+        assert list(encoder.encode([7.0, 7.5, np.nan])) == [0, -1, -1]
+        counts, unknown = encoder.count([7, 7, 0, 1])
+        assert list(counts) == [2, 0, 0, 1] and unknown == 1
+        float_encoder = CategoryEncoder(np.array([0.5, -0.0]))
+        assert list(float_encoder.encode([0.0, 0.5, 1])) == [1, 0, -1]
+        seed(1234)
+        narrow_data = np.random.randint(-5, 300, 10000).astype(np.int16)
+        counts, unknown = encoder.count(narrow_data)
+        codes = encoder.encode(narrow_data.astype(np.int64))
+        assert list(counts) == list(np.bincount(codes[codes >= 0], minlength=4)) and unknown == (codes < 0).sum()
+        cat_eval = CategoricalEvaluator([1, 2, 3] * 50, verbose=False, dtype=np.int16)
+        assert cat_eval.ref_data.dtype == np.int16
+        assert cat_eval.check_data([1, 2, 3, 3, 2, 1] * 10) == [('exist', True), ('chi2', True)]
+        assert cat_eval.check_exist(np.array([1, 2, 4] * 10, dtype=np.uint8)) == ('exist', False)
+
+
+class TestProbability(object):
+    """Class containing tests of the probability evaluator."""
+
+    def test_probability(self, capsys):  # pylint: disable=R0201
+        """Assert that class probabilities are checked like one continuous evaluator per class."""
+        seed(1234)
+        ref_data = np.random.dirichlet([2, 3, 5], size=2000)
+        test_data = np.random.dirichlet([2, 3, 5], size=700)
+        prob_eval = ProbabilityEvaluator(ref_data, verbose=False)
+        assert prob_eval.check_data(test_data) == \
+            [('row_sum', True), ('mean', True), ('std', True), ('ks', True), ('chi2', True)]
+        for i in range(3):
+            con_eval = ContinuousEvaluator(ref_data[:, i], verbose=False)
+            con_eval.check_data(test_data[:, i])
+            assert np.isclose(prob_eval.last_class_statistics['ks'][i], con_eval.last_statistics['ks'])
+            assert np.isclose(prob_eval.last_class_statistics['std'][i], con_eval.last_statistics['std'])
+        assert list(prob_eval.last_class_statistics['counts']) == list(np.bincount(test_data.argmax(axis=1)))
+        assert prob_eval.last_statistics['ks'] == np.max(prob_eval.last_class_statistics['ks'])
+
+        shifted = np.random.dirichlet([5, 3, 2], size=700)
+        assert prob_eval.check_data(shifted) == \
+            [('row_sum', True), ('mean', False), ('std', True), ('ks', False), ('chi2', False)]
+        prob_eval.verbose = True
+        assert prob_eval.check_data(test_data * 1.1, fail_fast=True)[:2] == [('row_sum', False), ('mean', None)]
+        assert capsys.readouterr().out.startswith('Failed row_sum check; largest row sum error=0.1,')
+
+    def test_blocks(self):  # pylint: disable=R0201
+        """Assert that statistics combined over blocks match whole-matrix statistics."""
+        seed(1234)
+        test_data = np.random.dirichlet([1, 1, 1, 1], size=5000)
+        prob_eval = ProbabilityEvaluator(test_data[:100], assertions=['mean', 'row_sum'], verbose=False)
+        with mock.patch('predeval.probability._BLOCK_BYTES', 320):
+            moments = prob_eval._moments(test_data)  # pylint: disable=W0212
+        assert np.allclose(moments['mean'], test_data.mean(axis=0))
+        assert np.allclose(moments['std'], test_data.std(axis=0))
+        assert np.array_equal(moments['min'], test_data.min(axis=0))
+        assert moments['row_error'] < 1e-12
+
 
 class TestUtilities(object):
     """Class containing test of utility functions."""
@@ -267,6 +696,14 @@ class TestUtilities(object):
                       "Failed chi2 test.\n")
         assert captured.out == expect_out
 
+    def test_eval_tests_skipped(self, capsys):  # pylint: disable=R0201
+        """assert that evaluate tests reports skipped tests."""
+        evaluate_tests([('exist', False), ('chi2_test', None)])
+        captured = capsys.readouterr()
+        expect_out = ("Failed exist test.\n"
+                      "Skipped chi2_test test.\n")
+        assert captured.out == expect_out
+
     def test_eval_tests_noprint(self, capsys):
         """assert that evaluate tests is correct."""
         seed(1234)
@@ -276,3 +713,563 @@ class TestUtilities(object):
         captured = capsys.readouterr()
         expect_out = ''
         assert captured.out == expect_out
+
+
+class TestProfiles(object):
+    """Class containing tests of mergeable reference profiles."""
+
+    seed(1234)
+    ref_data = np.random.normal(size=(5000,))
+    profile = merge_profiles([ContinuousProfile.from_data(x) for x in np.array_split(ref_data, 7)])
+
+    def test_moments(self):
+        """Assert that merged profile matches the full reference data."""
+        assert self.profile.count == 5000
+        assert self.profile.minimum == np.min(self.ref_data)
+        assert self.profile.maximum == np.max(self.ref_data)
+        assert np.isclose(self.profile.mean, np.mean(self.ref_data))
+        assert np.isclose(self.profile.std, np.std(self.ref_data))
+
+    def test_associative(self):
+        """Assert that merge order does not change the profile."""
+        shards = [ContinuousProfile.from_data(x) for x in np.array_split(self.ref_data, 3)]
+        left = (shards[0] + shards[1]) + shards[2]
+        right = shards[0] + (shards[1] + shards[2])
+        assert left.count == right.count
+        assert np.isclose(left.mean, right.mean)
+        assert np.isclose(left.m2, right.m2)
+        assert np.isclose(np.sum(left.summary_weights), np.sum(right.summary_weights))
+        swapped = shards[1] + shards[0]
+        assert np.array_equal((shards[0] + shards[1]).summary_values, swapped.summary_values)
+
+    def test_summary_merges(self):  # pylint: disable=R0201
+        """Assert that the summary error stays bounded over many merges, in any order."""
+        seed(1234)
+        ref_data = np.random.normal(size=(150000,))
+        sorted_data = np.sort(ref_data)
+
+        def cdf(profile, values):
+            cumulative = np.append(0, np.cumsum(profile.summary_weights)) / profile.count
+            return cumulative[np.searchsorted(profile.summary_values, values, side='right')]
+
+        def cdf_error(profile):
+            return np.max(np.abs(cdf(profile, profile.summary_values) -
+                                 np.searchsorted(sorted_data, profile.summary_values, side='right') /
+                                 float(len(ref_data))))
+
+        for shards in (np.array_split(sorted_data, 150), np.array_split(ref_data, 150)):
+            profiles = [ContinuousProfile.from_data(x) for x in shards]
+            left, right = merge_profiles(profiles), merge_profiles(profiles[::-1])
+            assert len(left.summary_values) <= 1000 and np.isclose(left.summary_weights.sum(), 150000)
+            assert cdf_error(left) < 0.01 and cdf_error(right) < 0.01
+            values = np.union1d(left.summary_values, right.summary_values)
+            assert np.max(np.abs(cdf(left, values) - cdf(right, values))) < 0.01
+
+    def test_scale(self):
+        """Assert that scaling a profile decays its weights but not its moments."""
+        scaled = self.profile.scale(0.5)
+        assert np.isclose(scaled.count, 2500)
+        assert np.isclose(scaled.mean, self.profile.mean)
+        assert np.isclose(scaled.std, self.profile.std)
+        assert np.isclose(np.sum(scaled.summary_weights), 2500)
+        assert self.profile.count == 5000
+        assert scaled.scale(0).count == 0
+        cat_profile = CategoricalProfile.from_data([1, 1, 2]).scale(0.5)
+        assert list(cat_profile.counts) == [1.0, 0.5]
+
+    def test_refresh_reference(self):  # pylint: disable=R0201
+        """Assert that refreshing the reference tracks the new data."""
+        seed(1234)
+        con_eval = ContinuousEvaluator(np.random.normal(0, 1, 1000), verbose=False)
+        con_eval.enable_cache()
+        new_data = np.random.normal(5, 1, 1000)
+        assert not all(passed for _, passed in con_eval.check_data(new_data))
+        for _ in range(10):
+            con_eval.refresh_reference(np.random.normal(5, 1, 1000), decay=0.5)
+        assert np.isclose(con_eval.ref_data.count, 1000 * 0.5 ** 10 + 1000 * (2 - 0.5 ** 9))
+        assert np.isclose(con_eval.assertion_params['mean'], 5, atol=0.1)
+        assert all(passed for _, passed in con_eval.check_data(new_data))
+        con_eval.refresh_reference(np.random.normal(10, 1, 500), window=500)
+        assert con_eval.ref_data.count == 500
+        assert con_eval.assertion_params['minimum'] > 5
+        cat_eval = CategoricalEvaluator([1] * 10 + [2] * 10, verbose=False)
+        cat_eval.refresh_reference([2] * 10 + [3] * 10, decay=0.5)
+        assert list(cat_eval.assertion_params['cat_exists']) == [1, 2, 3]
+        assert list(cat_eval.ref_data.counts) == [5, 15, 10]
+
+    def test_summary_size(self):
+        """Assert that the quantile summary is compressed."""
+        assert not self.profile.exact
+        assert len(self.profile.summary_values) <= 1000
+        assert np.isclose(np.sum(self.profile.summary_weights), 5000)
+
+    def test_evaluator(self):
+        """Assert that an evaluator built from a profile matches one built from the data."""
+        con_eval = ContinuousEvaluator(self.profile, verbose=False)
+        ref_eval = ContinuousEvaluator(self.ref_data, verbose=False)
+        assert con_eval.assertion_params['minimum'] == ref_eval.assertion_params['minimum']
+        assert np.isclose(con_eval.assertion_params['std'], ref_eval.assertion_params['std'])
+        seed(1234)
+        new_out = np.random.normal(size=(500,))
+        stat, _ = con_eval.assertion_params['ks_test'](new_out)
+        ref_stat, _ = ref_eval.assertion_params['ks_test'](new_out)
+        assert abs(stat - ref_stat) <= 0.005
+        assert con_eval.check_data(new_out) == ref_eval.check_data(new_out)
+
+    def test_exact_ks(self):
+        """Assert that a small profile keeps the exact ks-test."""
+        profile = merge_profiles([ContinuousProfile.from_data(x)
+                                  for x in np.array_split(np.arange(31), 3)])
+        assert profile.exact
+        con_eval = ContinuousEvaluator(profile, verbose=False)
+        assert con_eval.check_ks(np.arange(20, 51)) == ('ks', False)
+        assert con_eval.assertion_params['ks_test'](np.arange(31))[0] == 0
+
+    def test_categorical(self):
+        """Assert that categorical profiles merge counts."""
+        seed(1234)
+        ref_data = choice([0, 1, 2], size=(100,))
+        profile = merge_profiles([CategoricalProfile.from_data(x)
+                                  for x in np.array_split(ref_data, 4)])
+        assert list(profile.categories) == [0, 1, 2]
+        assert list(profile.counts) == list(np.unique(ref_data, return_counts=True)[1])
+        cat_eval = CategoricalEvaluator(profile, verbose=False)
+        assert cat_eval.check_data(ref_data) == [('exist', True), ('chi2', True)]
+
+
+class TestBank(object):
+    """Class containing tests of the evaluator bank."""
+
+    def test_bank(self):  # pylint: disable=R0201
+        """Assert that the bank matches the check_data of each evaluator."""
+        seed(1234)
+        evaluators, tests = [], []
+        for i in range(12):
+            ref_data = np.round(np.random.normal(i % 3, 1, 300), 1)
+            if i % 4 == 0:
+                ref_data = ContinuousProfile(summary_size=100).update(ref_data)
+            assertions = ['min', 'max', 'mean', 'ks_test'] if i % 2 else None
+            evaluators.append(ContinuousEvaluator(ref_data, assertions=assertions, verbose=False))
+            tests.append(np.round(np.random.normal(i % 3 + (i % 5 == 0), 1, 30 + 20 * i), 1))
+        bank = EvaluatorBank.from_evaluators(evaluators)
+        offsets = np.cumsum([0] + [len(test_data) for test_data in tests[:-1]])
+        results = bank.check_data(np.concatenate(tests), offsets)
+        assert len(bank) == 12 and results['std'][1] == -1
+        for i, (evaluator, test_data) in enumerate(zip(evaluators, tests)):
+            for name, passed in evaluator.check_data(test_data):
+                assert results[name][i] == passed
+                assert np.isclose(bank.last_statistics[name][i], evaluator.last_statistics[name])
+
+    def test_short_segments(self):  # pylint: disable=R0201
+        """Assert that profiles build a bank and short segments skip the ks-test."""
+        profiles = [ContinuousProfile.from_data(np.arange(50)), ContinuousProfile.from_data(np.arange(100))]
+        bank = EvaluatorBank.from_profiles(profiles, names=['a', 'b'])
+        results = bank.check_data(np.concatenate([np.arange(10), np.arange(100)]), [0, 10])
+        assert list(results['ks']) == [-1, 1]
+        assert list(results['min']) == [1, 1] and list(results['std']) == [0, 1]
+        assert bank.last_statistics['max'][0] == 9
+
+
+class TestSequential(object):
+    """Class containing tests of the sequential detectors."""
+
+    @staticmethod
+    def _one_at_a_time(detector, values):
+        """Statistic after each value, updating one value at a time."""
+        statistics = []
+        for value in values:
+            detector.update(value)
+            statistics.append(detector.statistic)
+        return np.array(statistics)
+
+    def test_cusum(self):
+        """Assert that CUSUM alarms soon after a shift and micro-batches match single updates."""
+        seed(1234)
+        evaluator = ContinuousEvaluator(np.random.normal(size=(2000,)), verbose=False)
+        stream = np.concatenate([np.random.normal(size=(200,)), np.random.normal(1, 1, size=(300,))])
+        detector = CusumDetector.from_evaluator(evaluator)
+        assert detector.update(stream[:200]) is None
+        first = detector.update(stream[200:])
+        assert 200 <= first < 230 and detector.alarm_index == first and detector.n_seen == 500
+        single = CusumDetector.from_evaluator(evaluator)
+        assert np.allclose(self._one_at_a_time(single, stream)[-1], detector.statistic)
+        assert single.alarm_index == first
+        batched = CusumDetector.from_evaluator(evaluator)
+        for batch in np.array_split(stream, 7):
+            batched.update(batch)
+        assert batched.alarm_index == first and np.isclose(batched.upper, detector.upper)
+
+    def test_page_hinkley(self):
+        """Assert that Page-Hinkley alarms after a change and micro-batches match single updates."""
+        seed(1234)
+        stream = np.concatenate([np.random.normal(size=(500,)), np.random.normal(-1, 1, size=(300,))])
+        detector = PageHinkleyDetector(0, 1)
+        batched = [detector.update(batch) for batch in np.array_split(stream, 9)]
+        single = PageHinkleyDetector(0, 1)
+        self._one_at_a_time(single, stream)
+        assert 500 <= detector.alarm_index < 540 and single.alarm_index == detector.alarm_index
+        assert np.isclose(single.statistic, detector.statistic)
+        assert detector.alarm_index in batched
+        detector.reset()
+        assert detector.update(stream[:500]) is None and not detector.alarm
+
+
+class TestManager(object):
+    """Class containing tests of memory accounting and the evaluator manager."""
+
+    def test_memory_footprint(self):  # pylint: disable=R0201
+        """Assert that the footprint covers the reference, partial arrays and categories once each."""
+        ref_data = np.random.normal(size=(1000,))
+        con_eval = ContinuousEvaluator(ref_data, assertions=['ks_test', 'ad_test'], verbose=False)
+        assert con_eval.memory_footprint() == {'ref_data': 8000, 'sorted_reference': 8000, 'total': 16000,
+                                               'mapped': 0}
+        cat_eval = CategoricalEvaluator(np.array(list('abcab') * 20), verbose=False)
+        footprint = cat_eval.memory_footprint()
+        assert footprint['ref_data'] == 400 and footprint['chi2_encoder'] > 0
+        assert footprint['total'] == sum(value for key, value in footprint.items() if key not in ('total', 'mapped'))
+
+    def test_manager(self, tmpdir):  # pylint: disable=R0201
+        """Assert that the manager keeps within its budget and reloads spilled evaluators mapped."""
+        seed(1234)
+        evaluators = [ContinuousEvaluator(np.random.normal(size=(5000,)), verbose=False) for _ in range(3)]
+        test_data = np.random.normal(size=(500,))
+        expected = [evaluator.check_data(test_data) for evaluator in evaluators]
+        with EvaluatorManager(100000, spill_dir=str(tmpdir)) as manager:
+            for i, evaluator in enumerate(evaluators):
+                manager.add(str(i), evaluator)
+            assert manager.usage <= 100000 and manager.spilled == ['0', '1'] and len(manager) == 3
+            reloaded = manager['0']
+            assert reloaded.memory_footprint()['mapped'] == 80000
+            assert reloaded.ref_data is not evaluators[0].ref_data
+            assert [manager[str(i)].check_data(test_data) for i in range(3)] == expected
+            # reloaded evaluators read their mapped arrays, so the last one stays resident.
+            assert manager.spilled == [] and manager.usage == 80000
+            manager.remove('1')
+            assert '1' not in manager and len(manager) == 2
+        assert len(tmpdir.listdir()) == 4
+
+
+class TestBenchmark(object):
+    """Class containing tests of the accuracy and speed harness."""
+
+    def test_benchmark(self, tmpdir):  # pylint: disable=R0201
+        """Assert that exact modes match scipy and that regressions past the limits are reported."""
+        rows = benchmark.run_benchmark(sizes=(2000,), repeat=1)
+        assert len(rows) == (4 * len(benchmark.CONTINUOUS_MODES) + 2 * len(benchmark.CATEGORICAL_MODES))
+        summary = benchmark.summarize(rows)
+        for kind in ('continuous', 'categorical'):
+            assert summary[(kind, 'exact')]['agreement'] == 1.0
+            assert summary[(kind, 'exact')]['error'] < 1e-9
+        assert all(row['time'] > 0 and row['peak_bytes'] > 0 for row in rows)
+        limits = {'continuous': {'exact': {'agreement': 1.0, 'error': 1e-9, 'speedup': None},
+                                 'binned': {'agreement': 1.0, 'error': 0.0}}}
+        failures = benchmark.check_limits(rows, limits)
+        assert len(failures) == 1 and failures[0].startswith('continuous binned: error')
+        output = str(tmpdir.join('rows.jsonl'))
+        benchmark.main(['--kind', 'continuous', '--size', '1000', '--repeat', '1', '--output', output])
+        with open(output) as rows_file:
+            assert len(rows_file.readlines()) == 4 * len(benchmark.CONTINUOUS_MODES)
+
+
+class TestStore(object):
+    """Class containing tests of the shared reference store."""
+
+    def test_intern(self):  # pylint: disable=R0201
+        """Assert that evaluators on one reference share read-only arrays and give the same results."""
+        seed(1234)
+        ref_data = np.random.normal(size=(2000,))
+        test_data = np.random.normal(size=(500,))
+        evaluators = [ContinuousEvaluator(ref_data, verbose=False),
+                      ContinuousEvaluator(ref_data, assertions=['ks_test', 'cvm_test'], verbose=False),
+                      CategoricalEvaluator(np.array(list('abcab') * 20), verbose=False)]
+        expected = [evaluator.check_data(test_data) for evaluator in evaluators[:2]]
+        store = ReferenceStore()
+        interned = [store.intern(evaluator) for evaluator in evaluators]
+        assert [evaluator.check_data(test_data) for evaluator in interned[:2]] == expected
+        assert interned[2].check_data(np.array(list('abcab') * 10)) == [('exist', True), ('chi2', True)]
+        assert interned[0].ref_data is interned[1].ref_data
+        assert interned[0].assertion_params['ks_test'].args[0] is interned[1].assertion_params['cvm_test'].args[0]
+        assert not interned[0].ref_data.flags.writeable
+        assert store.nbytes < 3 * ref_data.nbytes
+
+    def test_shared_memory(self):  # pylint: disable=R0201
+        """Assert that an attached store loads evaluators whose arrays live in shared memory."""
+        seed(1234)
+        evaluator = ContinuousEvaluator(np.random.normal(size=(2000,)), verbose=False)
+        store = ReferenceStore()
+        payload = store.dumps(evaluator)
+        manifest = store.share()
+        attached = ReferenceStore.attach(manifest)
+        loaded = attached.loads(payload)
+        assert len(attached) == len(store)
+        assert np.array_equal(loaded.ref_data, evaluator.ref_data)
+        test_data = np.random.normal(size=(500,))
+        assert loaded.check_data(test_data) == evaluator.check_data(test_data)
+        assert loaded.memory_footprint()['mapped'] == evaluator.memory_footprint()['total']
+        assert loaded.memory_footprint()['total'] == 0
+        block = mmap.mmap(-1, evaluator.ref_data.nbytes)
+        loaded.ref_data = np.frombuffer(memoryview(block), dtype=evaluator.ref_data.dtype)
+        assert 'ref_data' not in loaded.memory_footprint()
+        store.unlink()
+
+
+class TestHistogram(object):
+    """Class containing tests of pre-aggregated inputs."""
+
+    def test_histogram(self):  # pylint: disable=R0201
+        """Assert that histograms merge duplicates and expand to the counted data."""
+        hist = Histogram([3, 1, 3, 2], [1, 2, 4, 0])
+        assert list(hist.values) == [1, 3]
+        assert list(hist.counts) == [2, 5]
+        assert len(hist) == 7
+        assert list(hist.expand()) == [1, 1, 3, 3, 3, 3, 3]
+        expanded = hist.expand()
+        assert np.allclose(hist.moments(), (1, 3, np.mean(expanded), np.std(expanded)))
+
+    def test_continuous(self):  # pylint: disable=R0201
+        """Assert that continuous histograms give the same results as the expanded data."""
+        seed(1234)
+        ref_data = np.round(np.random.normal(0, 1, 2000), 1)
+        test_data = np.round(np.random.normal(0.5, 1, 1000), 1)
+        con_eval = ContinuousEvaluator(ref_data, verbose=False)
+        hist_eval = ContinuousEvaluator(Histogram.from_data(ref_data), verbose=False)
+        expected = con_eval.check_data(test_data)
+        statistics = dict(con_eval.last_statistics)
+        for evaluator in [con_eval, hist_eval]:
+            assert evaluator.check_data(Histogram.from_data(test_data)) == expected
+            for key, value in statistics.items():
+                assert np.isclose(evaluator.last_statistics[key], value)
+
+    def test_ks_pvalue(self):  # pylint: disable=R0201
+        """Assert that histograms get the same asymptotic ks p-value as arrays."""
+        seed(1234)
+        ref_data = np.round(np.random.normal(0, 1, 20000), 2)
+        test_data = np.sort(np.round(np.random.normal(0.02, 1, 20000), 2))
+        expected = ContinuousEvaluator(ref_data, pvalue='asymptotic', verbose=False) \
+            .assertion_params['ks_test'](test_data)[:2]
+        for ref in [ref_data, Histogram.from_data(ref_data)]:
+            ks_test = ContinuousEvaluator(ref, pvalue='asymptotic', verbose=False).assertion_params['ks_test']
+            assert np.allclose(ks_test(Histogram.from_data(test_data))[:2], expected, rtol=1e-12)
+
+    def test_nonfinite(self):  # pylint: disable=R0201
+        """Assert that histograms count nan and inf apart and check like the raw data."""
+        seed(1234)
+        ref_data = np.round(np.random.normal(0, 1, 2000), 1)
+        ref_data[:20] = np.nan
+        test_data = np.round(np.random.normal(0, 1, 1000), 1)
+        test_data[:5] = np.nan
+        test_data[5:8] = np.inf
+        test_data[8] = -np.inf
+        hist = Histogram.from_data(test_data)
+        assert hist.nonfinite == 9
+        assert len(hist) == 991
+        assert np.all(np.isfinite(hist.values))
+        assertions = ['min', 'max', 'mean', 'std', 'ks_test', 'finite']
+        con_eval = ContinuousEvaluator(ref_data, assertions=assertions, verbose=False)
+        hist_eval = ContinuousEvaluator(Histogram.from_data(ref_data), assertions=assertions, verbose=False)
+        assert hist_eval.assertion_params['nonfinite_rate'] == con_eval.assertion_params['nonfinite_rate']
+        expected = con_eval.check_data(test_data)
+        statistics = dict(con_eval.last_statistics)
+        assert statistics['finite'] == 0.009
+        for evaluator in [con_eval, hist_eval]:
+            assert evaluator.check_data(hist) == expected
+            for key, value in statistics.items():
+                assert np.isclose(evaluator.last_statistics[key], value)
+
+    def test_categorical(self):  # pylint: disable=R0201
+        """Assert that categorical histograms give the same results as the expanded data."""
+        ref_data = np.array(['a'] * 50 + ['b'] * 30 + ['c'] * 20)
+        test_data = np.array(['a'] * 20 + ['b'] * 20 + ['c'] * 10)
+        cat_eval = CategoricalEvaluator(ref_data, verbose=False)
+        hist_eval = CategoricalEvaluator(Histogram(['a', 'b', 'c'], [50, 30, 20]), verbose=False)
+        expected = cat_eval.check_data(test_data)
+        chi2 = cat_eval.last_statistics['chi2']
+        for evaluator in [cat_eval, hist_eval]:
+            assert evaluator.check_data(Histogram(['a', 'b', 'c', 'd'], [20, 20, 10, 0])) == expected
+            assert np.isclose(evaluator.last_statistics['chi2'], chi2)
+        assert hist_eval.check_data(Histogram(['a', 'd'], [20, 20])) == \
+            [('exist', False), ('chi2', False)]
+
+
+class TestCli(object):
+    """Class containing tests of the command line interface."""
+
+    def test_bulk_evaluation(self, tmpdir):  # pylint: disable=R0201
+        """Assert that the cli writes a json line per file and sets the exit code."""
+        seed(1234)
+        np.save(str(tmpdir.join('ref.npy')), np.random.normal(size=(2000,)))
+        np.save(str(tmpdir.join('good.npy')), np.random.normal(size=(500,)))
+        np.savez(str(tmpdir.join('bad.npz')), scores=np.random.normal(size=(500,)) + 3)
+        with open(str(tmpdir.join('good.csv')), 'w') as csv_file:
+            csv_file.write('id,score\n')
+            for i, value in enumerate(np.random.normal(size=(500,))):
+                csv_file.write('{0},{1}\n'.format(i, value))
+        output = str(tmpdir.join('results.jsonl'))
+        args = ['--reference', str(tmpdir.join('ref.npy')), '--column', 'score',
+                '--assertion', 'mean', '--assertion', 'ks_test', '--output', output,
+                '--save', str(tmpdir.join('evaluator.pkl'))]
+        assert main(args + [str(tmpdir.join('good.npy')), str(tmpdir.join('good.csv'))]) == 0
+        with open(output) as result_file:
+            results = [json.loads(line) for line in result_file]
+        assert [result['passed'] for result in results] == [True, True]
+        assert sorted(results[0]['results']) == ['ks', 'mean']
+
+        args = ['--load', str(tmpdir.join('evaluator.pkl')), '--column', 'scores',
+                '--output', output, '--jobs', '2']
+        assert main(args + [str(tmpdir.join('bad.npz')), str(tmpdir.join('good.npy'))]) == 1
+        assert main(args + [str(tmpdir.join('missing.npy'))]) == 2
+        with open(output) as result_file:
+            assert 'error' in json.loads(result_file.readline())
+
+    def test_streamed_files(self, tmpdir):  # pylint: disable=R0201
+        """Assert that files larger than a chunk are checked as streams with the same results."""
+        seed(1234)
+        con_eval = ContinuousEvaluator(np.random.normal(size=(2000,)), verbose=False)
+        path = str(tmpdir.join('test.csv'))
+        test_data = np.random.normal(size=(500,))
+        with open(path, 'w') as csv_file:
+            csv_file.write('score\n' + ''.join('{0!r}\n'.format(value) for value in test_data))
+        with mock.patch.object(con_eval, 'check_stream', wraps=con_eval.check_stream) as check_stream:
+            streamed = evaluate_file(path, evaluator=con_eval, chunk_size=100)
+        assert check_stream.call_count == 1
+        batch = evaluate_file(path, evaluator=con_eval)
+        assert streamed['results'] == batch['results']
+        assert all(np.isclose(streamed['statistics'][name], batch['statistics'][name]) for name in batch['statistics'])
+        assert streamed['results'] == dict(con_eval.check_data(test_data))
+        cat_eval = CategoricalEvaluator(np.array(list('abcab') * 20), verbose=False)
+        with open(path, 'w') as csv_file:
+            csv_file.write('label\n' + 'a\nb\nc\na\nb\n' * 24)
+        assert evaluate_file(path, evaluator=cat_eval, chunk_size=7)['results'] == {'exist': True, 'chi2': True}
+        assert evaluate_file(path, evaluator=cat_eval, chunk_size=7) == evaluate_file(path, evaluator=cat_eval)
+
+    def test_history(self, tmpdir):  # pylint: disable=R0201
+        """Assert that the cli appends outcomes and statistics to a history store."""
+        seed(1234)
+        np.save(str(tmpdir.join('ref.npy')), np.random.normal(size=(2000,)))
+        np.save(str(tmpdir.join('test.npy')), np.random.normal(size=(500,)))
+        args = ['--reference', str(tmpdir.join('ref.npy')), '--assertion', 'ks_test', '--assertion', 'quantile',
+                '--output', str(tmpdir.join('results.jsonl')), '--history', str(tmpdir.join('history')),
+                '--name', 'churn', str(tmpdir.join('test.npy'))]
+        assert main(args) == 0
+        assert main(args) == 0
+        with open(str(tmpdir.join('results.jsonl'))) as result_file:
+            statistics = json.loads(result_file.readline())['statistics']
+        assert statistics['quantile'] == 0
+        rows = HistoryStore(str(tmpdir.join('history'))).read('churn')
+        assert list(rows['assertion']) == ['ks', 'quantile', 'ks', 'quantile']
+        assert list(rows['statistic']) == [statistics['ks'], 0, statistics['ks'], 0]
+
+
+class TestHistory(object):
+    """Class containing tests of the history store."""
+
+    def test_history(self, tmpdir):  # pylint: disable=R0201
+        """Assert that outcomes are buffered, appended and queried by evaluator and time."""
+        path = str(tmpdir.join('history'))
+        with HistoryStore(path, buffer_size=4) as history:
+            history.record('churn', [('min', True), ('ks', False)], statistics={'ks': 0.5}, timestamp=10)
+            assert len(history) == 2 and len(history.columns()['time']) == 2
+            history.record('spend', [('min', True), ('ks', None)], statistics={'ks': 0.5}, timestamp=20)
+            evaluate_tests([('chi2', True)], verbose=False, history=history, evaluator_name='churn',
+                           statistics={'chi2': 1.5})
+        history = HistoryStore(path)
+        assert len(history) == 5
+        rows = history.read('churn', start=0, end=15)
+        assert list(rows['assertion']) == ['min', 'ks']
+        assert list(rows['outcome']) == [1, 0]
+        assert np.isnan(rows['statistic'][0]) and rows['statistic'][1] == 0.5
+        rows = history.read(start=15)
+        assert list(rows['model']) == ['spend', 'spend', 'churn']
+        assert list(rows['outcome']) == [1, -1, 1]
+        assert np.isnan(rows['statistic'][1]) and rows['statistic'][2] == 1.5
+        history.record('new', [('max', True)])
+        assert len(history.read('new')['time']) == 1
+        con_eval = ContinuousEvaluator(np.arange(1000.), assertions=['quantile'], verbose=False)
+        history.record('tails', con_eval.check_data(np.arange(1000.) + 100), statistics=con_eval.last_statistics)
+        assert list(history.read('tails')['statistic']) == [con_eval.last_statistics['quantile']]
+        assert len(HistoryStore(path).read('missing')['time']) == 0
+
+    def test_partial_write(self, tmpdir):  # pylint: disable=R0201
+        """Assert that rows appended after a partly written row stay aligned."""
+        path = str(tmpdir.join('history'))
+        with HistoryStore(path) as history:
+            history.record('churn', [('min', True)], timestamp=10)
+        # a crash after writing one column of the next row.
+        with open(os.path.join(path, 'outcome.bin'), 'ab') as column_file:
+            np.array([1], dtype=np.int8).tofile(column_file)
+        history = HistoryStore(path)
+        assert len(history) == 1
+        history.record('churn', [('min', False)], timestamp=20)
+        rows = history.read()
+        assert list(rows['outcome']) == [1, 0]
+        assert list(rows['time']) == [10, 20]
+
+    def test_time_order(self, tmpdir):  # pylint: disable=R0201
+        """Assert that time ranges are found with rows in and out of time order."""
+        path = str(tmpdir.join('history'))
+        history = HistoryStore(path, buffer_size=3)
+        for timestamp in range(10):
+            history.record('churn' if timestamp % 2 else 'spend', [('min', True)], timestamp=timestamp)
+        assert list(history.read(start=2.5, end=7)['time']) == [3, 4, 5, 6]
+        assert list(history.read('churn', start=2, end=7)['time']) == [3, 5]
+        assert not os.path.exists(os.path.join(path, 'unordered'))
+        history.record('churn', [('min', False)], timestamp=4.5)
+        history.flush()
+        assert list(HistoryStore(path).read(start=4, end=6)['time']) == [4, 5, 4.5]
+        assert os.path.exists(os.path.join(path, 'unordered'))
+
+
+class TestMetrics(object):
+    """Class containing tests of the metrics exporter."""
+
+    con_eval = ContinuousEvaluator(np.array([x for x in range(31)]), verbose=False)
+
+    def test_render(self):
+        """Assert that check outcomes and timings are rendered."""
+        exporter = MetricsExporter(buckets=(1.0, 10.0))
+        exporter.check('model"a', self.con_eval, np.array([x for x in range(51)]))
+        exporter.observe('model"a', [('max', False), ('ks', None)], seconds=5.0)
+        text = exporter.render()
+        assert 'predeval_checks_total{evaluator="model\\"a"} 2\n' in text
+        assert 'predeval_failures_total{assertion="max",evaluator="model\\"a"} 2\n' in text
+        assert 'predeval_failures_total{assertion="ks",evaluator="model\\"a"} 0\n' in text
+        assert 'predeval_statistic{evaluator="model\\"a",statistic="max"} 50.0\n' in text
+        assert 'predeval_check_seconds_bucket{evaluator="model\\"a",le="1.0"} 1\n' in text
+        assert 'predeval_check_seconds_bucket{evaluator="model\\"a",le="10.0"} 2\n' in text
+        assert 'predeval_check_seconds_count{evaluator="model\\"a"} 2\n' in text
+        assert text.endswith('# EOF\n')
+
+    def test_nonfinite_statistics(self):  # pylint: disable=R0201
+        """Assert that nan and inf statistics are rendered as OpenMetrics numbers."""
+        exporter = MetricsExporter()
+        con_eval = ContinuousEvaluator(np.arange(31.), assertions=['min'], verbose=False)
+        exporter.check('b', con_eval, np.full(10, np.nan))
+        exporter.observe('b', [('max', True), ('mean', True)], statistics={'max': np.inf, 'mean': -np.inf})
+        text = exporter.render()
+        assert 'predeval_statistic{evaluator="b",statistic="min"} NaN\n' in text
+        assert 'predeval_statistic{evaluator="b",statistic="max"} +Inf\n' in text
+        assert 'predeval_statistic{evaluator="b",statistic="mean"} -Inf\n' in text
+
+    def test_evaluate_tests(self, tmpdir):  # pylint: disable=R0201
+        """Assert that evaluate_tests records outcomes and metrics can be written to a file."""
+        exporter = MetricsExporter()
+        evaluate_tests([('min', True), ('max', False)], verbose=False, exporter=exporter,
+                       evaluator_name='churn')
+        path = str(tmpdir.join('predeval.prom'))
+        exporter.write(path)
+        with open(path) as metrics_file:
+            assert metrics_file.read() == exporter.render()
+        assert 'predeval_failures_total{assertion="max",evaluator="churn"} 1' in exporter.render()
+
+    def test_http_handler(self):  # pylint: disable=R0201
+        """Assert that the http handler serves the metrics."""
+        exporter = MetricsExporter()
+        exporter.observe('churn', [('min', True)])
+        server = HTTPServer(('127.0.0.1', 0), exporter.make_handler())
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        response = urlopen('http://127.0.0.1:{0}/metrics'.format(server.server_address[1]))
+        assert response.read().decode('utf-8') == exporter.render()
+        assert response.headers['Content-Type'].startswith('application/openmetrics-text')
+        thread.join()
+        server.server_close()